@@ -1,56 +1,123 @@
+import string
 import urllib.parse
+from functools import lru_cache
+
 from config import AFFILIATE_NETWORKS
 
+# Сколько последних конвертаций держать в кэше
+CACHE_SIZE = 16384
+
+# Имя параметра subid по умолчанию для разных сетей
+SUBID_PARAMS = {
+    "admitad": "subid",
+    "actionpay": "subid",
+}
+
+# Что подставить в {channel}, если ссылка не для канала (личные алерты,
+# сохраненный рендер) — чтобы такой трафик не сливался в пустую метку
+NO_CHANNEL_TAG = "dm"
+
+
+# Таблица для кодирования ASCII-ссылок через str.translate — то же, что
+# urllib.parse.quote(url) (safe="/"), но без посимвольного цикла на Python
+_QUOTE_SAFE = set(string.ascii_letters + string.digits + "_.-~/")
+_QUOTE_TABLE = str.maketrans(
+    {chr(i): chr(i) if chr(i) in _QUOTE_SAFE else f"%{i:02X}" for i in range(128)}
+)
+
+
+def quote_url(url):
+    """urllib.parse.quote(url) с быстрым путем для ASCII."""
+    if url.isascii():
+        return url.translate(_QUOTE_TABLE)
+    return urllib.parse.quote(url)
+
+
+class _CompiledNetwork:
+    """
+    Шаблон партнерской ссылки одной сети, разобранный один раз:
+    base_url + quote(ссылка + UTM) + &subid=...
+    """
+
+    def __init__(self, config):
+        net_type = config.get("type", "custom").lower()
+        self.prefix = config["base_url"]
+
+        # UTM-метки дописываются к самой ссылке на товар (до кодирования)
+        utm = config.get("utm") or {}
+        self.utm_query = urllib.parse.urlencode(utm)
+
+        # subid может содержать {channel} — тогда метка своя для каждого канала
+        self.subid = config.get("subid") or ""
+        self.subid_param = config.get("subid_param") or SUBID_PARAMS.get(
+            net_type, "subid"
+        )
+        self._suffixes = {}
+
+    def suffix(self, channel):
+        """Хвост с subid для канала (считается один раз на канал)."""
+        suffix = self._suffixes.get(channel)
+        if suffix is None:
+            suffix = ""
+            if self.subid:
+                value = self.subid.replace("{channel}", str(channel or NO_CHANNEL_TAG))
+                suffix = f"&{self.subid_param}={urllib.parse.quote(value, safe='')}"
+            self._suffixes[channel] = suffix
+        return suffix
+
+    def convert(self, original_url, channel):
+        target = original_url
+        if self.utm_query:
+            separator = "&" if "?" in target else "?"
+            target = f"{target}{separator}{self.utm_query}"
+        return f"{self.prefix}{quote_url(target)}{self.suffix(channel)}"
+
 
 class AffiliateManager:
-    def __init__(self, networks=None):
+    def __init__(self, networks=None, cache_size=CACHE_SIZE):
         """
         :param networks: Словарь конфигурации сетей. Если None, берется из config.py
+        :param cache_size: Размер LRU-кэша последних конвертаций
         """
         self.networks = networks if networks is not None else AFFILIATE_NETWORKS
+        # Шаблоны компилируются один раз; сети без base_url не попадают сюда
+        self._compiled = {
+            source: _CompiledNetwork(config)
+            for source, config in self.networks.items()
+            if config and config.get("base_url")
+        }
+        self._convert_cached = lru_cache(maxsize=cache_size)(self._convert)
 
-    def convert_link(self, original_url, source_name):
+    def convert_link(self, original_url, source_name, channel=None):
         """
         Превращает обычную ссылку в партнерскую (DeepLink).
 
         :param original_url: Исходная ссылка на товар
         :param source_name: Название магазина (ключ в конфиге), например 'StreetBeat'
+        :param channel: Канал публикации для subid с {channel} (опционально)
         :return: Партнерская ссылка или исходная, если нет конфига
         """
-        if not original_url or not source_name:
-            return original_url
-
-        network_config = self.networks.get(source_name)
-
-        # Если для этого источника нет настроек или не задан base_url
-        if not network_config or not network_config.get("base_url"):
+        if not original_url or source_name not in self._compiled:
             return original_url
+        return self._convert_cached(original_url, source_name, channel)
 
-        try:
-            net_type = network_config.get("type", "custom").lower()
-            base_url = network_config["base_url"]
-
-            # Кодируем исходную ссылку (важно для параметров URL)
-            encoded_url = urllib.parse.quote(original_url)
-
-            if net_type == "admitad":
-                # Admitad Deeplink: base_url + encoded_target_url
-                # Обычно base_url заканчивается на ?ulp= или &ulp= (или просто /)
-                # Если в base_url нет ulp=, можно попробовать добавить.
-                # Но для универсальности лучше полагать, что юзер вставил правильную ссылку-генератор.
-                # Часто формат: https://ad.admitad.com/g/xyz/?ulp={url}&subid={subid}
-
-                # Простая склейка, если юзер указал base_url заканчивающийся на =
-                return f"{base_url}{encoded_url}"
+    def convert_many(self, links, channel=None):
+        """
+        Конвертация пачки ссылок.
 
-            elif net_type == "actionpay":
-                # Actionpay: обычно тоже base_url + url
-                return f"{base_url}{encoded_url}"
+        :param links: Пары (ссылка, магазин)
+        :param channel: Канал публикации (см. convert_link)
+        :return: Список ссылок в том же порядке
+        """
+        convert = self.convert_link
+        return [convert(url, source, channel) for url, source in links]
 
-            else:
-                # Custom: простая конкатенация
-                return f"{base_url}{encoded_url}"
+    def cache_info(self):
+        return self._convert_cached.cache_info()
 
+    def _convert(self, original_url, source_name, channel):
+        try:
+            return self._compiled[source_name].convert(original_url, channel)
         except Exception as e:
             print(f"Ошибка при конвертации CPA ссылки для {source_name}: {e}")
             return original_url
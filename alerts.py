@@ -0,0 +1,183 @@
+"""
+Персональные подписки пользователей: размер, бренд, максимальная цена,
+минимальная скидка.
+
+Каждая новая скидка сверяется со всеми подписками через инвертированные
+индексы (бренд -> подписки, размер -> подписки). Стоимость сопоставления
+зависит от числа слов в названии и размеров у товара, а не от числа
+подписок, поэтому десятки тысяч правил проверяются мгновенно.
+"""
+
+import re
+
+from scoring import discount_percent
+from sizes import format_size, normalize_sizes
+from text_normalization import canonical_brand, title_keys
+from utils import parse_price
+
+# Параметры команды /alert: brand=nike size=42,42.5 price=15000 discount=30
+ALERT_KEYS = {"brand", "size", "price", "discount"}
+
+
+def parse_sizes(sizes):
+    """Размеры EU из списка строк или строки через запятую."""
+    return set(normalize_sizes(sizes))
+
+
+def _parse_int(value, error):
+    """Целое число из аргумента; иначе ValueError с понятным пользователю текстом."""
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{error}: {value}") from None
+
+
+def parse_alert_args(text):
+    """
+    Разбирает аргументы команды /alert.
+    Пример: 'brand=new balance size=42,42.5 price=15000 discount=30'
+    :return: словарь полей подписки
+    :raises ValueError: если аргументы некорректны
+    """
+    parts = re.split(r"\s+(?=\w+=)", (text or "").strip())
+    alert = {"brand": None, "sizes": None, "max_price": None, "min_discount": None}
+
+    for part in parts:
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        key = key.strip().lower()
+        value = value.strip()
+        if not sep or key not in ALERT_KEYS or not value:
+            raise ValueError(f"Не понял параметр: {part}")
+
+        if key == "brand":
+            alert["brand"] = canonical_brand(value)
+        elif key == "size":
+            sizes = parse_sizes(value)
+            if not sizes:
+                raise ValueError(f"Не понял размеры: {value}")
+            alert["sizes"] = ",".join(format_size(s) for s in sorted(sizes))
+        elif key == "price":
+            alert["max_price"] = _parse_int(value, "Не понял цену")
+        elif key == "discount":
+            alert["min_discount"] = _parse_int(value.rstrip("%"), "Не понял скидку")
+
+    if not any(alert.values()):
+        raise ValueError("Нужен хотя бы один параметр")
+    return alert
+
+
+def describe_alert(alert):
+    """Человекочитаемое описание подписки."""
+    parts = []
+    if alert.get("brand"):
+        parts.append(f"бренд {alert['brand']}")
+    if alert.get("sizes"):
+        parts.append(f"размер EU {alert['sizes'].replace(',', ', ')}")
+    if alert.get("max_price"):
+        parts.append(f"до {alert['max_price']} ₽")
+    if alert.get("min_discount"):
+        parts.append(f"скидка от {alert['min_discount']}%")
+    return ", ".join(parts)
+
+
+class AlertIndex:
+    """Инвертированный индекс подписок."""
+
+    def __init__(self):
+        self._alerts = {}  # id -> подписка (строка таблицы alerts)
+        self._by_brand = {}  # бренд -> {id}
+        self._any_brand = set()
+        self._by_size = {}  # размер -> {id}
+        self._any_size = set()
+        self._any_both = set()  # без бренда и без размеров
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, alert):
+        alert_id = alert["id"]
+        self.remove(alert_id)
+        self._alerts[alert_id] = alert
+
+        if alert.get("brand"):
+            self._by_brand.setdefault(alert["brand"], set()).add(alert_id)
+        else:
+            self._any_brand.add(alert_id)
+
+        sizes = parse_sizes(alert.get("sizes"))
+        if sizes:
+            for size in sizes:
+                self._by_size.setdefault(size, set()).add(alert_id)
+        else:
+            self._any_size.add(alert_id)
+        if alert_id in self._any_brand and alert_id in self._any_size:
+            self._any_both.add(alert_id)
+
+    def remove(self, alert_id):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        self._any_brand.discard(alert_id)
+        self._any_size.discard(alert_id)
+        self._any_both.discard(alert_id)
+        if alert.get("brand"):
+            self._discard(self._by_brand, alert["brand"], alert_id)
+        for size in parse_sizes(alert.get("sizes")):
+            self._discard(self._by_size, size, alert_id)
+
+    @staticmethod
+    def _discard(index, key, alert_id):
+        ids = index.get(key)
+        if ids:
+            ids.discard(alert_id)
+            if not ids:
+                del index[key]
+
+    def load(self, alerts):
+        for alert in alerts:
+            self.add(alert)
+
+    def match(self, deal):
+        """
+        Подписки, под которые подходит скидка.
+        :param deal: словарь с title, price, old_price, sizes
+        :return: список совпавших подписок
+        """
+        # Перебираются только корзины бренда и размеров скидки; подписки
+        # без бренда или без размеров проверяются поиском в множестве, без
+        # копирования
+        by_brand = set()
+        for key in title_keys(deal.get("title")):
+            by_brand.update(self._by_brand.get(key, ()))
+        by_size = set()
+        for size in parse_sizes(deal.get("sizes_eu") or deal.get("sizes")):
+            by_size.update(self._by_size.get(size, ()))
+
+        candidates = set(self._any_both)
+        for alert_id in by_brand:
+            if alert_id in by_size or alert_id in self._any_size:
+                candidates.add(alert_id)
+        for alert_id in by_size:
+            if alert_id in self._any_brand:
+                candidates.add(alert_id)
+        if not candidates:
+            return []
+
+        price = parse_price(deal.get("price"))
+        discount = discount_percent(deal.get("price"), deal.get("old_price"))
+
+        matched = []
+        for alert_id in candidates:
+            alert = self._alerts[alert_id]
+            if alert.get("max_price") and (price is None or price > alert["max_price"]):
+                continue
+            if alert.get("min_discount") and discount < alert["min_discount"]:
+                continue
+            matched.append(alert)
+        return matched
+
+    def match_chats(self, deal):
+        """Чаты, которым нужно отправить скидку (без повторов)."""
+        return list(dict.fromkeys(alert["chat_id"] for alert in self.match(deal)))
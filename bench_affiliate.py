@@ -0,0 +1,116 @@
+"""
+Бенчмарк партнерских ссылок: старый AffiliateManager (новый экземпляр на
+каждый пост, разбор конфига на каждый вызов) против скомпилированных
+шаблонов, convert_many и LRU-кэша.
+
+Запуск: python bench_affiliate.py [количество ссылок]
+"""
+
+import random
+import sys
+import time
+import urllib.parse
+
+from affiliate_manager import AffiliateManager
+
+NETWORKS = {
+    "StreetBeat": {
+        "type": "admitad",
+        "base_url": "https://ad.admitad.com/g/abc123/?ulp=",
+    },
+    "Lamoda": {"type": "actionpay", "base_url": "https://click.actionpay.ru/x/?url="},
+    "Brandshop": {"type": "custom", "base_url": "https://go.example.com/r?to="},
+}
+
+SHOP_URLS = {
+    "StreetBeat": "https://street-beat.ru/d/krossovki-nike-air-max-{}/",
+    "Lamoda": "https://www.lamoda.ru/p/rtlac{}/shoes-adidas-originals-samba/",
+    "Brandshop": "https://brandshop.ru/goods/{}/new-balance-550/",
+}
+
+
+class LegacyAffiliateManager:
+    """convert_link до компиляции шаблонов."""
+
+    def __init__(self, networks):
+        self.networks = networks
+
+    def convert_link(self, original_url, source_name):
+        if not original_url or not source_name:
+            return original_url
+        network_config = self.networks.get(source_name)
+        if not network_config or not network_config.get("base_url"):
+            return original_url
+        try:
+            net_type = network_config.get("type", "custom").lower()
+            base_url = network_config["base_url"]
+            encoded_url = urllib.parse.quote(original_url)
+            if net_type == "admitad":
+                return f"{base_url}{encoded_url}"
+            elif net_type == "actionpay":
+                return f"{base_url}{encoded_url}"
+            else:
+                return f"{base_url}{encoded_url}"
+        except Exception:
+            return original_url
+
+
+def make_links(count, unique, rng):
+    """count ссылок, среди которых unique разных (повторы — рассылка одного поста)."""
+    pool = []
+    for i in range(unique):
+        source = rng.choice(list(SHOP_URLS))
+        pool.append((SHOP_URLS[source].format(100000 + i), source))
+    return [pool[i % unique] for i in range(count)]
+
+
+def bench(name, func, links):
+    started = time.perf_counter()
+    result = func(links)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<36} {elapsed * 1000:8.1f} ms  {len(links) / elapsed:12,.0f} links/s")
+    return elapsed, result
+
+
+def legacy_per_post(links):
+    # Как было в send_single_deal: новый менеджер на каждую публикацию
+    return [LegacyAffiliateManager(NETWORKS).convert_link(u, s) for u, s in links]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+
+    for unique in (count, count // 10):
+        links = make_links(count, unique, rng)
+        print(f"{count} links, {unique} unique")
+        print("-" * 72)
+
+        legacy = LegacyAffiliateManager(NETWORKS)
+        base, expected = bench("legacy, manager per post", legacy_per_post, links)
+        bench(
+            "legacy, shared manager",
+            lambda ls: [legacy.convert_link(u, s) for u, s in ls],
+            links,
+        )
+
+        compiled = AffiliateManager(networks=NETWORKS)
+        new, result = bench(
+            "compiled convert_link",
+            lambda ls: [compiled.convert_link(u, s) for u, s in ls],
+            links,
+        )
+        assert result == expected, "Compiled templates must match legacy output"
+
+        batch = AffiliateManager(networks=NETWORKS)
+        many, result = bench("compiled convert_many", batch.convert_many, links)
+        assert result == expected
+
+        info = batch.cache_info()
+        print(f"speedup vs legacy: x{base / new:.2f} (convert_many x{base / many:.2f})")
+        print(f"cache: {info.hits} hits, {info.misses} misses")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Бенчмарк разбора страницы листинга StreetBeat: товары JSON + размеры из
+карточек.
+
+  per_card — прежний способ: find_element/get_attribute на каждую карточку
+             и каждый размер (несколько команд WebDriver на карточку);
+  script   — StreetBeatScraper._extract_listing: один execute_script.
+
+Страница берется из записанных фикстур (fixtures/streetbeat, см.
+fixtures.py) и открывается один раз; каждый способ повторяется --repeat раз.
+Для каждого печатаются время разбора страницы (медиана, с), число команд
+WebDriver и число товаров с размерами — у обоих способов оно должно совпасть.
+
+Запуск: python bench_extract.py [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import urllib.parse
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import fixtures
+from bench_scan import RoundTrips
+from config import FIXTURES_DIR
+from fixtures import shop_url
+from streetbeat_scraper import (
+    CARD_SELECTOR,
+    SIZE_LABEL_SELECTOR,
+    STREETBEAT_URL,
+    StreetBeatScraper,
+)
+
+
+def _key(url):
+    """Путь ссылки, как в EXTRACT_LISTING_SCRIPT (фикстуры: /street-beat.ru/...)."""
+    path = urllib.parse.urlsplit(url).path
+    prefix = "/street-beat.ru/"
+    return path[len(prefix) - 1 :] if path.startswith(prefix) else path
+
+
+def per_card_listing(driver):
+    """Разбор листинга командами WebDriver на каждую карточку (как раньше)."""
+    json_items = driver.execute_script(
+        "return window.digitalData && window.digitalData.listing ? window.digitalData.listing.items : [];"
+    )
+    dom_sizes_map = {}
+    cards = driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
+    for card in cards:
+        try:
+            info_el = card.find_element(By.CSS_SELECTOR, ".product-card__info")
+            link_href = info_el.get_attribute("href")
+            size_labels = card.find_elements(By.CSS_SELECTOR, SIZE_LABEL_SELECTOR)
+            sizes = [lbl.get_attribute("textContent").strip() for lbl in size_labels]
+            if link_href:
+                dom_sizes_map[_key(link_href)] = [s for s in sizes if s]
+        except Exception:
+            continue
+
+    items = []
+    for item in json_items:
+        sizes = dom_sizes_map.get(_key(item.get("url", "")), [])
+        items.append(dict(item, sizes=sizes))
+    return {"items": items, "cards": len(cards)}
+
+
+def measure(extract, round_trips, repeat):
+    """Медиана времени, команды WebDriver за один разбор, товары с размерами."""
+    timings = []
+    for _ in range(repeat):
+        trips_before = round_trips.count
+        started = time.perf_counter()
+        listing = extract()
+        timings.append(time.perf_counter() - started)
+        trips = round_trips.count - trips_before
+    with_sizes = sum(1 for item in listing["items"] if item.get("sizes"))
+    return statistics.median(timings), trips, with_sizes, len(listing["items"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(FIXTURES_DIR, "streetbeat", fixtures.MANIFEST)):
+        print(
+            f"No fixtures in {FIXTURES_DIR}: run python fixtures.py record streetbeat"
+        )
+        return 1
+
+    round_trips = RoundTrips()
+    round_trips.install()
+
+    with fixtures.FixtureServer() as server:
+        fixtures.REPLAY_URL = server.url
+        scraper = StreetBeatScraper()
+        try:
+            scraper.driver.get(shop_url(STREETBEAT_URL))
+            WebDriverWait(scraper.driver, 15).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR))
+            )
+            results = {
+                "per_card": measure(
+                    lambda: per_card_listing(scraper.driver), round_trips, args.repeat
+                ),
+                "script": measure(scraper._extract_listing, round_trips, args.repeat),
+            }
+        finally:
+            scraper.close()
+            fixtures.REPLAY_URL = ""
+
+    print(f"{'method':<10}{'wall, s':>10}{'round_trips':>14}{'with sizes':>14}")
+    for method, (wall, trips, with_sizes, total) in results.items():
+        print(f"{method:<10}{wall:>10.3f}{trips:>14}{f'{with_sizes}/{total}':>14}")
+    before, after = results["per_card"][0], results["script"][0]
+    if after:
+        print(f"Speedup: {before / after:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Бенчмарк полного скана на записанных страницах (fixtures/, см. fixtures.py).
+
+Для каждого магазина с фикстурами поднимается локальный сервер, скрапер
+сканирует его как настоящий магазин, и по стадиям (catalog — разбор
+каталога, enrich — страницы товаров/фото, images — обработка картинок)
+считаются:
+  wall        — время стадии, с
+  round_trips — вызовы браузера (команды WebDriver / сообщения Playwright)
+  requests    — HTTP-запросы к серверу фикстур
+  bytes       — отданные сервером байты
+  peak_rss    — пиковая память бота вместе с браузерами, МБ
+
+Результаты сравниваются с fixtures/bench_baseline.json: рост метрики больше
+чем на --tolerance (по умолчанию 20%) считается регрессией, и скрипт
+завершается с кодом 1.
+
+Запуск: python bench_scan.py [--save-baseline] [--tolerance 0.2] [магазины...]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import database
+import fixtures
+from config import FIXTURES_DIR
+from process_tree import tree_rss
+from rendering import render_photo
+from scraper_registry import resolve_scraper
+
+BASELINE = os.path.join(FIXTURES_DIR, "bench_baseline.json")
+METRICS = ["wall", "round_trips", "requests", "bytes", "peak_rss"]
+RSS_INTERVAL = 0.05  # секунд между замерами памяти
+# Рост времени меньше этого (секунд) — шум, а не регрессия
+WALL_NOISE = 0.05
+
+
+class RoundTrips:
+    """Счетчик вызовов браузера: команды WebDriver и сообщения Playwright."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+    def install(self):
+        from selenium.webdriver.remote.webdriver import WebDriver
+
+        execute = WebDriver.execute
+
+        def counted_execute(driver, *args, **kwargs):
+            self.add()
+            return execute(driver, *args, **kwargs)
+
+        WebDriver.execute = counted_execute
+
+        try:
+            from playwright._impl._connection import Channel
+        except ImportError:
+            return
+        inner_send = Channel._inner_send
+
+        async def counted_send(channel, *args, **kwargs):
+            self.add()
+            return await inner_send(channel, *args, **kwargs)
+
+        Channel._inner_send = counted_send
+
+
+class PeakRss:
+    """Пиковая память процесса с потомками, пока открыт блок with."""
+
+    def __enter__(self):
+        self.peak = tree_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            self.peak = max(self.peak, tree_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss())
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def process_images(deals):
+    """Фото для постов, как при рендере (rendering.render_photo)."""
+    return sum(1 for deal in deals if render_photo(deal) is not None)
+
+
+async def bench_source(name, server, round_trips):
+    """Метрики стадий скана одного магазина."""
+    results = {}
+
+    async def stage(stage_name, run):
+        requests_before, bytes_before = server.totals()
+        trips_before = round_trips.count
+        started = time.perf_counter()
+        with PeakRss() as rss:
+            value = await run()
+        requests_after, bytes_after = server.totals()
+        results[stage_name] = {
+            "wall": round(time.perf_counter() - started, 3),
+            "round_trips": round_trips.count - trips_before,
+            "requests": requests_after - requests_before,
+            "bytes": bytes_after - bytes_before,
+            "peak_rss": round(rss.peak / 2**20, 1),
+        }
+        return value
+
+    scraper = resolve_scraper(name)()
+    try:
+        items = await stage("catalog", lambda: collect(scraper.fetch_catalog()))
+        deals = await stage("enrich", lambda: collect(scraper.enrich(items)))
+    finally:
+        await scraper.close()
+
+    loop = asyncio.get_running_loop()
+    await stage("images", lambda: loop.run_in_executor(None, process_images, deals))
+    print(f"[Bench] {name}: {len(items)} catalog items, {len(deals)} deals")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Строки отчета и список регрессий относительно baseline."""
+    lines = []
+    regressions = []
+    header = f"{'source':<12} {'stage':<8}" + "".join(f"{m:>14}" for m in METRICS)
+    lines.append(header)
+    lines.append("-" * len(header))
+    for source, stages in results.items():
+        for stage_name, metrics in stages.items():
+            base = baseline.get(source, {}).get(stage_name, {})
+            cells = []
+            for metric in METRICS:
+                value = metrics[metric]
+                cell = f"{value:g}"
+                old = base.get(metric)
+                if old:
+                    change = (value - old) / old
+                    cell += f" ({change:+.0%})"
+                    noise = metric == "wall" and value - old < WALL_NOISE
+                    if change > tolerance and not noise:
+                        regressions.append(
+                            f"{source}/{stage_name} {metric}: {old:g} -> {value:g}"
+                        )
+                cells.append(f"{cell:>14}")
+            lines.append(f"{source:<12} {stage_name:<8}" + "".join(cells))
+    return lines, regressions
+
+
+def available_sources():
+    if not os.path.isdir(FIXTURES_DIR):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(FIXTURES_DIR)
+        if os.path.exists(os.path.join(FIXTURES_DIR, name, fixtures.MANIFEST))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sources", nargs="*", help="магазины (по умолчанию все)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sources = args.sources or available_sources()
+    if not sources:
+        print(f"No fixtures in {FIXTURES_DIR}: run python fixtures.py record ...")
+        return 1
+
+    round_trips = RoundTrips()
+    round_trips.install()
+
+    results = {}
+    old_db = database.DB_NAME
+    with tempfile.TemporaryDirectory() as tmp, fixtures.FixtureServer() as server:
+        # Пустая база — каждый прогон видит все скидки новыми
+        database.DB_NAME = os.path.join(tmp, "deals.db")
+        database.init_db()
+        fixtures.REPLAY_URL = server.url
+        try:
+            for name in sources:
+                results[name] = asyncio.run(bench_source(name, server, round_trips))
+        finally:
+            database.DB_NAME = old_db
+            fixtures.REPLAY_URL = ""
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"Baseline saved to {BASELINE}")
+        return 0
+
+    if regressions:
+        print("Regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
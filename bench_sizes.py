@@ -0,0 +1,138 @@
+"""
+Бенчмарк разбора размеров: старый посимвольный разбор против sizes.py.
+
+Корпус — реальные строки размеров из data/deals.db (если база есть) плюс
+строки в форматах, которые отдают магазины: Brandshop ('42', '42.5'),
+StreetBeat ('42,5'), Lamoda ('EU 42', '42 RUS', '35 RUS 36 EUR'), adidas
+('42 2/3'), US/UK сетки.
+
+Запуск: python bench_sizes.py [количество карточек]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from config import DB_NAME
+from sizes import parse_size
+from utils import format_sizes, has_valid_size
+
+
+def legacy_parse(sizes_list):
+    """Разбор размеров из старой версии format_sizes/has_valid_size."""
+    parsed = []
+    for s in sizes_list:
+        clean_s = "".join(c for c in str(s) if c.isdigit() or c in [".", ","])
+        clean_s = clean_s.replace(",", ".")
+        if clean_s:
+            try:
+                parsed.append(float(clean_s))
+            except ValueError:
+                pass
+    return parsed
+
+
+def legacy_format_sizes(sizes_list):
+    """Старый format_sizes (без мертвого первого цикла, он только замедлял бы)."""
+    sorted_sizes = sorted(set(legacy_parse(sizes_list)))
+    if not sorted_sizes:
+        return ", ".join(sizes_list)
+    groups = []
+    current_group = [sorted_sizes[0]]
+    for prev, curr in zip(sorted_sizes, sorted_sizes[1:]):
+        if (curr - prev) <= 1.05:
+            current_group.append(curr)
+        else:
+            groups.append(current_group)
+            current_group = [curr]
+    groups.append(current_group)
+    return groups
+
+
+def legacy_has_valid_size(sizes_list, min_size=41.0):
+    return any(v >= min_size for v in legacy_parse(sizes_list))
+
+
+def synthetic_card(rng):
+    """Список размеров одной карточки в формате случайного магазина."""
+    count = rng.randint(1, 12)
+    start = rng.choice([36, 38, 39, 40, 41])
+    values = [start + 0.5 * i for i in range(count * 2)][::2]
+    shop = rng.choice(["brandshop", "streetbeat", "lamoda_eu", "lamoda_rus", "us"])
+
+    def fmt(v):
+        return f"{v:g}"
+
+    if shop == "brandshop":
+        return [fmt(v) for v in values]
+    if shop == "streetbeat":
+        return [fmt(v).replace(".", ",") for v in values]
+    if shop == "lamoda_eu":
+        return [f"EU {fmt(v)}" for v in values]
+    if shop == "lamoda_rus":
+        return [
+            (
+                f"{fmt(v - 1)} RUS\n{fmt(v)} EUR"
+                if rng.random() < 0.5
+                else f"{fmt(v - 1)} RUS"
+            )
+            for v in values
+        ]
+    return [f"US {fmt(v - 33)}" for v in values]
+
+
+def db_cards():
+    """Реальные размеры из базы (если она есть)."""
+    if not os.path.exists(DB_NAME):
+        return []
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            rows = conn.execute(
+                "SELECT sizes FROM deals WHERE sizes IS NOT NULL AND sizes != ''"
+            ).fetchall()
+    except sqlite3.Error:
+        return []
+    return [sizes.split(",") for (sizes,) in rows]
+
+
+def bench(name, func, cards):
+    started = time.perf_counter()
+    for card in cards:
+        func(card)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<28} {elapsed * 1000:9.1f} ms  {elapsed / len(cards) * 1e6:7.2f} us/card"
+    )
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+
+    real = db_cards()
+    cards = real + [synthetic_card(rng) for _ in range(max(count - len(real), 0))]
+    strings = sum(len(c) for c in cards)
+    print(
+        f"Corpus: {len(cards)} cards, {strings} size strings ({len(real)} cards from DB)"
+    )
+    print("-" * 60)
+
+    old_format = bench("legacy format_sizes", legacy_format_sizes, cards)
+    new_format = bench("format_sizes", format_sizes, cards)
+    old_valid = bench("legacy has_valid_size", legacy_has_valid_size, cards)
+    new_valid = bench("has_valid_size", has_valid_size, cards)
+
+    print("-" * 60)
+    print(f"format_sizes speedup:   x{old_format / new_format:.2f}")
+    print(f"has_valid_size speedup: x{old_valid / new_valid:.2f}")
+    info = parse_size.cache_info()
+    print(
+        f"parse_size cache: {info.hits} hits, {info.misses} misses, size {info.currsize}"
+    )
+
+
+if __name__ == "__main__":
+    main()
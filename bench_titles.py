@@ -0,0 +1,161 @@
+"""
+Бенчмарк нормализации названий: старые clean_title, фильтр брендов Lamoda
+и detect_brand против text_normalization.
+
+Корпус — названия из data/deals.db (если база есть) плюс сгенерированные
+названия в форматах магазинов ('Кроссовки мужские Nike Air Max 90',
+'Puma Puma Suede Classic', 'adidas Originals Samba OG').
+
+Запуск: python bench_titles.py [количество названий]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from config import DB_NAME
+from scoring import BRAND_BONUS, detect_brand
+from text_normalization import clean_title, is_target_brand
+
+BRANDS = [
+    "Nike",
+    "adidas Originals",
+    "New Balance",
+    "Puma",
+    "Reebok",
+    "ASICS",
+    "Vans",
+    "Converse",
+    "Jordan",
+    "Saucony",
+    "Timberland",
+    "Salomon",
+]
+MODELS = [
+    "Air Max 90",
+    "Samba OG",
+    "550",
+    "Suede Classic",
+    "Club C 85",
+    "Gel-Kayano 14",
+]
+PREFIXES = ["", "Кроссовки", "Кроссовки мужские", "Кеды", "Ботинки высокие"]
+
+LEGACY_TARGET_BRANDS = {
+    "reebok",
+    "nike",
+    "puma",
+    "diadora",
+    "new balance",
+    "converse",
+    "adidas",
+    "adidas originals",
+    "adidas y-3",
+    "adidas yeezy",
+    "asics",
+    "dc shoes",
+    "element",
+    "jordan",
+    "karhu",
+    "lacoste",
+    "saucony",
+    "vans",
+}
+
+
+def legacy_clean_title(title):
+    """clean_title до переноса в text_normalization."""
+    if not title:
+        return ""
+    words_to_remove = [
+        "кроссовки",
+        "мужские",
+        "женские",
+        "кеды",
+        "высокие",
+        "низкие",
+        "ботинки",
+        "сандалии",
+        "сланцы",
+        "тапочки",
+    ]
+    cleaned_words = []
+    for word in title.split():
+        if word.lower() not in words_to_remove:
+            if cleaned_words and cleaned_words[-1].lower() == word.lower():
+                continue
+            cleaned_words.append(word)
+    return " ".join(cleaned_words)
+
+
+def legacy_is_target_brand(brand):
+    # В LamodaScraperPW множество собиралось заново для каждой карточки
+    target_brands = set(LEGACY_TARGET_BRANDS)
+    return brand.lower() in target_brands
+
+
+def legacy_detect_brand(title):
+    title_lower = (title or "").lower()
+    found = [brand for brand in BRAND_BONUS if brand in title_lower]
+    return max(found, key=BRAND_BONUS.get, default=None)
+
+
+def synthetic_title(rng):
+    brand = rng.choice(BRANDS)
+    model = rng.choice(MODELS)
+    if rng.random() < 0.2:
+        model = f"{brand.split()[0]} {model}"  # бренд повторяется в модели
+    return " ".join(p for p in (rng.choice(PREFIXES), brand, model) if p), brand
+
+
+def db_titles():
+    """Реальные названия из базы (если она есть)."""
+    if not os.path.exists(DB_NAME):
+        return []
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            rows = conn.execute("SELECT title FROM deals").fetchall()
+    except sqlite3.Error:
+        return []
+    return [(title, title.split()[0]) for (title,) in rows if title]
+
+
+def bench(name, func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<26} {elapsed * 1000:9.1f} ms  {len(items) / elapsed:12,.0f} items/s")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(42)
+
+    real = db_titles()
+    corpus = real + [synthetic_title(rng) for _ in range(max(count - len(real), 0))]
+    titles = [title for title, _ in corpus]
+    brands = [brand for _, brand in corpus]
+    print(f"Corpus: {len(corpus)} titles ({len(real)} from DB)")
+    print("-" * 64)
+
+    results = []
+    for label, old, new, items in (
+        ("clean_title", legacy_clean_title, clean_title, titles),
+        ("brand filter", legacy_is_target_brand, is_target_brand, brands),
+        ("detect_brand", legacy_detect_brand, detect_brand, titles),
+    ):
+        old_time = bench(f"legacy {label}", old, items)
+        new_time = bench(label, new, items)
+        results.append((label, old_time / new_time))
+
+    print("-" * 64)
+    for label, speedup in results:
+        print(f"{label:<26} x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Рассылка поста или альбома множеству получателей (каналы и подписчики).
+
+Фото загружается в Telegram один раз — первому получателю, дальше
+рассылается по полученному file_id. Отправки идут параллельно, общий темп
+держит RateLimiter. Результат по каждому получателю пишется в таблицу
+deliveries, поэтому прерванную рассылку можно продолжить: уже получившие
+пост чаты пропускаются. Если у поста есть ссылки для отдельных каналов
+(rendering.track_channels), канал получает кнопки со своей ссылкой.
+Постоянные ошибки (бот заблокирован, чат не найден)
+записываются как окончательные, временные (сеть, исчерпанные повторы) —
+как DELIVERY_FAILED, такие чаты публикатор досылает позже.
+"""
+
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import (
+    BufferedInputFile,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+)
+
+from database import (
+    DELIVERY_BLOCKED,
+    DELIVERY_FAILED,
+    DELIVERY_QUEUED,
+    DELIVERY_REJECTED,
+    DELIVERY_SENT,
+    deactivate_subscriber,
+    get_delivery_statuses,
+    record_deliveries,
+)
+from metrics import timed
+
+BROADCAST_CONCURRENCY = 50  # одновременных запросов (темп ограничивает RateLimiter)
+DELIVERY_FLUSH_SIZE = 100  # сколько результатов копить перед записью в БД
+
+ALBUM_BUTTONS_TEXT = "👆 Где купить товары из подборки:"
+ALBUM_BUTTON_TITLE_LEN = 40
+
+# Ключи доставки альбома: "album:<ссылка> <ссылка> ..." — сам альбом,
+# тот же ключ с BUTTONS_SUFFIX — сообщение с кнопками к нему
+ALBUM_PREFIX = "album:"
+BUTTONS_SUFFIX = "#buttons"
+# Ключ доставки личных уведомлений по подпискам: "alert:<ссылка>" — не
+# смешиваются с публикацией той же скидки в каналах
+ALERT_PREFIX = "alert:"
+
+
+def album_key(links):
+    return ALBUM_PREFIX + " ".join(links)
+
+
+def alert_key(link):
+    return ALERT_PREFIX + link
+
+
+def album_links(key):
+    """Ссылки скидок альбома по ключу доставки альбома или его кнопок."""
+    if key.endswith(BUTTONS_SUFFIX):
+        key = key[: -len(BUTTONS_SUFFIX)]
+    return key[len(ALBUM_PREFIX) :].split(" ")
+
+
+def _keyboard(post, chat_id):
+    """Кнопка поста для чата: со ссылкой канала, если она своя."""
+    return post.get("channel_keyboards", {}).get(chat_id, post["keyboard"])
+
+
+def _url(post, chat_id):
+    return post.get("channel_urls", {}).get(chat_id, post["url"])
+
+
+@timed("send_photo")
+async def _send_photo(bot, limiter, chat_id, post, photo):
+    return await limiter.call(
+        chat_id,
+        lambda: bot.send_photo(
+            chat_id,
+            photo=photo,
+            caption=post["caption"],
+            parse_mode="HTML",
+            reply_markup=_keyboard(post, chat_id),
+        ),
+    )
+
+
+async def _send_text(bot, limiter, chat_id, post):
+    return await limiter.call(
+        chat_id,
+        lambda: bot.send_message(
+            chat_id,
+            post["caption"],
+            parse_mode="HTML",
+            reply_markup=_keyboard(post, chat_id),
+        ),
+    )
+
+
+async def send_post(bot, limiter, chat_id, post):
+    """
+    Первая отправка поста: загрузка фото -> фото по URL -> текст.
+    На следующий вариант переходим только если Telegram отверг сам запрос
+    (TelegramBadRequest), лимиты и сетевые ошибки обрабатывает limiter.
+    :return: file_id отправленного фото (для остальных получателей) или None
+    """
+    photos = []
+    if post.get("photo_bytes"):
+        photos.append(BufferedInputFile(post["photo_bytes"], filename="sneaker.jpg"))
+    if post.get("image_url"):
+        photos.append(post["image_url"])
+
+    for photo in photos:
+        try:
+            message = await _send_photo(bot, limiter, chat_id, post, photo)
+            return message.photo[-1].file_id
+        except TelegramBadRequest as e:
+            print(f"[Broadcast] Photo rejected for {chat_id}: {e}")
+
+    await _send_text(bot, limiter, chat_id, post)
+    return None
+
+
+class _DeliveryLog:
+    """Копит результаты доставки и пачками пишет их в БД."""
+
+    def __init__(self, link):
+        self.link = link
+        self.rows = []
+        self.sent = 0
+        self.failed = 0
+
+    def add(self, chat_id, status):
+        self.rows.append((self.link, str(chat_id), status))
+        if status == DELIVERY_SENT:
+            self.sent += 1
+        elif status == DELIVERY_FAILED:
+            self.failed += 1
+        if len(self.rows) >= DELIVERY_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            record_deliveries(self.rows)
+            self.rows = []
+
+
+async def _deliver(log, chat_id, send):
+    try:
+        result = await send()
+        log.add(chat_id, DELIVERY_SENT)
+        return True, result
+    except TelegramForbiddenError:
+        # Бот заблокирован или удален из чата — больше туда не пишем
+        deactivate_subscriber(chat_id)
+        log.add(chat_id, DELIVERY_BLOCKED)
+    except TelegramBadRequest as e:
+        # Повтор не поможет (чат не найден и т.п.) — не досылаем
+        print(f"[Broadcast] Rejected for {chat_id}: {e}")
+        log.add(chat_id, DELIVERY_REJECTED)
+    except Exception as e:
+        print(f"[Broadcast] Error sending to {chat_id}: {e}")
+        log.add(chat_id, DELIVERY_FAILED)
+    return False, None
+
+
+async def _fan_out(link, recipients, send_first, send_rest):
+    """
+    Общая схема рассылки: send_first(chat_id) отправляет первому получателю и
+    возвращает ссылки на загруженные файлы, send_rest(chat_id, refs) рассылает
+    остальным параллельно. Уже получившие пост (по ключу link) пропускаются.
+    :return: True, если пост дошел хотя бы до одного из recipients (сейчас
+        или раньше); не дошедшим из-за временной ошибки его досылают позже
+    """
+    statuses = get_delivery_statuses(link)
+    delivered_before = any(
+        statuses.get(str(chat_id)) == DELIVERY_SENT for chat_id in recipients
+    )
+    pending = [
+        chat_id
+        for chat_id in recipients
+        if statuses.get(str(chat_id), DELIVERY_FAILED)
+        in (DELIVERY_FAILED, DELIVERY_QUEUED)
+    ]
+    if not pending:
+        return delivered_before
+
+    log = _DeliveryLog(link)
+    try:
+        # Первому получателю грузим фото; если не вышло — пробуем следующему
+        refs = None
+        uploaded = False
+        while pending and not uploaded:
+            chat_id = pending.pop(0)
+            uploaded, refs = await _deliver(log, chat_id, lambda: send_first(chat_id))
+
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def deliver_one(chat_id):
+            async with semaphore:
+                await _deliver(log, chat_id, lambda: send_rest(chat_id, refs))
+
+        await asyncio.gather(*(deliver_one(chat_id) for chat_id in pending))
+    finally:
+        log.flush()
+
+    if log.failed:
+        print(f"[Broadcast] {link}: {log.failed} recipients failed")
+    return delivered_before or log.sent > 0
+
+
+async def broadcast_post(bot, limiter, post, recipients, link):
+    """
+    Рассылает пост всем recipients, кроме уже получивших его по ссылке link.
+    :return: True, если пост дошел хотя бы до одного получателя
+    """
+
+    async def send_first(chat_id):
+        return await send_post(bot, limiter, chat_id, post)
+
+    async def send_rest(chat_id, file_id):
+        if file_id:
+            await _send_photo(bot, limiter, chat_id, post, file_id)
+        else:
+            await _send_text(bot, limiter, chat_id, post)
+
+    return await _fan_out(link, recipients, send_first, send_rest)
+
+
+def album_keyboard(posts, chat_id=None):
+    """Кнопки для альбома: по одной на каждую скидку, в порядке фото."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"{i}. {post['title'][:ALBUM_BUTTON_TITLE_LEN]}",
+                    url=_url(post, chat_id),
+                )
+            ]
+            for i, post in enumerate(posts, 1)
+        ]
+    )
+
+
+@timed("send_album")
+async def send_album(bot, limiter, chat_id, posts, photos):
+    """
+    Отправляет альбом (подпись у каждого фото своя).
+    :param photos: загружаемые файлы, URL или file_id — по одному на пост
+    :return: file_id фото альбома для остальных получателей
+    """
+    media = [
+        InputMediaPhoto(media=photo, caption=post["caption"], parse_mode="HTML")
+        for post, photo in zip(posts, photos)
+    ]
+    messages = await limiter.call(
+        chat_id, lambda: bot.send_media_group(chat_id, media=media)
+    )
+    return [message.photo[-1].file_id for message in messages]
+
+
+async def send_album_buttons(bot, limiter, chat_id, posts):
+    """Сообщение с кнопками к альбому — к альбому их прикрепить нельзя."""
+    await limiter.call(
+        chat_id,
+        lambda: bot.send_message(
+            chat_id, ALBUM_BUTTONS_TEXT, reply_markup=album_keyboard(posts, chat_id)
+        ),
+    )
+
+
+async def broadcast_album(bot, limiter, posts, recipients, link):
+    """
+    Рассылает несколько постов одним альбомом. Фото загружаются один раз,
+    остальным получателям уходят file_id. У всех постов должно быть фото.
+    Альбом и кнопки к нему — разные шаги доставки (ключи link и
+    link + BUTTONS_SUFFIX): если не дошли кнопки, досылаются только они.
+    :return: True, если альбом дошел хотя бы до одного получателя
+    """
+    uploads = [
+        (
+            BufferedInputFile(post["photo_bytes"], filename=f"sneaker_{i}.jpg")
+            if post.get("photo_bytes")
+            else post["image_url"]
+        )
+        for i, post in enumerate(posts, 1)
+    ]
+
+    async def send_first(chat_id):
+        return await send_album(bot, limiter, chat_id, posts, uploads)
+
+    async def send_rest(chat_id, file_ids):
+        await send_album(bot, limiter, chat_id, posts, file_ids)
+
+    delivered = await _fan_out(link, recipients, send_first, send_rest)
+
+    statuses = get_delivery_statuses(link)
+    with_album = [
+        chat_id for chat_id in recipients if statuses.get(str(chat_id)) == DELIVERY_SENT
+    ]
+    await broadcast_album_buttons(
+        bot, limiter, posts, with_album, link + BUTTONS_SUFFIX
+    )
+    return delivered
+
+
+async def broadcast_album_buttons(bot, limiter, posts, recipients, link):
+    """Рассылает сообщение с кнопками к альбому тем, у кого его еще нет."""
+
+    async def send(chat_id, refs=None):
+        await send_album_buttons(bot, limiter, chat_id, posts)
+
+    return await _fan_out(link, recipients, send, send)
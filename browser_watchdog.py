@@ -0,0 +1,69 @@
+"""
+Сторож браузерных сессий.
+
+Браузер может зависнуть внутри driver.get / page.goto, и тогда поток
+скрапера не вернется никогда. ThreadedScraper (scraper_registry.py)
+ограничивает каждый вызов скрапера SCRAPE_CALL_TIMEOUT, а весь скан
+магазина — SCRAPE_TIMEOUT. По таймауту (или если скрапер сообщил, что
+браузер умер, — BrowserDied) сторож убивает все дерево процессов браузера
+(kill_browser): зависший вызов падает, поток освобождается, а следующий
+вызов получает новый поток и новый браузер.
+
+Скрапер сообщает PID своего браузера методом browser_pid(): для Selenium —
+процесс chromedriver, для Playwright — процесс драйвера Playwright; сам
+браузер — их потомок.
+"""
+
+from metrics import BROWSER_KILLED
+from process_tree import kill_tree, reap_zombies, wait_exited
+
+# Признаки того, что браузер или драйвер уже мертв (Selenium / Playwright)
+DEAD_BROWSER_ERRORS = (
+    "Connection refused",
+    "10061",
+    "disconnected",
+    "invalid session id",
+    "has been closed",
+    "Connection closed",
+)
+
+
+class ScrapeTimeout(Exception):
+    """Вызов скрапера не уложился в срок, браузер убит."""
+
+
+class BrowserDied(Exception):
+    """Браузер скрапера умер; скан можно продолжить с новым браузером."""
+
+
+class IncompleteScan(Exception):
+    """Скрапер обошел каталог не полностью (страница не загрузилась)."""
+
+
+def is_browser_dead(error):
+    message = str(error)
+    return any(sign in message for sign in DEAD_BROWSER_ERRORS)
+
+
+def kill_browser(scraper, source):
+    """
+    Убивает дерево процессов браузера скрапера, ждет их завершения и
+    убирает осиротевших зомби (статус самого драйвера забирает его Popen).
+    :return: сколько процессов убито
+    """
+    pid = None
+    if scraper is not None and hasattr(scraper, "browser_pid"):
+        try:
+            pid = scraper.browser_pid()
+        except Exception as e:
+            print(f"[Watchdog] {source}: cannot get browser PID: {e}")
+
+    killed = kill_tree(pid) if pid else []
+    wait_exited(killed)
+    reaped = reap_zombies([child for child in killed if child != pid])
+    BROWSER_KILLED.inc(len(killed), source=source)
+    print(
+        f"[Watchdog] {source}: killed {len(killed)} browser processes"
+        + (f", reaped {reaped} zombies" if reaped else "")
+    )
+    return len(killed)
@@ -24,20 +24,110 @@ HEADERS = {
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 DB_NAME = os.getenv("DB_NAME", os.path.join(DATA_DIR, "deals.db"))
+# Сколько секунд ждать, пока база занята записью другого процесса (WAL
+# допускает одного писателя), прежде чем выдать "database is locked"
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "30"))
+
+# Записанные страницы магазинов для офлайн-тестов и бенчмарков (fixtures.py)
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+# Адрес сервера фикстур (python fixtures.py serve): скраперы ходят туда,
+# а не в настоящие магазины
+FIXTURE_SERVER = os.getenv("FIXTURE_SERVER", "")
 
 # ID канала для рассылки
 CHANNEL_ID = "@Sneaker_Deals"
 
+# Дополнительные каналы для рассылки (через запятую), например "@chan1,-100123"
+EXTRA_CHANNELS = [
+    c.strip() for c in os.getenv("EXTRA_CHANNELS", "").split(",") if c.strip()
+]
+
+# Telegram ID администраторов (служебные команды /stats и т.п.), через запятую
+ADMIN_IDS = {
+    int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x
+}
+
+# Какие магазины сканировать (см. scraper_registry.py): имена из реестра,
+# плагины из entry points или пути "модуль:класс", через запятую
+SCRAPERS = [
+    s.strip()
+    for s in os.getenv("SCRAPERS", "brandshop,lamoda,streetbeat").split(",")
+    if s.strip()
+]
+# Сколько магазинов сканировать одновременно (каждый держит свой браузер)
+SCRAPER_CONCURRENCY = max(1, int(os.getenv("SCRAPER_CONCURRENCY", "1")))
+# Роли процесса (python main.py --role ...; см. roles.py): all — все в одном
+# процессе, bot — поллинг Telegram и команды, scraper — сканы магазинов,
+# publisher — публикация очереди. Процессы делят одну базу (SQLite в WAL)
+ROLE = os.getenv("ROLE", "all")
+# Срок аренды (секунд): столько ждет резервный узел, если активный умер
+LEASE_TTL = float(os.getenv("LEASE_TTL", "30"))
+# Как часто публикатор проверяет пустую очередь, если скидки пишет другой
+# процесс (секунд)
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "30"))
+# Где работают блокирующие скраперы (см. scraper_workers.py): thread — в
+# потоке бота, process — в отдельном процессе на магазин, который
+# пересоздается после SCRAPER_WORKER_MAX_RUNS сканов
+SCRAPER_WORKERS = os.getenv("SCRAPER_WORKERS", "thread")
+SCRAPER_WORKER_MAX_RUNS = max(1, int(os.getenv("SCRAPER_WORKER_MAX_RUNS", "10")))
+# Сторож браузеров (см. browser_watchdog.py), в секундах: предел на весь скан
+# магазина и на один вызов скрапера (загрузка страницы, пачка товаров).
+# По таймауту дерево процессов браузера убивается, поток скрапера заменяется
+SCRAPE_TIMEOUT = int(os.getenv("SCRAPE_TIMEOUT", str(30 * 60)))
+SCRAPE_CALL_TIMEOUT = int(os.getenv("SCRAPE_CALL_TIMEOUT", str(5 * 60)))
+# Сколько раз за скан перезапускать браузер, если он завис или упал при обогащении
+SCRAPE_MAX_RESTARTS = int(os.getenv("SCRAPE_MAX_RESTARTS", "2"))
+
+# Адаптивное расписание сканов (см. source_scheduler.py), в секундах.
+# Интервал каждого магазина подстраивается под то, как часто у него
+# появляются новые скидки и меняются старые, в границах MIN..MAX.
+SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", str(30 * 60)))  # начальный
+SCAN_MIN_INTERVAL = int(os.getenv("SCAN_MIN_INTERVAL", str(10 * 60)))
+SCAN_MAX_INTERVAL = int(os.getenv("SCAN_MAX_INTERVAL", str(3 * 60 * 60)))
+# Случайный разброс времени скана: 0.1 — ±10% интервала
+SCAN_JITTER = float(os.getenv("SCAN_JITTER", "0.1"))
+# Сколько изменений за скан считается нормой: больше — сканируем чаще
+SCAN_TARGET_CHANGES = float(os.getenv("SCAN_TARGET_CHANGES", "5"))
+# Свои границы для отдельных магазинов: имя из SCRAPERS -> (min, max)
+SCAN_INTERVALS = {
+    # "lamoda": (30 * 60, 6 * 60 * 60),
+}
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+# (см. metrics.py); 0 — выключены
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Профилирование циклов (см. profiling.py): PROFILE=scan,publish включает
+# его для выбранных циклов (включается и командой /profile), отчеты
+# пишутся в data/profiles/, хранятся последние PROFILE_KEEP на цикл
+PROFILE_CYCLES = [c.strip() for c in os.getenv("PROFILE", "").split(",") if c.strip()]
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")  # sample | cprofile
+PROFILES_DIR = os.path.join(DATA_DIR, "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Колбэки event loop дольше этого (секунд) логируются, пока профилирование включено
+PROFILE_SLOW_CALLBACK = float(os.getenv("PROFILE_SLOW_CALLBACK", "0.1"))
+
 # Через сколько дней можно присылать товар повторно (если он пропадал из продажи)
 REPOST_DAYS = 7
+# Скан обходит только первые страницы каталога, поэтому скидка, которую
+# скан не встретил, может быть просто вытеснена новыми товарами дальше.
+# С очереди она снимается, только если ее не было в стольких успешных
+# сканах магазина подряд.
+STALE_SCANS = max(1, int(os.getenv("STALE_SCANS", "3")))
 
 # Настройки партнерских сетей (CPA)
 # Замените значения на ваши реальные ссылки/ID
 AFFILIATE_NETWORKS = {
     "StreetBeat": {
         "type": "admitad",
-        # Пример: https://ad.admitad.com/g/YOUR_KEY/?subid=telegram_bot&ulp=
+        # Пример: https://ad.admitad.com/g/YOUR_KEY/?ulp=
         "base_url": "",
+        # Необязательно: метка subid ({channel} — канал публикации, "dm" вне каналов)
+        # и UTM-метки, которые дописываются к ссылке на товар
+        # "subid": "tg_{channel}",
+        # "utm": {"utm_source": "telegram", "utm_medium": "deals_bot"},
     },
     "Lamoda": {
         "type": "actionpay",
@@ -50,3 +140,10 @@ AFFILIATE_NETWORKS = {
         "base_url": "",
     },
 }
+
+# Режим альбомов: публиковать несколько скидок одним send_media_group
+ALBUM_MODE = os.getenv("ALBUM_MODE", "0") == "1"
+# Сколько скидок в альбоме (Telegram допускает от 2 до 10)
+ALBUM_SIZE = max(2, min(10, int(os.getenv("ALBUM_SIZE", "5"))))
+# Как группировать скидки в альбом: "source" (магазин) или "brand"
+ALBUM_GROUP_BY = os.getenv("ALBUM_GROUP_BY", "source")
@@ -1,13 +1,37 @@
 import sqlite3
 import datetime
-from config import DB_NAME, REPOST_DAYS
+import time
+from config import DB_NAME, DB_TIMEOUT, REPOST_DAYS, STALE_SCANS
+from scoring import deal_score
+from sizes import sizes_to_db
+
+# Значения колонки sent
+DEAL_PENDING = 0  # в очереди на публикацию
+DEAL_SENT = 1  # опубликовано
+DEAL_SKIPPED = 2  # снято с публикации (например, дубликат из другого магазина)
+
+# Статусы доставки поста конкретному получателю (таблица deliveries)
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+DELIVERY_BLOCKED = "blocked"  # бот заблокирован / удален из чата
+DELIVERY_REJECTED = "rejected"  # Telegram отверг запрос (чат не найден и т.п.)
+DELIVERY_QUEUED = "queued"  # ждет отправки публикатором (личные уведомления)
+
+
+def _connect():
+    """Соединение с базой; занятую другим процессом ждем до DB_TIMEOUT."""
+    return sqlite3.connect(DB_NAME, timeout=DB_TIMEOUT)
 
 
 def init_db():
     """Создает таблицу, если её нет, и мигрирует схему при необходимости"""
-    with sqlite3.connect(DB_NAME) as conn:
+    with _connect() as conn:
         cursor = conn.cursor()
 
+        # WAL: читатели не блокируют писателя, поэтому бот, скраперы и
+        # публикатор могут работать с одной базой из разных процессов
+        cursor.execute("PRAGMA journal_mode=WAL")
+
         # Основная таблица
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS deals (
@@ -61,16 +85,220 @@ def init_db():
             except:
                 pass
 
+        # Канонические размеры EU ("41,42,42.5"), см. sizes.py
+        if "sizes_eu" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN sizes_eu TEXT")
+            except sqlite3.OperationalError:
+                pass
+            cursor.execute("SELECT link, sizes FROM deals")
+            cursor.executemany(
+                "UPDATE deals SET sizes_eu = ? WHERE link = ?",
+                [(sizes_to_db(sizes), link) for link, sizes in cursor.fetchall()],
+            )
+
+        # Миграция для поиска дубликатов между магазинами
+        if "phash" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN phash TEXT")
+            except sqlite3.OperationalError:
+                pass
+        if "cluster_id" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN cluster_id TEXT")
+            except sqlite3.OperationalError:
+                pass
+        # Когда посчитан хэш (time.time()): другие процессы догружают в
+        # индекс только новые товары
+        if "hashed_at" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN hashed_at REAL")
+            except sqlite3.OperationalError:
+                pass
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_deals_cluster ON deals(cluster_id)"
+        )
+
+        # Приоритет в очереди публикации
+        if "score" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN score REAL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            _backfill_scores(cursor)
+        if "attempts" not in columns:
+            try:
+                cursor.execute(
+                    "ALTER TABLE deals ADD COLUMN attempts INTEGER DEFAULT 0"
+                )
+            except sqlite3.OperationalError:
+                pass
+        # Готовый пост (см. rendering.py): версия шаблона, JSON и фото
+        if "render_version" not in columns:
+            try:
+                cursor.execute("ALTER TABLE deals ADD COLUMN render_version INTEGER")
+                cursor.execute("ALTER TABLE deals ADD COLUMN render_json TEXT")
+                cursor.execute("ALTER TABLE deals ADD COLUMN render_photo BLOB")
+            except sqlite3.OperationalError:
+                pass
+        # Неудачные попытки получить фото поста (см. main.store_render)
+        if "render_failures" not in columns:
+            try:
+                cursor.execute(
+                    "ALTER TABLE deals ADD COLUMN render_failures INTEGER DEFAULT 0"
+                )
+            except sqlite3.OperationalError:
+                pass
+        # Сколько успешных сканов магазина подряд не встретили скидку
+        if "missed_scans" not in columns:
+            try:
+                cursor.execute(
+                    "ALTER TABLE deals ADD COLUMN missed_scans INTEGER DEFAULT 0"
+                )
+            except sqlite3.OperationalError:
+                pass
+        # Индекс очереди: выбор лучшей скидки — поиск по B-дереву, без сортировки
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_deals_queue "
+            "ON deals(sent, score DESC, last_seen)"
+        )
+
+        # Получатели рассылки: каналы и пользователи, нажавшие /start
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscribers (
+                chat_id TEXT PRIMARY KEY,
+                kind TEXT DEFAULT 'user',
+                active INTEGER DEFAULT 1,
+                created_at TIMESTAMP
+            )
+        """)
+
+        # Состояние доставки каждой скидки каждому получателю
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                link TEXT,
+                chat_id TEXT,
+                status TEXT,
+                updated_at TIMESTAMP,
+                attempts INTEGER DEFAULT 0,
+                PRIMARY KEY (link, chat_id)
+            )
+        """)
+        cursor.execute("PRAGMA table_info(deliveries)")
+        if "attempts" not in [info[1] for info in cursor.fetchall()]:
+            cursor.execute(
+                "ALTER TABLE deliveries ADD COLUMN attempts INTEGER DEFAULT 0"
+            )
+
+        # Персональные подписки: пустое поле означает «любой»
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT,
+                brand TEXT,
+                sizes TEXT,
+                max_price INTEGER,
+                min_discount INTEGER,
+                created_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_chat ON alerts(chat_id)")
+
+        # Служебное состояние бота (переживает перезапуски)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+
+        # История сканов: цикл целиком и каждый магазин отдельно
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TIMESTAMP,
+                duration REAL,
+                sources TEXT,
+                items INTEGER,
+                new_deals INTEGER,
+                changed_deals INTEGER,
+                dropped_deals INTEGER,
+                errors INTEGER
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scan_runs_started "
+            "ON scan_runs(started_at, duration)"
+        )
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_source_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER REFERENCES scan_runs(id),
+                source TEXT,
+                started_at TIMESTAMP,
+                duration REAL,
+                items INTEGER,
+                new_deals INTEGER,
+                changed_deals INTEGER,
+                dropped_deals INTEGER,
+                error TEXT
+            )
+        """)
+        # Покрывающий индекс для /stats: окно по времени без чтения таблицы
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scan_source_runs_started "
+            "ON scan_source_runs(started_at, source, duration, items, new_deals, error)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scan_source_runs_source "
+            "ON scan_source_runs(source, started_at)"
+        )
+
+        # Расписание сканов по магазинам (см. source_scheduler.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS source_schedule (
+                source TEXT PRIMARY KEY,
+                interval REAL,
+                next_run REAL,
+                change_rate REAL,
+                last_changes INTEGER,
+                last_run TIMESTAMP
+            )
+        """)
+
+        # Аренды для нескольких процессов (см. roles.py): активный
+        # публикатор, поллинг бота, скан магазина
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT,
+                expires_at REAL
+            )
+        """)
+
         conn.commit()
 
 
+def _backfill_scores(cursor):
+    """Считает score для уже сохраненных неотправленных скидок."""
+    cursor.execute(
+        "SELECT link, title, price, old_price, sizes, source FROM deals WHERE sent = 0"
+    )
+    columns = [d[0] for d in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.executemany(
+        "UPDATE deals SET score = ? WHERE link = ?",
+        [(deal_score(row), row["link"]) for row in rows],
+    )
+
+
 def deal_exists(link):
     """
     Проверяет, нужно ли отправлять товар.
     Возвращает True, если товар НЕ нужно отправлять (он актуален и видели недавно).
     Возвращает False, если товар нужно отправить (его нет или он вернулся после долгого отсутствия).
     """
-    with sqlite3.connect(DB_NAME) as conn:
+    with _connect() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT last_seen FROM deals WHERE link = ?", (link,))
         row = cursor.fetchone()
@@ -96,6 +324,112 @@ def deal_exists(link):
         return True  # Скидка актуальна, видели недавно, не спамим
 
 
+def _sizes_str(sizes):
+    """Список размеров -> строка через запятую для колонки sizes."""
+    if not sizes:
+        return ""
+    if isinstance(sizes, list):
+        return ",".join(sizes)
+    return str(sizes)
+
+
+def _deal_signature(deal):
+    """То, что видно в посте, в том виде, в котором оно лежит в deals."""
+    return (
+        deal["title"],
+        None if deal["price"] is None else str(deal["price"]),
+        None if deal["old_price"] is None else str(deal["old_price"]),
+        sizes_to_db(deal.get("sizes")),
+    )
+
+
+# Вставка или обновление скидки. При обновлении готовый пост сбрасывается,
+# если изменилось то, что в нем видно (deals.* — старые значения колонок).
+_UPSERT_DEAL = """
+    INSERT INTO deals (link, title, price, old_price, last_seen, sent, sizes, image_url, source, image_bytes_b64, score, sizes_eu)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(link) DO UPDATE SET
+        render_version = CASE
+            WHEN deals.title IS excluded.title AND deals.price IS excluded.price
+                 AND deals.old_price IS excluded.old_price
+                 AND deals.sizes_eu IS excluded.sizes_eu
+                 AND deals.image_url IS excluded.image_url
+                 AND deals.source IS excluded.source
+            THEN deals.render_version ELSE NULL END,
+        title=excluded.title, price=excluded.price, old_price=excluded.old_price,
+        last_seen=excluded.last_seen, sizes=excluded.sizes,
+        image_url=excluded.image_url, source=excluded.source,
+        image_bytes_b64=excluded.image_bytes_b64, score=excluded.score,
+        sizes_eu=excluded.sizes_eu, missed_scans=0
+"""
+
+
+def save_deals(deals, sent=False):
+    """
+    Сохраняет пачку скидок одной транзакцией (executemany).
+    :param deals: словари с ключами title, price, old_price, link и
+        необязательными sizes, image_url, source, image_bytes_b64, score
+    :param sent: пометить скидки отправленными
+    :return: (new_links, changed_links) — ссылки скидок, которых раньше не
+        было в БД, и известных скидок, у которых изменились цена, название
+        или размеры (в порядке deals)
+    """
+    if not deals:
+        return [], []
+    now = datetime.datetime.now()
+    links = [deal["link"] for deal in deals]
+
+    with _connect() as conn:
+        cursor = conn.cursor()
+
+        # Ссылка -> (title, price, old_price, sizes_eu) до обновления
+        known = {}
+        for start in range(0, len(links), 500):
+            chunk = links[start : start + 500]
+            cursor.execute(
+                "SELECT link, title, price, old_price, sizes_eu FROM deals "
+                f"WHERE link IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            known.update((row[0], row[1:]) for row in cursor.fetchall())
+
+        changed = []
+        for deal in deals:
+            previous = known.get(deal["link"])
+            if previous is not None and previous != _deal_signature(deal):
+                changed.append(deal["link"])
+
+        cursor.executemany(
+            _UPSERT_DEAL,
+            [
+                (
+                    deal["link"],
+                    deal["title"],
+                    deal["price"],
+                    deal["old_price"],
+                    now,
+                    1 if sent else 0,
+                    _sizes_str(deal.get("sizes")),
+                    deal.get("image_url"),
+                    deal.get("source"),
+                    deal.get("image_bytes_b64"),
+                    deal.get("score", 0.0),
+                    # Канонический вид EU, которым пользуются публикация и подписки
+                    sizes_to_db(deal.get("sizes")),
+                )
+                for deal in deals
+            ],
+        )
+        if sent:
+            cursor.executemany(
+                "UPDATE deals SET sent=1 WHERE link=?", [(link,) for link in links]
+            )
+        conn.commit()
+
+    new_links = [link for link in dict.fromkeys(links) if link not in known]
+    return new_links, list(dict.fromkeys(changed))
+
+
 def save_deal(
     title,
     price,
@@ -106,93 +440,683 @@ def save_deal(
     source=None,
     image_bytes_b64=None,
     sent=False,
+    score=0.0,
 ):
     """
     Сохраняет товар со всеми данными для отложенной публикации.
     sizes - ожидается список строк, мы его склеим в строку через запятую.
+    score - приоритет в очереди (см. scoring.deal_score).
     """
-    now = datetime.datetime.now()
-    sent_int = 1 if sent else 0
+    save_deals(
+        [
+            {
+                "title": title,
+                "price": price,
+                "old_price": old_price,
+                "link": link,
+                "sizes": sizes,
+                "image_url": image_url,
+                "source": source,
+                "image_bytes_b64": image_bytes_b64,
+                "score": score,
+            }
+        ],
+        sent=sent,
+    )
 
-    # Конвертируем список размеров в строку для БД
-    sizes_str = ""
-    if sizes:
-        if isinstance(sizes, list):
-            sizes_str = ",".join(sizes)
-        else:
-            sizes_str = str(sizes)
 
-    with sqlite3.connect(DB_NAME) as conn:
+def get_next_pending_deal():
+    """
+    Возвращает одну неотправленную скидку с наибольшим приоритетом (score).
+    При равном score первой уходит самая старая по дате обнаружения.
+    """
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-
-        cursor.execute("SELECT sent FROM deals WHERE link = ?", (link,))
+        # Порядок совпадает с idx_deals_queue, поэтому выборка идет по индексу
+        cursor.execute(
+            "SELECT * FROM deals WHERE sent = 0 "
+            "ORDER BY score DESC, last_seen ASC LIMIT 1"
+        )
         row = cursor.fetchone()
+        if row:
+            return dict(row)
+    return None
 
-        if row is None:
-            # Новая запись со всеми полями
+
+def count_pending_deals():
+    """Сколько скидок ждет публикации."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM deals WHERE sent = ?", (DEAL_PENDING,))
+        return cursor.fetchone()[0]
+
+
+def get_pending_deals(limit=50):
+    """Первые limit скидок очереди в порядке публикации."""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM deals WHERE sent = 0 "
+            "ORDER BY score DESC, last_seen ASC LIMIT ?",
+            (limit,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def mark_deal_as_sent(link):
+    """Помечает скидку как отправленную."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        # Фото поста больше не нужно — не раздуваем БД
+        cursor.execute(
+            "UPDATE deals SET sent = 1, render_photo = NULL WHERE link = ?", (link,)
+        )
+        conn.commit()
+
+
+def get_unrendered_deals(render_version, links=None):
+    """
+    Скидки в очереди без готового поста текущей версии шаблона.
+    :param links: только эти скидки (пачка скана) и скидки с постом старой
+        версии; без рендера остальные ждут, пока снова попадутся в скане
+    """
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if links is None:
             cursor.execute(
-                """
-                INSERT INTO deals (link, title, price, old_price, last_seen, sent, sizes, image_url, source, image_bytes_b64)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    link,
-                    title,
-                    price,
-                    old_price,
-                    now,
-                    sent_int,
-                    sizes_str,
-                    image_url,
-                    source,
-                    image_bytes_b64,
-                ),
+                "SELECT * FROM deals WHERE sent = ? "
+                "AND (render_version IS NULL OR render_version != ?)",
+                (DEAL_PENDING, render_version),
             )
-        else:
-            # Обновляем, включая новые поля (вдруг размеры обновились)
+            return [dict(row) for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT * FROM deals WHERE sent = ? AND render_version != ?",
+            (DEAL_PENDING, render_version),
+        )
+        deals = {row["link"]: dict(row) for row in cursor.fetchall()}
+        links = list(dict.fromkeys(links))
+        for start in range(0, len(links), 500):
+            chunk = links[start : start + 500]
             cursor.execute(
-                """
-                UPDATE deals 
-                SET title=?, price=?, old_price=?, last_seen=?, sizes=?, image_url=?, source=?, image_bytes_b64=?
-                WHERE link=?
-                """,
-                (
-                    title,
-                    price,
-                    old_price,
-                    now,
-                    sizes_str,
-                    image_url,
-                    source,
-                    image_bytes_b64,
-                    link,
-                ),
+                "SELECT * FROM deals WHERE sent = ? AND render_version IS NULL "
+                f"AND link IN ({','.join('?' * len(chunk))})",
+                [DEAL_PENDING, *chunk],
             )
+            deals.update((row["link"], dict(row)) for row in cursor.fetchall())
+        return list(deals.values())
 
-            if sent:
-                cursor.execute("UPDATE deals SET sent=1 WHERE link=?", (link,))
 
+def save_render(link, render_version, render_json, render_photo):
+    """Сохраняет готовый пост скидки (см. rendering.py)."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE deals SET render_version = ?, render_json = ?, render_photo = ? "
+            "WHERE link = ?",
+            (render_version, render_json, render_photo, link),
+        )
         conn.commit()
 
 
-def get_next_pending_deal():
-    """Возвращает одну неотправленную скидку (самую старую по дате обнаружения)."""
-    with sqlite3.connect(DB_NAME) as conn:
+def record_render_failure(link):
+    """
+    Фото поста получить не удалось: рендер не сохраняется (прежний
+    сбрасывается), и скидка будет перерисована, когда снова попадется в
+    скане (см. get_unrendered_deals с links).
+    :return: число неудачных попыток
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE deals SET render_failures = COALESCE(render_failures, 0) + 1, "
+            "render_version = NULL, render_json = NULL, render_photo = NULL "
+            "WHERE link = ?",
+            (link,),
+        )
+        cursor.execute("SELECT render_failures FROM deals WHERE link = ?", (link,))
+        row = cursor.fetchone()
+        conn.commit()
+        return row[0] if row else 0
+
+
+def set_deal_cluster(link, phash, cluster_id):
+    """Сохраняет перцептивный хэш картинки (hex) и кластер товара."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE deals SET phash = ?, cluster_id = ?, hashed_at = ? WHERE link = ?",
+            (phash, cluster_id, time.time(), link),
+        )
+        conn.commit()
+
+
+def get_hashed_deals(since=None):
+    """
+    Товары с посчитанным хэшем (для построения индекса при старте).
+    :param since: только хэшированные не раньше этого времени (time.time())
+    """
+    query = "SELECT link, title, phash, cluster_id FROM deals WHERE phash IS NOT NULL"
+    params = ()
+    if since is not None:
+        query += " AND hashed_at >= ?"
+        params = (since,)
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_cluster_deals(cluster_id):
+    """Все предложения одного кластера (одного товара в разных магазинах)."""
+    with _connect() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        # Берем неотправленные (sent=0), сортируем по last_seen (чтобы старые первыми ушли)
+        cursor.execute("SELECT * FROM deals WHERE cluster_id = ?", (cluster_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def mark_deals_skipped(links):
+    """Снимает скидки с публикации (sent=DEAL_SKIPPED)."""
+    if not links:
+        return
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE deals SET sent = ?, render_photo = NULL WHERE link = ? AND sent = ?",
+            [(DEAL_SKIPPED, link, DEAL_PENDING) for link in links],
+        )
+        conn.commit()
+
+
+def requeue_deal(link, max_attempts):
+    """
+    Возвращает скидку в очередь после неудачной отправки.
+    После max_attempts неудач скидка снимается с публикации.
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE deals
+            SET attempts = COALESCE(attempts, 0) + 1,
+                sent = CASE WHEN COALESCE(attempts, 0) + 1 >= ? THEN ? ELSE ? END
+            WHERE link = ?
+            """,
+            (max_attempts, DEAL_SKIPPED, DEAL_PENDING, link),
+        )
+        conn.commit()
+
+
+def drop_stale_deals(source, scan_started, scans=STALE_SCANS):
+    """
+    Вызывается после успешного скана источника. Скидкам в очереди, которые
+    не попались в скане (last_seen раньше его начала), увеличивает счетчик
+    missed_scans и снимает с очереди те, что не попадались scans сканов
+    подряд, — скорее всего, они уже закончились.
+    :return: количество снятых скидок
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
         cursor.execute(
-            "SELECT * FROM deals WHERE sent = 0 ORDER BY last_seen ASC LIMIT 1"
+            "UPDATE deals SET missed_scans = COALESCE(missed_scans, 0) + 1 "
+            "WHERE sent = ? AND source = ? AND last_seen < ?",
+            (DEAL_PENDING, source, scan_started),
         )
+        cursor.execute(
+            "UPDATE deals SET sent = ?, render_photo = NULL "
+            "WHERE sent = ? AND source = ? AND last_seen < ? AND missed_scans >= ?",
+            (DEAL_SKIPPED, DEAL_PENDING, source, scan_started, scans),
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def get_state(key, default=None):
+    """Читает значение из bot_state."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
         row = cursor.fetchone()
-        if row:
-            return dict(row)
-    return None
+        return row[0] if row else default
 
 
-def mark_deal_as_sent(link):
-    """Помечает скидку как отправленную."""
-    with sqlite3.connect(DB_NAME) as conn:
+def set_state(key, value):
+    """Записывает значение в bot_state."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)",
+            (key, str(value)),
+        )
+        conn.commit()
+
+
+def add_subscriber(chat_id, kind="user"):
+    """Добавляет (или снова включает) получателя рассылки."""
+    now = datetime.datetime.now()
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO subscribers (chat_id, kind, active, created_at)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET active = 1, kind = excluded.kind
+            """,
+            (str(chat_id), kind, now),
+        )
+        conn.commit()
+
+
+def deactivate_subscriber(chat_id):
+    """Выключает рассылку получателю (отписался или заблокировал бота)."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE subscribers SET active = 0 WHERE chat_id = ?", (str(chat_id),)
+        )
+        conn.commit()
+
+
+def get_recipients(kind=None):
+    """
+    Активные получатели: сначала каналы, потом пользователи.
+    Числовые id возвращаются как int, @username — как строка.
+    """
+    query = "SELECT chat_id FROM subscribers WHERE active = 1"
+    params = ()
+    if kind:
+        query += " AND kind = ?"
+        params = (kind,)
+    query += " ORDER BY kind = 'user', created_at"
+
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [_chat_id_value(chat_id) for (chat_id,) in cursor.fetchall()]
+
+
+def _chat_id_value(chat_id):
+    """chat_id хранится текстом: числовые id возвращаем как int."""
+    return int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id
+
+
+def get_delivery_statuses(link):
+    """
+    Статусы доставки поста по ключу link: chat_id (текст) -> статус.
+    Чаты со статусом, отличным от DELIVERY_FAILED, при рассылке пропускаются.
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT chat_id, status FROM deliveries WHERE link = ?", (link,))
+        return dict(cursor.fetchall())
+
+
+def record_deliveries(rows):
+    """
+    Сохраняет результаты доставки: список (link, chat_id, status).
+    Число попыток по каждому чату копится в attempts.
+    """
+    now = datetime.datetime.now()
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO deliveries (link, chat_id, status, updated_at, attempts)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(link, chat_id) DO UPDATE
+                SET status = excluded.status,
+                    updated_at = excluded.updated_at,
+                    attempts = COALESCE(deliveries.attempts, 0) + 1
+            """,
+            [(link, chat_id, status, now) for link, chat_id, status in rows],
+        )
+        conn.commit()
+
+
+def queue_deliveries(link, chat_ids):
+    """
+    Ставит пост link в очередь на отправку чатам chat_ids (кроме тех, у кого
+    по этому ключу уже есть статус). Отправляет публикатор — только он
+    пишет в Telegram рассылки, так что общий лимит Telegram соблюдается при
+    любом числе процессов-скраперов.
+    """
+    now = datetime.datetime.now()
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO deliveries (link, chat_id, status, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            [(link, str(chat_id), DELIVERY_QUEUED, now) for chat_id in chat_ids],
+        )
+        conn.commit()
+
+
+def get_queued_deliveries(limit=500):
+    """
+    Очередь на отправку (queue_deliveries) в порядке постановки.
+    :return: ключ поста (link) -> список chat_id (int для числовых)
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT link, chat_id FROM deliveries WHERE status = ? "
+            "ORDER BY updated_at LIMIT ?",
+            (DELIVERY_QUEUED, limit),
+        )
+        queued = {}
+        for link, chat_id in cursor.fetchall():
+            queued.setdefault(link, []).append(_chat_id_value(chat_id))
+        return queued
+
+
+def get_failed_deliveries(max_attempts, limit=50):
+    """
+    Посты, которые не дошли до части чатов из-за временной ошибки и еще не
+    исчерпали max_attempts попыток.
+    :return: ключ поста (link) -> список chat_id (int для числовых)
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT link, chat_id FROM deliveries
+            WHERE status = ? AND COALESCE(attempts, 0) < ?
+            ORDER BY updated_at
+            LIMIT ?
+            """,
+            (DELIVERY_FAILED, max_attempts, limit),
+        )
+        failed = {}
+        for link, chat_id in cursor.fetchall():
+            failed.setdefault(link, []).append(_chat_id_value(chat_id))
+        return failed
+
+
+def get_deal(link):
+    """Скидка по ссылке (словарь) или None."""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM deals WHERE link = ?", (link,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+def add_alert(chat_id, brand=None, sizes=None, max_price=None, min_discount=None):
+    """Создает персональную подписку и возвращает ее (словарь с id)."""
+    now = datetime.datetime.now()
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO alerts (chat_id, brand, sizes, max_price, min_discount, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (str(chat_id), brand, sizes, max_price, min_discount, now),
+        )
+        conn.commit()
+        alert_id = cursor.lastrowid
+
+    return {
+        "id": alert_id,
+        "chat_id": chat_id,
+        "brand": brand,
+        "sizes": sizes,
+        "max_price": max_price,
+        "min_discount": min_discount,
+    }
+
+
+def delete_alert(chat_id, alert_id):
+    """Удаляет подписку пользователя. Возвращает True, если она была."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM alerts WHERE id = ? AND chat_id = ?",
+            (alert_id, str(chat_id)),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def get_alerts_version():
+    """
+    Версия набора подписок: (число, последний id). id не переиспользуются
+    (AUTOINCREMENT), поэтому любое добавление или удаление меняет версию.
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*), MAX(id) FROM alerts")
+        return cursor.fetchone()
+
+
+def get_alerts(chat_id=None):
+    """Подписки пользователя (или все, если chat_id не указан)."""
+    query = "SELECT id, chat_id, brand, sizes, max_price, min_discount FROM alerts"
+    params = ()
+    if chat_id is not None:
+        query += " WHERE chat_id = ?"
+        params = (str(chat_id),)
+    query += " ORDER BY id"
+
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        alerts = [dict(row) for row in cursor.fetchall()]
+    for alert in alerts:
+        alert["chat_id"] = _chat_id_value(alert["chat_id"])
+    return alerts
+
+
+def get_source_schedules():
+    """Сохраненное расписание сканов: имя магазина -> словарь полей."""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM source_schedule")
+        return {row["source"]: dict(row) for row in cursor.fetchall()}
+
+
+def save_source_schedule(source, interval, next_run, change_rate, last_changes):
+    """Записывает расписание магазина после скана."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO source_schedule
+                (source, interval, next_run, change_rate, last_changes, last_run)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                source,
+                interval,
+                next_run,
+                change_rate,
+                last_changes,
+                datetime.datetime.now(),
+            ),
+        )
+        conn.commit()
+
+
+_SOURCE_RUN_FIELDS = (
+    "source",
+    "started_at",
+    "duration",
+    "items",
+    "new_deals",
+    "changed_deals",
+    "dropped_deals",
+    "error",
+)
+
+
+def record_scan_run(run, source_runs):
+    """
+    Записывает итог цикла скана и строки по магазинам одной транзакцией.
+    :param run: словарь started_at, duration, sources, items, new_deals,
+        changed_deals, dropped_deals, errors
+    :param source_runs: словари с полями _SOURCE_RUN_FIELDS
+    :return: id записи в scan_runs
+    """
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO scan_runs (started_at, duration, sources, items, new_deals,
+                                   changed_deals, dropped_deals, errors)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run["started_at"],
+                run["duration"],
+                run["sources"],
+                run["items"],
+                run["new_deals"],
+                run["changed_deals"],
+                run["dropped_deals"],
+                run["errors"],
+            ),
+        )
+        run_id = cursor.lastrowid
+        cursor.executemany(
+            f"INSERT INTO scan_source_runs (run_id, {', '.join(_SOURCE_RUN_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' * len(_SOURCE_RUN_FIELDS))})",
+            [
+                (run_id, *(row.get(field) for field in _SOURCE_RUN_FIELDS))
+                for row in source_runs
+            ],
+        )
+        conn.commit()
+        return run_id
+
+
+# p50/p95 длительности через оконные функции: строки за период нумеруются
+# по возрастанию длительности, перцентиль — первая строка с номером >= p * N
+_SOURCE_STATS = """
+    WITH recent AS (
+        SELECT source, duration, items, new_deals, error,
+               ROW_NUMBER() OVER (PARTITION BY source ORDER BY duration) AS position,
+               COUNT(*) OVER (PARTITION BY source) AS total
+        FROM scan_source_runs
+        WHERE started_at >= ?
+    )
+    SELECT source,
+           COUNT(*) AS runs,
+           SUM(error IS NOT NULL) AS errors,
+           AVG(items) AS avg_items,
+           SUM(new_deals) AS new_deals,
+           MIN(CASE WHEN position >= 0.5 * total THEN duration END) AS p50,
+           MIN(CASE WHEN position >= 0.95 * total THEN duration END) AS p95
+    FROM recent
+    GROUP BY source
+    ORDER BY source
+"""
+
+_RUN_STATS = """
+    WITH recent AS (
+        SELECT duration, errors,
+               ROW_NUMBER() OVER (ORDER BY duration) AS position,
+               COUNT(*) OVER () AS total
+        FROM scan_runs
+        WHERE started_at >= ?
+    )
+    SELECT COUNT(*) AS runs,
+           SUM(errors > 0) AS failed_runs,
+           MIN(CASE WHEN position >= 0.5 * total THEN duration END) AS p50,
+           MIN(CASE WHEN position >= 0.95 * total THEN duration END) AS p95
+    FROM recent
+"""
+
+
+def get_scan_stats(days=7):
+    """
+    Сводка сканов за последние days дней.
+    :return: (словарь по всем циклам, список словарей по магазинам)
+    """
+    since = datetime.datetime.now() - datetime.timedelta(days=days)
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(_RUN_STATS, (since,))
+        runs = dict(cursor.fetchone())
+        cursor.execute(_SOURCE_STATS, (since,))
+        sources = [dict(row) for row in cursor.fetchall()]
+    return runs, sources
+
+
+def get_last_source_runs():
+    """Последний скан каждого магазина (время, результат, ошибка)."""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT source, MAX(started_at) AS started_at, items, new_deals, error
+            FROM scan_source_runs
+            GROUP BY source
+            ORDER BY source
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def acquire_lease(name, holder, ttl, now=None):
+    """
+    Берет или продлевает аренду name на ttl секунд. Аренду можно взять,
+    если она свободна, истекла или уже принадлежит holder.
+    :return: True, если аренда теперь у holder
+    """
+    now = time.time() if now is None else now
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE
+                SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+            """,
+            (name, holder, now + ttl, now),
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+
+def release_lease(name, holder):
+    """Отпускает аренду, если она принадлежит holder."""
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder)
+        )
+        conn.commit()
+
+
+def get_leases(now=None):
+    """Действующие аренды: имя -> (владелец, истекает через N секунд)."""
+    now = time.time() if now is None else now
+    with _connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT name, holder, expires_at FROM leases WHERE expires_at > ?",
+            (now,),
+        )
+        return {
+            name: (holder, expires_at - now)
+            for name, holder, expires_at in cursor.fetchall()
+        }
+
+
+def force_source_scans(now=None):
+    """Переносит следующий скан всех магазинов на сейчас (для узлов-скраперов)."""
+    now = time.time() if now is None else now
+    with _connect() as conn:
         cursor = conn.cursor()
-        cursor.execute("UPDATE deals SET sent = 1 WHERE link = ?", (link,))
+        cursor.execute("UPDATE source_schedule SET next_run = ?", (now,))
         conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,214 @@
+"""
+Поиск одинаковых товаров из разных магазинов.
+
+Один и тот же кроссовок часто продается в Brandshop, Lamoda и StreetBeat
+под разными ссылками. Товары объединяются в кластер, если их картинки
+близки по перцептивному хэшу (dHash) и совпадает большая часть слов в
+названии. Из кластера публикуется только самое дешевое предложение.
+"""
+
+import base64
+import datetime
+from io import BytesIO
+
+from PIL import Image
+
+from database import DEAL_PENDING, DEAL_SENT
+from image_processing import process_image
+from text_normalization import title_tokens
+from utils import parse_price
+
+# Максимальное расстояние Хэмминга между dHash одного и того же товара.
+# Индекс ниже гарантирует полный поиск при расстоянии < HASH_BANDS.
+PHASH_MAX_DISTANCE = 3
+# Минимальная доля общих слов в названии (коэффициент Жаккара)
+TITLE_MIN_SIMILARITY = 0.5
+
+HASH_SIZE = 8  # 8x8 -> 64-битный хэш
+HASH_BANDS = 4  # 4 полосы по 16 бит
+_BAND_BITS = HASH_SIZE * HASH_SIZE // HASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Разностный хэш (dHash): сравнивает яркость соседних пикселей
+    уменьшенной черно-белой копии. Возвращает int на hash_size**2 бит.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(BytesIO(image))
+    elif isinstance(image, BytesIO):
+        image.seek(0)
+        image = Image.open(image)
+
+    small = image.convert("L").resize(
+        (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+    )
+    pixels = small.tobytes()  # режим L: один байт на пиксель
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value <<= 1
+            if pixels[offset + col] > pixels[offset + col + 1]:
+                value |= 1
+    return value
+
+
+def image_phash(image_url, image_bytes_b64=None):
+    """
+    Считает dHash по той же картинке, что уйдет в Telegram (после process_image).
+    Возвращает hex-строку или None, если картинку получить не удалось.
+    """
+    image_data = base64.b64decode(image_bytes_b64) if image_bytes_b64 else None
+    if not image_data and not image_url:
+        return None
+
+    rendered = process_image(image_url, image_data=image_data)
+    if rendered is None:
+        return None
+    return photo_phash(rendered)
+
+
+def photo_phash(photo):
+    """dHash уже обработанного фото поста (hex-строка)."""
+    return f"{dhash(photo):016x}"
+
+
+def hamming(a, b):
+    """Количество различающихся бит."""
+    return bin(a ^ b).count("1")
+
+
+def title_similarity(a, b):
+    """Коэффициент Жаккара двух наборов слов."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ProductIndex:
+    """
+    Индекс товаров для быстрого поиска по расстоянию Хэмминга.
+
+    Используется multi-index hashing: 64-битный хэш режется на HASH_BANDS
+    полос, для каждой полосы хранится словарь значение -> ссылки. Если
+    расстояние между хэшами меньше числа полос, хотя бы одна полоса
+    совпадает точно, поэтому кандидатов достаточно искать по совпадающим
+    полосам, а не перебирать всю базу.
+    """
+
+    def __init__(self):
+        self._entries = {}  # link -> (phash, tokens, cluster_id)
+        self._bands = [dict() for _ in range(HASH_BANDS)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _split(phash):
+        return [(phash >> (i * _BAND_BITS)) & _BAND_MASK for i in range(HASH_BANDS)]
+
+    def add(self, link, phash, title, cluster_id):
+        if link in self._entries:
+            self.remove(link)
+        self._entries[link] = (phash, title_tokens(title), cluster_id)
+        for band, value in zip(self._bands, self._split(phash)):
+            band.setdefault(value, set()).add(link)
+
+    def remove(self, link):
+        entry = self._entries.pop(link, None)
+        if entry is None:
+            return
+        for band, value in zip(self._bands, self._split(entry[0])):
+            links = band.get(value)
+            if links:
+                links.discard(link)
+                if not links:
+                    del band[value]
+
+    def candidates(self, phash, max_distance=PHASH_MAX_DISTANCE):
+        """Ссылки с хэшем не дальше max_distance (max_distance < HASH_BANDS)."""
+        found = set()
+        for band, value in zip(self._bands, self._split(phash)):
+            found.update(band.get(value, ()))
+        return [
+            link
+            for link in found
+            if hamming(self._entries[link][0], phash) <= max_distance
+        ]
+
+    def find_cluster(self, phash, title, exclude_link=None):
+        """Возвращает cluster_id самого похожего товара или None."""
+        tokens = title_tokens(title)
+        best_cluster = None
+        best_score = None
+
+        for link in self.candidates(phash):
+            if link == exclude_link:
+                continue
+            other_hash, other_tokens, cluster_id = self._entries[link]
+            similarity = title_similarity(tokens, other_tokens)
+            if similarity < TITLE_MIN_SIMILARITY:
+                continue
+            score = (hamming(phash, other_hash), -similarity)
+            if best_score is None or score < best_score:
+                best_score = score
+                best_cluster = cluster_id
+
+        return best_cluster
+
+    def assign(self, link, phash, title):
+        """
+        Добавляет товар в индекс и возвращает его cluster_id.
+        Если похожего товара нет, товар открывает новый кластер (id = его ссылка).
+        """
+        cluster_id = self.find_cluster(phash, title, exclude_link=link) or link
+        self.add(link, phash, title, cluster_id)
+        return cluster_id
+
+    def load(self, rows):
+        """Заполняет индекс строками из БД (link, title, phash, cluster_id)."""
+        for row in rows:
+            if row["phash"]:
+                self.add(
+                    row["link"],
+                    int(row["phash"], 16),
+                    row["title"],
+                    row["cluster_id"] or row["link"],
+                )
+
+
+def choose_best_offer(cluster_deals, fresh_since):
+    """
+    Выбирает, что публиковать из кластера.
+
+    :param cluster_deals: все предложения кластера (строки deals)
+    :param fresh_since: опубликованные предложения, которые видели позже этой
+        даты, считаются еще актуальными
+    :return: (лучшая неопубликованная скидка или None, ссылки на снятие с публикации)
+    """
+    pending = [d for d in cluster_deals if d.get("sent") == DEAL_PENDING]
+    if not pending:
+        return None, []
+
+    def price_key(deal):
+        price = parse_price(deal.get("price"))
+        return price if price is not None else float("inf")
+
+    best = min(pending, key=price_key)
+    others = [d["link"] for d in pending if d is not best]
+
+    # Если такой же товар уже публиковали и он все еще продается не дороже — не дублируем
+    for deal in cluster_deals:
+        if deal.get("sent") != DEAL_SENT:
+            continue
+        try:
+            last_seen = datetime.datetime.fromisoformat(str(deal.get("last_seen")))
+        except ValueError:
+            continue
+        if last_seen >= fresh_since and price_key(deal) <= price_key(best):
+            return None, others + [best["link"]]
+
+    return best, others
@@ -0,0 +1,409 @@
+"""
+Запись и воспроизведение страниц магазинов для офлайн-тестов и бенчмарков.
+
+Запись (нужны браузер и доступ к магазинам):
+
+    python fixtures.py record brandshop lamoda streetbeat
+
+Скрапер запускается как обычно, но его браузер обернут в RecordingDriver
+(Selenium) или RecordingPage (Playwright): перед каждым переходом и при
+закрытии сохраняется итоговый DOM страницы (после прокрутки и подгрузки)
+вместе с JSON из window.__NUXT__ и window.digitalData. Картинки найденных
+скидок сохраняются отдельно. Все лежит в fixtures/<магазин>/, индекс
+URL -> файл — в manifest.json.
+
+Воспроизведение:
+
+    python fixtures.py serve 8765
+    FIXTURE_SERVER=http://127.0.0.1:8765 python main.py
+
+FixtureServer отдает записанное по адресам вида /<хост>/<путь>, скраперы
+переходят на страницы через shop_url(). Внешние скрипты и стили из снимков
+убраны (состояние страницы уже в DOM, а JSON вставляется обратно inline),
+ссылки на записанные хосты переписываются на локальный сервер — скан
+проходит без сети и каждый раз одинаково. Бенчмарк — bench_scan.py.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import database
+from config import FIXTURE_SERVER, FIXTURES_DIR, HEADERS
+from scraper_registry import resolve_scraper, run_scraper
+
+MANIFEST = "manifest.json"
+
+# Адрес сервера воспроизведения; пусто — скраперы ходят в настоящие магазины
+REPLAY_URL = FIXTURE_SERVER.rstrip("/")
+
+# Активная запись (см. record); None — браузеры не оборачиваются
+RECORDER = None
+
+# Состояние страницы, которое скраперы читают из JS
+GLOBALS_EXPR = (
+    "JSON.stringify({__NUXT__: window.__NUXT__ || null, "
+    "digitalData: window.digitalData || null})"
+)
+
+_SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.S | re.I)
+_LINK_RE = re.compile(r"<link\b[^>]*>", re.I)
+_HEAD_RE = re.compile(r"<head\b[^>]*>", re.I)
+
+
+def shop_url(url):
+    """
+    URL для перехода браузера: при воспроизведении — на сервер фикстур
+    ('https://brandshop.ru/sale/' -> 'http://127.0.0.1:8765/brandshop.ru/sale/').
+    """
+    if not REPLAY_URL or not url or url.startswith(REPLAY_URL):
+        return url
+    parts = urllib.parse.urlsplit(url if "//" in url else "https://" + url)
+    if not parts.netloc:
+        return url
+    target = f"{REPLAY_URL}/{parts.netloc}{parts.path or '/'}"
+    return f"{target}?{parts.query}" if parts.query else target
+
+
+def snapshot_html(html, page_globals=None):
+    """
+    Снимок страницы для воспроизведения: без внешних скриптов и стилей,
+    с JSON-состоянием страницы, вставленным обратно inline-скриптом.
+    """
+    html = _LINK_RE.sub("", _SCRIPT_RE.sub("", html))
+    if not page_globals:
+        return html
+
+    values = page_globals
+    if isinstance(values, str):
+        values = json.loads(values)
+    assignments = "".join(
+        f"window.{name} = {json.dumps(value, ensure_ascii=False)};"
+        for name, value in values.items()
+        if value is not None
+    )
+    if not assignments:
+        return html
+    # "</" внутри строки закрыл бы тег script
+    script = "<script>" + assignments.replace("</", "<\\/") + "</script>"
+
+    head = _HEAD_RE.search(html)
+    if head:
+        return html[: head.end()] + script + html[head.end() :]
+    return script + html
+
+
+class FixtureRecorder:
+    """Складывает ответы в каталог фикстур одного магазина."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = {}
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._lock = threading.Lock()
+
+    def add(self, url, body, content_type):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        extension = mimetypes.guess_extension(content_type.split(";")[0]) or ".bin"
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + extension
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(body)
+        with self._lock:
+            self.manifest[url] = {"file": name, "content_type": content_type}
+
+    def add_page(self, url, html, page_globals=None):
+        self.add(url, snapshot_html(html, page_globals), "text/html; charset=utf-8")
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+class RecordingDriver:
+    """Selenium WebDriver, который сохраняет каждую открытую страницу."""
+
+    def __init__(self, driver, recorder):
+        self._driver = driver
+        self._recorder = recorder
+        self._url = None
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def snapshot(self):
+        if self._url is None:
+            return
+        try:
+            page_globals = self._driver.execute_script("return " + GLOBALS_EXPR)
+            self._recorder.add_page(self._url, self._driver.page_source, page_globals)
+        except Exception as e:
+            print(f"[Fixtures] Cannot record {self._url}: {e}")
+        self._url = None
+
+    def get(self, url):
+        self.snapshot()
+        self._driver.get(url)
+        self._url = url
+
+    def quit(self):
+        self.snapshot()
+        self._driver.quit()
+
+
+class RecordingPage:
+    """Страница Playwright, которая сохраняет каждую открытую страницу."""
+
+    def __init__(self, page, recorder):
+        self._page = page
+        self._recorder = recorder
+        self._url = None
+
+    def __getattr__(self, name):
+        return getattr(self._page, name)
+
+    def snapshot(self):
+        if self._url is None:
+            return
+        try:
+            page_globals = self._page.evaluate(GLOBALS_EXPR)
+            self._recorder.add_page(self._url, self._page.content(), page_globals)
+        except Exception as e:
+            print(f"[Fixtures] Cannot record {self._url}: {e}")
+        self._url = None
+
+    def goto(self, url, **kwargs):
+        self.snapshot()
+        response = self._page.goto(url, **kwargs)
+        self._url = url
+        return response
+
+    def close(self, **kwargs):
+        self.snapshot()
+        return self._page.close(**kwargs)
+
+
+def wrap_driver(driver):
+    """WebDriver скрапера: при записи — с сохранением страниц."""
+    return RecordingDriver(driver, RECORDER) if RECORDER else driver
+
+
+def wrap_page(page):
+    """Страница Playwright скрапера: при записи — с сохранением страниц."""
+    return RecordingPage(page, RECORDER) if RECORDER else page
+
+
+class FixtureServer:
+    """
+    Локальный HTTP-сервер с записанными ответами всех магазинов из
+    directory. Считает запросы и отданные байты по хостам (stats).
+    """
+
+    def __init__(self, directory=FIXTURES_DIR, host="127.0.0.1", port=0):
+        self.directory = directory
+        self.responses = {}
+        self.by_path = {}
+        self._load()
+
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+        # Длинные хосты первыми: static.brandshop.ru раньше brandshop.ru
+        hosts = sorted(
+            {urllib.parse.urlsplit(url).netloc for url in self.responses},
+            key=len,
+            reverse=True,
+        )
+        self._hosts_re = (
+            re.compile(
+                r"(?:https?:)?//(" + "|".join(re.escape(h) for h in hosts) + r")\b"
+            )
+            if hosts
+            else None
+        )
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            source_dir = os.path.join(self.directory, name)
+            path = os.path.join(source_dir, MANIFEST)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            for url, entry in manifest.items():
+                entry = dict(entry, path=os.path.join(source_dir, entry["file"]))
+                self.responses[url] = entry
+                parts = urllib.parse.urlsplit(url)
+                self.by_path.setdefault(
+                    parts.path + ("?" + parts.query if parts.query else ""), entry
+                )
+
+    def lookup(self, request_path):
+        """Запись по пути запроса /<хост>/<путь>?<query> (или /<путь>)."""
+        host, _, rest = request_path.lstrip("/").partition("/")
+        for scheme in ("https", "http"):
+            entry = self.responses.get(f"{scheme}://{host}/{rest}")
+            if entry:
+                return host, entry
+        # Относительные ссылки со страницы (href="/p/...") приходят без хоста
+        entry = self.by_path.get(request_path)
+        return ("", entry) if entry else (host, None)
+
+    def rewrite(self, html):
+        """Ссылки на записанные хосты -> на этот сервер."""
+        if self._hosts_re is None:
+            return html
+        return self._hosts_re.sub(lambda m: f"{self.url}/{m.group(1)}", html)
+
+    def _count(self, host, size):
+        with self._lock:
+            requests, sent = self.stats.get(host, (0, 0))
+            self.stats[host] = (requests + 1, sent + size)
+
+    def totals(self):
+        """(запросов, байт) по всем хостам."""
+        with self._lock:
+            values = list(self.stats.values())
+        return sum(v[0] for v in values), sum(v[1] for v in values)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                host, entry = server.lookup(self.path)
+                if entry is None:
+                    server._count(host, 0)
+                    self.send_error(404)
+                    return
+                with open(entry["path"], "rb") as f:
+                    body = f.read()
+                if entry["content_type"].startswith("text/html"):
+                    body = server.rewrite(body.decode("utf-8")).encode("utf-8")
+                server._count(host, len(body))
+                self.send_response(200)
+                self.send_header("Content-Type", entry["content_type"])
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fixture-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def record_images(recorder, deals):
+    """Картинки скидок: из скачанных браузером байтов или по URL."""
+    saved = 0
+    for deal in deals:
+        url = deal.get("image_url")
+        if not url or url in recorder.manifest:
+            continue
+        try:
+            if deal.get("image_bytes_b64"):
+                body = base64.b64decode(deal["image_bytes_b64"])
+                content_type = "image/jpeg"
+            else:
+                response = requests.get(url, headers=HEADERS, timeout=10)
+                response.raise_for_status()
+                body = response.content
+                content_type = response.headers.get("Content-Type", "image/jpeg")
+        except Exception as e:
+            print(f"[Fixtures] Cannot record image {url}: {e}")
+            continue
+        recorder.add(url, body, content_type)
+        saved += 1
+    return saved
+
+
+def record(names, directory=FIXTURES_DIR):
+    """Сканирует магазины и записывает их страницы в directory/<имя>."""
+    global RECORDER
+    old_db = database.DB_NAME
+    with tempfile.TemporaryDirectory() as tmp:
+        # Пустая база: скраперы считают все скидки новыми (StreetBeat
+        # скачивает фото только для новых)
+        database.DB_NAME = os.path.join(tmp, "deals.db")
+        database.init_db()
+        try:
+            for name in names:
+                RECORDER = FixtureRecorder(os.path.join(directory, name))
+                deals = asyncio.run(run_scraper(resolve_scraper(name)()))
+                images = record_images(RECORDER, deals)
+                RECORDER.save()
+                print(
+                    f"[Fixtures] {name}: {len(deals)} deals, "
+                    f"{len(RECORDER.manifest)} responses ({images} new images)"
+                )
+        finally:
+            RECORDER = None
+            database.DB_NAME = old_db
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == "record":
+        record(argv[1:])
+    elif argv and argv[0] == "serve":
+        port = int(argv[1]) if len(argv) > 1 else 8765
+        server = FixtureServer(port=port)
+        print(f"Serving {len(server.responses)} responses at {server.url}")
+        print(f"Run scrapers with FIXTURE_SERVER={server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("Usage: python fixtures.py record NAME [NAME...] | serve [PORT]")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -2,7 +2,10 @@ import requests
 from PIL import Image
 from io import BytesIO
 
+from metrics import timed
 
+
+@timed("process_image")
 def process_image(
     url: str, target_size: tuple = (1080, 1080), image_data: bytes = None
 ) -> BytesIO:
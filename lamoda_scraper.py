@@ -9,18 +9,28 @@ from selenium.webdriver.common.by import By
 import re
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
+from browser_watchdog import BrowserDied, is_browser_dead
 from config import LAMODA_URL
+from fixtures import shop_url
+from metrics import ITEMS_FILTERED
+from sizes import format_size, parse_size
+from text_normalization import is_target_brand, make_title
 from selenium_stealth import stealth
+from scraper import BaseScraper
+from waits import COUNT_JS, Pacer, wait_stable, wait_until
 
+CARD_SELECTOR = "div[class*='x-product-card__card']"
+SIZE_SELECTOR = "div[class*='ui-product-page-sizes-chooser-item']"
+# Не чаще одной страницы товара за столько секунд, чтобы не заблокировали
+PRODUCT_INTERVAL = 1.5
 
-class LamodaScraper:
+
+class LamodaScraper(BaseScraper):
     """
     Scraper for Lamoda.ru using standard Selenium with selenium-stealth.
     """
 
-    def __init__(self):
-        self.driver = self._get_driver()
+    SOURCE = "Lamoda"
 
     def _get_driver(self):
         options = Options()
@@ -56,134 +66,106 @@ class LamodaScraper:
 
         return driver
 
-    def close(self):
-        if self.driver:
-            self.driver.quit()
-
-    def scrape(self, max_pages: int = 1) -> list:
+    def fetch_catalog(self, max_pages: int = 1):
         """
-        Скрапинг страниц Lamoda.
-        Возвращает список словарей с данными о товарах.
+        Сбор ссылок и превью с каталога Lamoda (без размеров).
+        Отдает словари с данными о товарах по мере разбора страниц.
         """
         print(f"[LamodaScraper] Starting scrape from: {LAMODA_URL}")
-        catalog_items = []
+        self.incomplete = None
+        total = 0
 
-        try:
-            # 1. Сбор ссылок и превью с каталога
-            for page_num in range(1, max_pages + 1):
-                url = LAMODA_URL if page_num == 1 else f"{LAMODA_URL}&page={page_num}"
-                print(f"[LamodaScraper] Loading catalog page {page_num}: {url}")
-                self.driver.get(url)
+        # 1. Сбор ссылок и превью с каталога
+        for page_num in range(1, max_pages + 1):
+            url = LAMODA_URL if page_num == 1 else f"{LAMODA_URL}&page={page_num}"
+            print(f"[LamodaScraper] Loading catalog page {page_num}: {url}")
+            self.driver.get(shop_url(url))
 
-                try:
-                    WebDriverWait(self.driver, 15).until(
-                        EC.presence_of_element_located(
-                            (By.CSS_SELECTOR, "div[class*='x-product-card']")
-                        )
+            try:
+                WebDriverWait(self.driver, 15).until(
+                    EC.presence_of_element_located(
+                        (By.CSS_SELECTOR, "div[class*='x-product-card']")
                     )
-                except Exception:
-                    print(f"[LamodaScraper] Timeout on page {page_num}")
-                    # DEBUG: Save page source
-                    with open("debug_lamoda.html", "w", encoding="utf-8") as f:
-                        f.write(self.driver.page_source)
-                    print("[LamodaScraper] Saved debug_lamoda.html")
-
-                    if "403" in self.driver.title:
-                        print("[LamodaScraper] Blocked!")
-                        break
-                    continue
-
-                time.sleep(2)
-
-                product_cards = self.driver.find_elements(
-                    By.CSS_SELECTOR, "div[class*='x-product-card__card']"
-                )
-                print(
-                    f"[LamodaScraper] Found {len(product_cards)} items on page {page_num}"
                 )
-
-                for card in product_cards:
-                    item = self._parse_catalog_item(card)
-                    if item:
-                        catalog_items.append(item)
-
-                if not product_cards:
+            except Exception:
+                print(f"[LamodaScraper] Timeout on page {page_num}")
+                # DEBUG: Save page source
+                with open("debug_lamoda.html", "w", encoding="utf-8") as f:
+                    f.write(self.driver.page_source)
+                print("[LamodaScraper] Saved debug_lamoda.html")
+
+                if "403" in self.driver.title:
+                    print("[LamodaScraper] Blocked!")
+                    self.incomplete = f"blocked on page {page_num}"
                     break
+                self.incomplete = f"page {page_num} failed to load"
+                continue
+
+            # Карточки дорисовываются после первой: ждем, пока их число
+            # перестанет расти (не дольше прежней паузы в 2 с)
+            wait_stable(
+                lambda: self.driver.execute_script(COUNT_JS, CARD_SELECTOR),
+                timeout=2,
+                wait="catalog_cards",
+                source=self.SOURCE,
+            )
 
+            product_cards = self.driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
             print(
-                f"[LamodaScraper] Total catalog items collected: {len(catalog_items)}"
+                f"[LamodaScraper] Found {len(product_cards)} items on page {page_num}"
             )
 
-            # 2. Обогащение данными (Размеры) - заход на страницы
-            # Ограничим количество, чтобы не ждать вечность при тесте
-            # Но в реальном режиме сканируем все.
-            # Если это cron (max_pages=1 или 2), то нормально пройтись по 60-120 товарам.
+            # Карточки разбираем целиком до первого yield: пока генератор
+            # стоит, enrich уходит на страницы товаров и элементы устаревают
+            page_items = []
+            for card in product_cards:
+                item = self._parse_catalog_item(card)
+                if item:
+                    page_items.append(item)
+                else:
+                    ITEMS_FILTERED.inc(source=self.SOURCE)
+            total += len(page_items)
+            yield from page_items
+
+            if not product_cards:
+                break
 
-            enriched_deals = []
+        print(f"[LamodaScraper] Total catalog items collected: {total}")
+
+    def enrich(self, catalog_items: list):
+        """
+        Обогащение данными (Размеры) - заход на страницы товаров.
+        Если это cron (max_pages=1 или 2), то нормально пройтись по 60-120 товарам.
+        """
+        pacer = Pacer(PRODUCT_INTERVAL, wait="product_pace", source=self.SOURCE)
+        try:
             for i, item in enumerate(catalog_items, 1):
                 print(
                     f"[LamodaScraper] Processing {i}/{len(catalog_items)}: {item['title'][:30]}..."
                 )
                 try:
-                    self.driver.get(item["link"])
-                    time.sleep(1.5)  # Пауза чтобы не заблокировали
+                    # Пауза чтобы не заблокировали: время загрузки входит в нее
+                    pacer.wait()
+                    self.driver.get(shop_url(item["link"]))
 
                     sizes = self._extract_sizes()
                     item["sizes"] = sizes
 
-                    enriched_deals.append(item)
-
                 except Exception as e:
                     print(
                         f"[LamodaScraper] Error processing product {item['link']}: {e}"
                     )
-                    # Если ошибка соединения (драйвер упал), пробуем перезапустить
-                    if (
-                        "Connection refused" in str(e)
-                        or "10061" in str(e)
-                        or "disconnected" in str(e)
-                    ):
-                        print("[LamodaScraper] Driver died! Restarting...")
-                        try:
-                            self.close()
-                            self.driver = self._get_driver()
-                            print("[LamodaScraper] Driver restarted successfully.")
-                        except Exception as restart_error:
-                            print(
-                                f"[LamodaScraper] Failed to restart driver: {restart_error}"
-                            )
-                            break  # Если не смогли перезапустить, выходим
-
-                    # Добавляем как есть, хотя бы с пустыми размерами
-                    enriched_deals.append(item)
-
-            return enriched_deals
+                    # Драйвер упал: браузер перезапустит сторож (browser_watchdog.py)
+                    if is_browser_dead(e):
+                        raise BrowserDied(str(e)) from e
+
+                # При ошибке отдаем как есть, хотя бы с пустыми размерами
+                yield item
 
+        except BrowserDied:
+            raise
         except Exception as e:
             print(f"[LamodaScraper] Critical error: {e}")
-            return catalog_items
-
-    # Список брендов для фильтрации
-    TARGET_BRANDS = {
-        "reebok",
-        "nike",
-        "puma",
-        "diadora",
-        "new balance",
-        "converse",
-        "adidas",
-        "adidas originals",
-        "adidas y-3",
-        "adidas yeezy",
-        "asics",
-        "dc shoes",
-        "element",
-        "jordan",
-        "karhu",
-        "lacoste",
-        "saucony",
-        "vans",
-    }
 
     def _parse_catalog_item(self, card) -> dict:
         """Парсинг превью карточки (без размеров)."""
@@ -197,11 +179,11 @@ class LamodaScraper:
             brand = brand_elem.text.strip() if brand_elem else ""
 
             # Фильтрация по бренду
-            if brand.lower() not in self.TARGET_BRANDS:
+            if not is_target_brand(brand):
                 return None
 
             model = title_elem.text.strip() if title_elem else ""
-            title = f"{brand} {model}".strip()
+            title = make_title(brand, model)
 
             link_elem = card.find_element(By.CSS_SELECTOR, "a.x-product-card__pic")
             link = link_elem.get_attribute("href") if link_elem else None
@@ -277,22 +259,17 @@ class LamodaScraper:
             #   <div class="...">36 EUR</div>
             # </div>
 
-            # Wait for sizes to load
-            try:
-                WebDriverWait(self.driver, 5).until(
-                    EC.presence_of_element_located(
-                        (
-                            By.CSS_SELECTOR,
-                            "div[class*='ui-product-page-sizes-chooser-item']",
-                        )
-                    )
-                )
-            except Exception:
+            # Ждем чипы размеров (раньше перед этим всегда была пауза 1.5 с)
+            if not wait_until(
+                lambda: self.driver.execute_script(COUNT_JS, SIZE_SELECTOR),
+                timeout=5,
+                wait="size_chips",
+                source=self.SOURCE,
+                budget=0,
+            ):
                 print("DEBUG: Timeout waiting for size elements.")
 
-            size_elems = self.driver.find_elements(
-                By.CSS_SELECTOR, "div[class*='ui-product-page-sizes-chooser-item']"
-            )
+            size_elems = self.driver.find_elements(By.CSS_SELECTOR, SIZE_SELECTOR)
 
             for elem in size_elems:
                 class_attr = elem.get_attribute("class")
@@ -301,24 +278,13 @@ class LamodaScraper:
 
                 text_content = elem.get_attribute("textContent").strip()
 
-                # Regex for "38 EUR", "38.5 EUR", "38,5 EUR"
-                # Looking for digits, maybe comma/dot, then space EUR
-                eur_match = re.search(r"(\d+(?:[.,]\d+)?)\s*EUR", text_content)
-                if eur_match:
-                    # Found EUR size
-                    eur_size = eur_match.group(1)
-                    sizes.append(f"EU {eur_size}")
-                else:
-                    # Fallback to RUS
-                    rus_match = re.search(
-                        r"(\d+(?:[.,]\d+)?)\s*RUS", text_content, re.IGNORECASE
-                    )
-                    if rus_match:
-                        rus_size = rus_match.group(1)
-                        sizes.append(f"{rus_size} RUS")
-                    elif text_content:
-                        # Just take whatever text if no pattern matches, but clean it
-                        sizes.append(text_content.replace("\n", " ").strip())
+                # "38 EUR", "38,5 EUR" или только "37 RUS" -> размер EU
+                eu_size = parse_size(text_content)
+                if eu_size is not None:
+                    sizes.append(f"EU {format_size(eu_size)}")
+                elif text_content:
+                    # Just take whatever text if no pattern matches, but clean it
+                    sizes.append(text_content.replace("\n", " ").strip())
 
             return sizes
         except Exception as e:
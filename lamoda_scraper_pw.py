@@ -1,162 +1,218 @@
-import time
 import re
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 from playwright_stealth import Stealth
+from browser_watchdog import BrowserDied, is_browser_dead
 from config import LAMODA_URL
+from fixtures import shop_url, wrap_page
+from metrics import ITEMS_FILTERED
+from sizes import format_size, parse_size
+from text_normalization import is_target_brand, make_title
+from waits import Pacer, wait_stable
+
+CARD_SELECTOR = "div[class*='x-product-card__card']"
+SIZE_SELECTOR = "div[class*='ui-product-page-sizes-chooser-item']"
+# Polite delay: at most one product page per this many seconds
+PRODUCT_INTERVAL = 0.5
 
 
 class LamodaScraperPW:
     """
     Playwright-based scraper for Lamoda.ru.
+    Browser is started on first use and lives until close(); all calls must
+    come from the same thread (Playwright sync API requirement).
     """
 
+    SOURCE = "Lamoda"
+    # Why the last fetch_catalog() missed part of the catalog (see BaseScraper)
+    incomplete = None
+
     def __init__(self):
-        # Playwright manages its own browser instance lifecycle in the context manager usually,
-        # but here we might want to wrap it in a class.
-        pass
+        self._playwright = None
+        self._browser = None
+        self._page = None
+
+    def _get_page(self):
+        if self._page is not None:
+            return self._page
+
+        self._playwright = sync_playwright().start()
+        # headless=False is good for debugging, but for production use True
+        # Timeweb might need headless=True
+        self._browser = self._playwright.chromium.launch(
+            headless=True,
+            args=[
+                "--disable-blink-features=AutomationControlled",
+                "--disable-infobars",
+                "--no-sandbox",
+                "--disable-gpu",
+                "--start-maximized",
+            ],
+        )
+
+        # Create context with stealth
+        # Note: stealth is applied to page or context
+        context = self._browser.new_context(
+            viewport={"width": 1920, "height": 1080},
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            locale="ru-RU",
+        )
+
+        page = context.new_page()
+
+        # Additional script to hide webdriver
+        page.add_init_script(
+            "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+        )
+
+        # Apply stealth
+        stealth = Stealth()
+        stealth.apply_stealth_sync(page)
+
+        self._page = wrap_page(page)
+        return self._page
+
+    def browser_pid(self):
+        """PID of the Playwright driver process; Chromium is its child."""
+        try:
+            connection = self._playwright._impl_obj._connection
+            return connection._transport._proc.pid
+        except AttributeError:
+            return None
+
+    def close(self):
+        try:
+            if self._page:
+                # Closing the page first lets a recording page save its snapshot
+                try:
+                    self._page.close()
+                except Exception:
+                    pass
+            if self._browser:
+                self._browser.close()
+        finally:
+            if self._playwright:
+                self._playwright.stop()
+            self._playwright = self._browser = self._page = None
 
     def scrape(self, max_pages: int = 1) -> List[Dict]:
+        try:
+            return list(self.enrich(list(self.fetch_catalog(max_pages))))
+        finally:
+            self.close()
+
+    def fetch_catalog(self, max_pages: int = 1) -> Iterator[Dict]:
+        """Yield items from catalog pages (without sizes), page by page."""
         print(f"[LamodaScraperPW] Starting scrape from: {LAMODA_URL}")
-        deals = []
-
-        with sync_playwright() as p:
-            # Launch browser
-            # headless=False is good for debugging, but for production use True
-            # Timeweb might need headless=True
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-infobars",
-                    "--no-sandbox",
-                    "--disable-gpu",
-                    "--start-maximized",
-                ],
-            )
+        self.incomplete = None
+        total = 0
 
-            # Create context with stealth
-            # Note: stealth is applied to page or context
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                locale="ru-RU",
-            )
+        page = self._get_page()
+        for page_num in range(1, max_pages + 1):
+            url = LAMODA_URL if page_num == 1 else f"{LAMODA_URL}&page={page_num}"
+            print(f"[LamodaScraperPW] Loading catalog page {page_num}: {url}")
 
-            page = context.new_page()
+            try:
+                page.goto(shop_url(url), timeout=60000, wait_until="domcontentloaded")
+
+                # Debug: Check webdriver property
+                is_webdriver = page.evaluate("navigator.webdriver")
+                print(f"[LamodaScraperPW] navigator.webdriver = {is_webdriver}")
+
+                # Wait for cards
+                page.wait_for_selector(CARD_SELECTOR, timeout=15000)
+            except Exception as e:
+                print(
+                    f"[LamodaScraperPW] Timeout or error loading page {page_num}: {e}"
+                )
 
-            # Additional script to hide webdriver
-            page.add_init_script(
-                "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+                # Debug: Save screenshot and HTML
+                page.screenshot(path=f"debug_lamoda_pw_page_{page_num}.png")
+                with open(
+                    f"debug_lamoda_pw_page_{page_num}.html",
+                    "w",
+                    encoding="utf-8",
+                ) as f:
+                    f.write(page.content())
+
+                if "403" in page.title():
+                    print("[LamodaScraperPW] 403 Forbidden detected!")
+                    self.incomplete = f"blocked on page {page_num}"
+                    break
+                self.incomplete = f"page {page_num} failed to load"
+                continue
+
+            # Scroll to load lazy images? Lamoda uses infinite scroll sometimes but pagination is present.
+            # Just in case, scroll a bit.
+            page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+            # Wait until the card count stops growing (at most the old 1 s sleep)
+            wait_stable(
+                page.locator(CARD_SELECTOR).count,
+                timeout=1,
+                wait="catalog_cards",
+                source=self.SOURCE,
             )
 
-            # Apply stealth
-            stealth = Stealth()
-            stealth.apply_stealth_sync(page)
+            cards = page.query_selector_all(CARD_SELECTOR)
+            print(f"[LamodaScraperPW] Found {len(cards)} items on page {page_num}")
 
-            try:
-                # 1. Collect items from catalog
-                catalog_items = []
-                for page_num in range(1, max_pages + 1):
-                    url = (
-                        LAMODA_URL if page_num == 1 else f"{LAMODA_URL}&page={page_num}"
-                    )
-                    print(f"[LamodaScraperPW] Loading catalog page {page_num}: {url}")
-
-                    try:
-                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-
-                        # Debug: Check webdriver property
-                        is_webdriver = page.evaluate("navigator.webdriver")
-                        print(f"[LamodaScraperPW] navigator.webdriver = {is_webdriver}")
-
-                        # Wait for cards
-                        page.wait_for_selector(
-                            "div[class*='x-product-card__card']", timeout=15000
-                        )
-                    except Exception as e:
-                        print(
-                            f"[LamodaScraperPW] Timeout or error loading page {page_num}: {e}"
-                        )
-
-                        # Debug: Save screenshot and HTML
-                        page.screenshot(path=f"debug_lamoda_pw_page_{page_num}.png")
-                        with open(
-                            f"debug_lamoda_pw_page_{page_num}.html",
-                            "w",
-                            encoding="utf-8",
-                        ) as f:
-                            f.write(page.content())
-
-                        if "403" in page.title():
-                            print("[LamodaScraperPW] 403 Forbidden detected!")
-                            break
-                        continue
-
-                    # Scroll to load lazy images? Lamoda uses infinite scroll sometimes but pagination is present.
-                    # Just in case, scroll a bit.
-                    page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-                    time.sleep(1)
-
-                    cards = page.query_selector_all(
-                        "div[class*='x-product-card__card']"
-                    )
-                    print(
-                        f"[LamodaScraperPW] Found {len(cards)} items on page {page_num}"
-                    )
-
-                    for card in cards:
-                        item = self._parse_catalog_item(card)
-                        if item:
-                            catalog_items.append(item)
-
-                    if not cards:
-                        break
+            # Parse the whole page before yielding: enrich() navigates
+            # away while this generator is suspended
+            page_items = []
+            for card in cards:
+                item = self._parse_catalog_item(card)
+                if item:
+                    page_items.append(item)
+                else:
+                    ITEMS_FILTERED.inc(source=self.SOURCE)
+            total += len(page_items)
+            yield from page_items
 
-                print(
-                    f"[LamodaScraperPW] Total catalog items collected: {len(catalog_items)}"
+            if not cards:
+                break
+
+        print(f"[LamodaScraperPW] Total catalog items collected: {total}")
+
+    def enrich(self, catalog_items: List[Dict]) -> Iterator[Dict]:
+        """Open product pages and fill in sizes."""
+        try:
+            page = self._get_page()
+        except Exception as e:
+            print(f"[LamodaScraperPW] Critical error: {e}")
+            yield from catalog_items
+            return
+
+        pacer = Pacer(PRODUCT_INTERVAL, wait="product_pace", source=self.SOURCE)
+        for i, item in enumerate(catalog_items, 1):
+            print(
+                f"[LamodaScraperPW] Processing {i}/{len(catalog_items)}: {item['title'][:30]}..."
+            )
+            try:
+                # Polite delay, counted from the previous navigation
+                pacer.wait()
+                page.goto(
+                    shop_url(item["link"]),
+                    timeout=45000,
+                    wait_until="domcontentloaded",
                 )
 
-                # 2. Enrich with sizes
-                enriched_deals = []
-                for i, item in enumerate(catalog_items, 1):
-                    print(
-                        f"[LamodaScraperPW] Processing {i}/{len(catalog_items)}: {item['title'][:30]}..."
-                    )
-                    try:
-                        page.goto(
-                            item["link"], timeout=45000, wait_until="domcontentloaded"
-                        )
-
-                        # Wait a bit for sizes to initialize
-                        try:
-                            page.wait_for_selector(
-                                "div[class*='ui-product-page-sizes-chooser-item']",
-                                timeout=5000,
-                            )
-                        except PlaywrightTimeoutError:
-                            pass
-
-                        sizes = self._extract_sizes(page)
-                        item["sizes"] = sizes
-                        enriched_deals.append(item)
-
-                        # Polite delay
-                        time.sleep(0.5)
-
-                    except Exception as e:
-                        print(f"[LamodaScraperPW] Error processing {item['link']}: {e}")
-                        enriched_deals.append(item)
-
-                deals = enriched_deals
+                # Wait a bit for sizes to initialize
+                try:
+                    page.wait_for_selector(SIZE_SELECTOR, timeout=5000)
+                except PlaywrightTimeoutError:
+                    pass
+
+                sizes = self._extract_sizes(page)
+                item["sizes"] = sizes
 
             except Exception as e:
-                print(f"[LamodaScraperPW] Critical error: {e}")
-            finally:
-                browser.close()
+                print(f"[LamodaScraperPW] Error processing {item['link']}: {e}")
+                # The watchdog restarts the browser (browser_watchdog.py)
+                if is_browser_dead(e):
+                    raise BrowserDied(str(e)) from e
 
-        return deals
+            yield item
 
     def _parse_catalog_item(self, card_handle) -> Optional[Dict]:
         try:
@@ -167,28 +223,8 @@ class LamodaScraperPW:
             )
             brand = brand_el.inner_text().strip() if brand_el else ""
 
-            # Filter (same logic as before)
-            TARGET_BRANDS = {
-                "reebok",
-                "nike",
-                "puma",
-                "diadora",
-                "new balance",
-                "converse",
-                "adidas",
-                "adidas originals",
-                "adidas y-3",
-                "adidas yeezy",
-                "asics",
-                "dc shoes",
-                "element",
-                "jordan",
-                "karhu",
-                "lacoste",
-                "saucony",
-                "vans",
-            }
-            if brand.lower() not in TARGET_BRANDS:
+            # Filter
+            if not is_target_brand(brand):
                 return None
 
             # Name
@@ -196,7 +232,7 @@ class LamodaScraperPW:
                 "div.x-product-card-description__product-name"
             )
             model = name_el.inner_text().strip() if name_el else ""
-            title = f"{brand} {model}".strip()
+            title = make_title(brand, model)
 
             # Link
             link_el = card_handle.query_selector("a.x-product-card__pic")
@@ -261,9 +297,7 @@ class LamodaScraperPW:
         sizes = []
         try:
             # Select all size elements
-            size_elems = page.query_selector_all(
-                "div[class*='ui-product-page-sizes-chooser-item']"
-            )
+            size_elems = page.query_selector_all(SIZE_SELECTOR)
 
             for elem in size_elems:
                 class_attr = elem.get_attribute("class") or ""
@@ -272,18 +306,12 @@ class LamodaScraperPW:
 
                 text = elem.inner_text().strip()
 
-                # Logic from old scraper
-                eur_match = re.search(r"(\d+(?:[.,]\d+)?)\s*EUR", text)
-                if eur_match:
-                    sizes.append(f"EU {eur_match.group(1)}")
+                # EUR в приоритете, иначе RUS переводится в EU (см. sizes.py)
+                eu_size = parse_size(text)
+                if eu_size is not None:
+                    sizes.append(f"EU {format_size(eu_size)}")
                 else:
-                    rus_match = re.search(
-                        r"(\d+(?:[.,]\d+)?)\s*RUS", text, re.IGNORECASE
-                    )
-                    if rus_match:
-                        sizes.append(f"{rus_match.group(1)} RUS")
-                    else:
-                        sizes.append(text.replace("\n", " "))
+                    sizes.append(text.replace("\n", " "))
 
             return sizes
         except Exception as e:
@@ -1,31 +1,99 @@
+import argparse
 import asyncio
 import logging
-import base64
 import time
-from functools import partial
+import datetime
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
-    InlineKeyboardMarkup,
-    InlineKeyboardButton,
 )
-from config import BOT_TOKEN, CHANNEL_ID
+from config import (
+    BOT_TOKEN,
+    CHANNEL_ID,
+    EXTRA_CHANNELS,
+    REPOST_DAYS,
+    ALBUM_MODE,
+    ALBUM_SIZE,
+    ALBUM_GROUP_BY,
+    SCRAPERS,
+    SCRAPER_CONCURRENCY,
+    METRICS_PORT,
+    ADMIN_IDS,
+    ROLE,
+    QUEUE_POLL_INTERVAL,
+)
 from database import (
+    DELIVERY_REJECTED,
     init_db,
-    deal_exists,
-    save_deal,
+    force_source_scans,
+    get_leases,
+    save_deals,
     get_next_pending_deal,
     mark_deal_as_sent,
+    set_deal_cluster,
+    get_hashed_deals,
+    get_alerts_version,
+    get_failed_deliveries,
+    get_queued_deliveries,
+    queue_deliveries,
+    record_deliveries,
+    get_cluster_deals,
+    mark_deals_skipped,
+    get_state,
+    set_state,
+    drop_stale_deals,
+    requeue_deal,
+    add_subscriber,
+    deactivate_subscriber,
+    get_recipients,
+    get_pending_deals,
+    count_pending_deals,
+    get_deal,
+    add_alert,
+    delete_alert,
+    get_alerts,
+    get_unrendered_deals,
+    save_render,
+    record_render_failure,
+    record_scan_run,
+    get_scan_stats,
+    get_last_source_runs,
+)
+from dedup import ProductIndex, photo_phash, choose_best_offer
+from scoring import deal_score, detect_brand
+from rate_limiter import RateLimiter
+from broadcast import (
+    ALBUM_PREFIX,
+    ALERT_PREFIX,
+    BUTTONS_SUFFIX,
+    album_key,
+    alert_key,
+    album_links,
+    broadcast_album,
+    broadcast_album_buttons,
+    broadcast_post,
 )
-from scraper import get_discounts
-from lamoda_scraper_pw import get_lamoda_discounts
-from streetbeat_scraper import get_streetbeat_discounts
-from image_processing import process_image
+from alerts import AlertIndex, parse_alert_args, describe_alert
+from scraper_registry import load_scrapers, stream_scraper
+from scraper_workers import shutdown_pools
+from pipeline import merge, micro_batches
+from source_scheduler import SourceScheduler
+import profiling
+import roles
+from metrics import DEALS_NEW, DEALS_SENT, QUEUE_DEPTH, STAGE_SECONDS, start_server
 from affiliate_manager import AffiliateManager
-from aiogram.types import BufferedInputFile
-from utils import format_sizes, clean_title
+from rendering import (
+    RENDER_PHOTO_RETRIES,
+    RENDER_VERSION,
+    has_image,
+    load_post,
+    post_from_render,
+    render_deal,
+    render_photo,
+    track_channels,
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -34,17 +102,63 @@ logging.basicConfig(level=logging.INFO)
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
-# Список ID пользователей для рассылки (в идеале хранить в БД)
-SUBSCRIBERS = set()
-
 # Интервал публикации (в секундах)
 PUBLISH_INTERVAL = 20 * 60  # 20 минут
 LAST_PUBLISH_TIME = 0.0
 
+# Сколько раз пробуем опубликовать скидку, прежде чем снять ее с очереди
+MAX_SEND_ATTEMPTS = 3
+SEND_RETRY_DELAY = 60  # секунд между повторными попытками публикации
+
+# Персональные подписки пользователей (бренд/размер/цена/скидка)
+ALERT_INDEX = AlertIndex()
+# Как часто публикатор проверяет очередь личных уведомлений (секунд);
+# в том же процессе его сразу будит ALERTS_QUEUED
+ALERT_POLL_INTERVAL = 5
+
+# Альбом собирается, только если набралось хотя бы столько скидок
+ALBUM_MIN_SIZE = 2
+# Сколько скидок из головы очереди просматривать при подборе альбома
+ALBUM_CANDIDATES = 50
+# Ключ bot_state с составом альбома, который сейчас рассылается
+ALBUM_STATE_KEY = "album_in_progress"
+
+# Все исходящие вызовы Telegram идут через общий ограничитель. Рассылки
+# (посты и личные уведомления) отправляет только процесс-публикатор, так
+# что лимит Telegram соблюдается при любом числе процессов-скраперов
+LIMITER = RateLimiter()
+
+# Шаблоны партнерских ссылок компилируются один раз на весь процесс
+AFFILIATE = AffiliateManager()
+
+# Будит publisher_task, когда run_scrapers кладет в очередь новые скидки.
+# Создается в main(), чтобы быть привязанным к работающему event loop.
+DEALS_QUEUED = None
+# Будит alert_sender_task, когда в очередь попадают личные уведомления
+ALERTS_QUEUED = None
+
+# Индекс картинок для поиска одного товара в разных магазинах
+PRODUCT_INDEX = ProductIndex()
+
+# Подписки и хэши товаров меняют и другие процессы (см. roles.py): индексы
+# в памяти догружаются из БД перед каждой пачкой скидок (sync_indexes)
+ALERTS_VERSION = None
+PRODUCT_INDEX_SYNCED = None
+# Перекрытие при догрузке хэшей — на случай расхождения часов узлов (секунд)
+INDEX_SYNC_SLACK = 300
+
+# За сколько дней считать сводку /stats
+STATS_DAYS = 7
+
+# Общий лимит одновременно сканируемых магазинов (SCRAPER_CONCURRENCY) для
+# всех сканов процесса (/latest тоже идет через расписание). Создается при
+# первом скане.
+SCAN_SLOTS = None
+
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
-    SUBSCRIBERS.add(message.chat.id)
+    add_subscriber(message.chat.id)
     kb = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="🚀 Погнали!"), KeyboardButton(text="🔍 Поиск скидок")]
@@ -54,12 +168,153 @@ async def cmd_start(message: types.Message):
     await message.answer(
         "Привет! 👟 Я буду мониторить скидки на кроссовки в популярных магазинах.\n"
         "Скидки публикуются в канал @Sneaker_Deals плавно в течение дня.\n\n"
-        "Я автоматически ищу новые скидки каждые 30 минут.",
+        "Я автоматически ищу новые скидки каждые 30 минут.\n\n"
+        "🔔 Хотите получать в личку только нужное? Настройте подписку:\n"
+        "/alert brand=nike size=42 price=15000 discount=30",
         reply_markup=kb,
         parse_mode="HTML",
     )
 
 
+@dp.message(Command("stop"))
+async def cmd_stop(message: types.Message):
+    deactivate_subscriber(message.chat.id)
+    await message.answer(
+        "Рассылка в личные сообщения отключена. Вернуть ее можно командой /start."
+    )
+
+
+@dp.message(Command("alert"))
+async def cmd_alert(message: types.Message, command: CommandObject):
+    try:
+        fields = parse_alert_args(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"{e}\n\n"
+            "Пример: /alert brand=nike size=42,42.5 price=15000 discount=30\n"
+            "Любой параметр можно опустить."
+        )
+        return
+
+    alert = add_alert(message.chat.id, **fields)
+    ALERT_INDEX.add(alert)
+    await message.answer(
+        f"🔔 Подписка #{alert['id']} создана: {describe_alert(alert)}.\n"
+        "Подходящие скидки буду присылать сюда сразу после скана."
+    )
+
+
+@dp.message(Command("alerts"))
+async def cmd_alerts(message: types.Message):
+    alerts = get_alerts(message.chat.id)
+    if not alerts:
+        await message.answer("Подписок пока нет. Создать: /alert brand=nike size=42")
+        return
+    lines = [f"#{alert['id']}: {describe_alert(alert)}" for alert in alerts]
+    await message.answer(
+        "🔔 Ваши подписки:\n" + "\n".join(lines) + "\n\nУдалить: /unalert <номер>"
+    )
+
+
+@dp.message(Command("unalert"))
+async def cmd_unalert(message: types.Message, command: CommandObject):
+    arg = (command.args or "").strip().lstrip("#")
+    if not arg.isdigit():
+        await message.answer("Укажите номер подписки: /unalert 3")
+        return
+    if delete_alert(message.chat.id, int(arg)):
+        ALERT_INDEX.remove(int(arg))
+        await message.answer(f"Подписка #{arg} удалена.")
+    else:
+        await message.answer(f"Подписка #{arg} не найдена.")
+
+
+def is_admin(message: types.Message):
+    return message.from_user is not None and message.from_user.id in ADMIN_IDS
+
+
+def _seconds(value):
+    return "—" if value is None else f"{value:.0f} с"
+
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    """Сводка сканов за неделю из scan_runs / scan_source_runs (для админов)."""
+    if not is_admin(message):
+        await message.answer("Команда доступна только администраторам.")
+        return
+
+    runs, sources = get_scan_stats(days=STATS_DAYS)
+    if not runs["runs"]:
+        await message.answer(f"За {STATS_DAYS} дней сканов не было.")
+        return
+
+    lines = [
+        f"📊 Сканы за {STATS_DAYS} дней: {runs['runs']} "
+        f"(с ошибками: {runs['failed_runs'] or 0}), "
+        f"длительность p50 {_seconds(runs['p50'])}, p95 {_seconds(runs['p95'])}",
+        "",
+    ]
+    for row in sources:
+        lines.append(
+            f"{row['source']}: сканов {row['runs']}, ошибок {row['errors']}, "
+            f"товаров в среднем {row['avg_items']:.0f}, новых {row['new_deals']}, "
+            f"p50 {_seconds(row['p50'])}, p95 {_seconds(row['p95'])}"
+        )
+
+    broken = [row for row in get_last_source_runs() if row["error"]]
+    if broken:
+        lines.append("")
+        lines.append("⚠️ Последний скан упал:")
+        for row in broken:
+            lines.append(f"{row['source']} ({row['started_at'][:16]}): {row['error']}")
+
+    leases = get_leases()
+    if leases:
+        lines.append("")
+        lines.append("🖥 Узлы:")
+        for name, (holder, left) in sorted(leases.items()):
+            lines.append(f"{name}: {holder} (аренда еще {left:.0f} с)")
+
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: types.Message, command: CommandObject):
+    """
+    /profile — статус, /profile scan|publish|all [sample|cprofile] — включить,
+    /profile off — выключить (для админов).
+    """
+    if not is_admin(message):
+        await message.answer("Команда доступна только администраторам.")
+        return
+
+    args = (command.args or "").split()
+    if args:
+        target = args[0].lower()
+        if target == "off":
+            profiling.disable()
+        else:
+            cycles = profiling.CYCLES if target == "all" else [target]
+            mode = args[1].lower() if len(args) > 1 else None
+            try:
+                profiling.enable(cycles, mode)
+            except ValueError:
+                await message.answer(
+                    f"Использование: /profile {'|'.join(profiling.CYCLES)}|all "
+                    f"[{'|'.join(profiling.MODES)}] или /profile off"
+                )
+                return
+
+    if profiling.ENABLED:
+        await message.answer(
+            f"🔬 Профилируются: {', '.join(sorted(profiling.ENABLED))} "
+            f"({profiling.MODE}). Отчеты: data/profiles/"
+        )
+    else:
+        await message.answer("Профилирование выключено.")
+
+
 @dp.message(F.text == "🚀 Погнали!")
 async def handle_home_button(message: types.Message):
     await cmd_start(message)
@@ -72,234 +327,624 @@ async def handle_search_button(message: types.Message):
 
 @dp.message(Command("latest"))
 async def cmd_latest(message: types.Message):
-    await message.answer("🔍 Запускаю внеплановый скан магазинов...")
-    # Запускаем скан
-    await run_scrapers()
-
-    # Пробуем отправить одну скидку сразу (вне очереди) для проверки
+    # Скан запускает планировщик (в этом или другом процессе): так он не
+    # пересекается со сканом того же магазина по расписанию
+    force_source_scans()
     await message.answer(
-        "✅ Скан завершен. Новые скидки добавлены в очередь и будут опубликованы по графику."
+        "🔍 Внеплановый скан запрошен. Новые скидки попадут в очередь "
+        "и будут опубликованы по графику."
     )
 
 
-async def run_scrapers():
+async def run_scrapers(names=None):
     """
     Запускает парсеры, находит товары и сохраняет их в БД с флагом sent=0.
+    Скидки пишутся в БД пачками по мере разбора (см. pipeline.py), так что
+    первые из них попадают в очередь, пока остальные магазины еще сканируются.
     Ничего не отправляет в Телеграм.
+    :param names: какие магазины сканировать (по умолчанию все из SCRAPERS)
+    :return: имя магазина -> число новых и изменившихся скидок
+        (None, если скан магазина упал)
     """
-    print("[Scraper] Starting periodic scan...")
-    loop = asyncio.get_running_loop()
-
-    try:
-        brandshop_deals = await loop.run_in_executor(None, get_discounts)
-    except Exception as e:
-        print(f"[Scraper] Brandshop error: {e}")
-        brandshop_deals = []
-
-    try:
-        lamoda_deals = await loop.run_in_executor(None, get_lamoda_discounts)
-    except Exception as e:
-        print(f"[Scraper] Lamoda error: {e}")
-        lamoda_deals = []
+    global SCAN_SLOTS
+    if SCAN_SLOTS is None:
+        SCAN_SLOTS = asyncio.Semaphore(SCRAPER_CONCURRENCY)
+
+    names = SCRAPERS if names is None else names
+    with STAGE_SECONDS.time(stage="scan", source=",".join(names)):
+        with profiling.profile("scan"):
+            return await _run_scrapers(names)
+
+
+def _source_run(source, started_at, error=None):
+    """Пустая строка scan_source_runs для магазина."""
+    return {
+        "source": source,
+        "started_at": started_at,
+        "duration": 0.0,
+        "items": 0,
+        "new_deals": 0,
+        "changed_deals": 0,
+        "dropped_deals": 0,
+        "error": error,
+    }
+
+
+async def _run_scrapers(names):
+    print(f"[Scraper] Starting scan: {', '.join(names)}")
+    scan_started = datetime.datetime.now()
+    started = time.monotonic()
+
+    scrapers = [(name, scraper) for name in names for scraper in load_scrapers([name])]
+    name_by_source = {scraper.source: name for name, scraper in scrapers}
+    # Итоги по магазинам для scan_source_runs; магазин, который не удалось
+    # загрузить, тоже попадает в историю — с ошибкой
+    source_runs = {
+        scraper.source: _source_run(scraper.source, scan_started)
+        for _, scraper in scrapers
+    }
+    loaded = set(name_by_source.values())
+    for name in names:
+        if name not in loaded:
+            source_runs[name] = _source_run(name, scan_started, "scraper not loaded")
+
+    async def scan(scraper):
+        async with SCAN_SLOTS:
+            run = source_runs[scraper.source]
+            run["started_at"] = datetime.datetime.now()
+            source_started = time.monotonic()
+            try:
+                async for deal in stream_scraper(scraper):
+                    run["items"] += 1
+                    yield deal
+            except Exception as e:
+                print(f"[Scraper] {scraper.source} error: {e}")
+                run["error"] = str(e) or type(e).__name__
+            finally:
+                run["duration"] = time.monotonic() - source_started
+
+    total = 0
+    new_count = 0
+    stream = merge([scan(scraper) for _, scraper in scrapers])
+    async for batch in micro_batches(stream):
+        total += len(batch)
+        new_deals, changed_links = await save_batch(batch)
+        new_count += len(new_deals)
+
+        source_by_link = {deal["link"]: deal.get("source") for deal in batch}
+        for deal in new_deals:
+            if deal.get("source") in source_runs:
+                source_runs[deal["source"]]["new_deals"] += 1
+        for link in changed_links:
+            if source_by_link[link] in source_runs:
+                source_runs[source_by_link[link]]["changed_deals"] += 1
+
+    print(f"[Scraper] Found {total} total items")
+
+    # Скидки, которые источник больше не отдает (STALE_SCANS успешных сканов
+    # подряд), снимаем с очереди.
+    # Если источник упал, обошел каталог не полностью (IncompleteScan) или
+    # ничего не вернул, его очередь не трогаем.
+    dropped = 0
+    for source_name, run in source_runs.items():
+        if run["items"] and not run["error"]:
+            run["dropped_deals"] = drop_stale_deals(source_name, scan_started)
+            dropped += run["dropped_deals"]
+    if dropped:
+        print(f"[Scraper] Dropped {dropped} stale deals from the queue")
+
+    runs = list(source_runs.values())
+    record_scan_run(
+        {
+            "started_at": scan_started,
+            "duration": time.monotonic() - started,
+            "sources": ",".join(names),
+            "items": total,
+            "new_deals": new_count,
+            "changed_deals": sum(run["changed_deals"] for run in runs),
+            "dropped_deals": dropped,
+            "errors": sum(1 for run in runs if run["error"]),
+        },
+        runs,
+    )
 
-    try:
-        streetbeat_deals = await loop.run_in_executor(None, get_streetbeat_discounts)
-    except Exception as e:
-        print(f"[Scraper] StreetBeat error: {e}")
-        streetbeat_deals = []
+    print(f"[Scraper] Scan finished. New/Resurfaced deals queued: {new_count}")
+    changes = {}
+    for source_name, run in source_runs.items():
+        name = name_by_source.get(source_name, source_name)
+        changes[name] = (
+            None if run["error"] else run["new_deals"] + run["changed_deals"]
+        )
+    return changes
 
-    all_deals = brandshop_deals + lamoda_deals + streetbeat_deals
-    print(f"[Scraper] Found {len(all_deals)} total items. Saving to DB...")
 
-    new_count = 0
-    for deal in all_deals:
-        # Проверяем наличие.
-        is_known = deal_exists(deal["link"])
-
-        # Сохраняем всегда, чтобы обновить last_seen.
-        # Если is_known=False (новый), то sent=False (по умолчанию в save_deal, если не передать)
-        # Если мы передадим sent=False для СТАРОГО товара, save_deal НЕ перезапишет sent=1 на 0.
-
-        save_deal(
-            deal["title"],
-            deal["price"],
-            deal["old_price"],
-            deal["link"],
-            sizes=deal.get("sizes"),
-            image_url=deal.get("image_url"),
-            source=deal.get("source"),
-            image_bytes_b64=deal.get("image_bytes_b64"),
-            sent=False,  # Это ни на что не повлияет для старых записей, но для новых поставит 0
-        )
+async def save_batch(batch):
+    """
+    Сохраняет пачку скидок одной транзакцией, кластеризует новые, рендерит
+    скидки пачки без готового поста, отправляет подписчикам и будит
+    публикатор.
+    :return: (новые скидки пачки, ссылки изменившихся известных скидок)
+    """
+    sync_indexes()
+    for deal in batch:
+        deal["score"] = deal_score(deal)
+
+    # Сохраняем всегда, чтобы обновить last_seen; у уже известных скидок
+    # флаг sent не меняется
+    new_links, changed_links = save_deals(batch)
+    new_links = set(new_links)
+    new_deals = list(
+        {deal["link"]: deal for deal in batch if deal["link"] in new_links}.values()
+    )
+    for deal in new_deals:
+        DEALS_NEW.inc(source=deal.get("source") or "")
 
-        if not is_known:
-            new_count += 1
+    photos = await cluster_new_deals(new_deals)
+    await render_pending_deals([deal["link"] for deal in batch], photos)
+    if not new_deals:
+        return [], changed_links
 
-    print(f"[Scraper] Scan finished. New/Resurfaced deals queued: {new_count}")
+    if len(ALERT_INDEX):
+        queue_alerts(new_deals)
+    if DEALS_QUEUED is not None:
+        DEALS_QUEUED.set()
+    return new_deals, changed_links
 
 
-async def send_single_deal(deal_data, target_id=None):
+def sync_indexes():
     """
-    Отправляет одну конкретную скидку (словарь deal_data из БД) в target_id (или в канал).
+    Подтягивает в ALERT_INDEX и PRODUCT_INDEX изменения из БД: подписки,
+    добавленные или удаленные в процессе бота, и товары, которые
+    кластеризовали другие скраперы.
     """
-    loop = asyncio.get_running_loop()
+    global ALERT_INDEX, ALERTS_VERSION, PRODUCT_INDEX_SYNCED
+    version = get_alerts_version()
+    if version != ALERTS_VERSION:
+        index = AlertIndex()
+        index.load(get_alerts())
+        ALERT_INDEX, ALERTS_VERSION = index, version
 
-    # Восстанавливаем данные из БД
-    link = deal_data["link"]
-    title = deal_data["title"]
-    price = deal_data["price"]
-    old_price = deal_data["old_price"]
-    source_name = deal_data.get("source", "Unknown")
-    image_url = deal_data.get("image_url")
-    image_bytes_b64 = deal_data.get("image_bytes_b64")
-
-    sizes_str_db = deal_data.get("sizes", "")
-    # В БД хранится строка "36,37,...". Нам нужно отформатировать красиво.
-    if sizes_str_db:
-        sizes_list = sizes_str_db.split(",")
-    else:
-        sizes_list = []
+    synced = time.time()
+    since = None
+    if PRODUCT_INDEX_SYNCED is not None:
+        since = PRODUCT_INDEX_SYNCED - INDEX_SYNC_SLACK
+    PRODUCT_INDEX.load(get_hashed_deals(since))
+    PRODUCT_INDEX_SYNCED = synced
 
-    formatted_sizes = format_sizes(sizes_list)
-    size_label = "Размер" if len(sizes_list) == 1 else "Размеры"
-    cleaned_title = clean_title(title)
 
-    # Партнерская ссылка
-    aff_manager = AffiliateManager()
-    aff_link = aff_manager.convert_link(link, source_name)
+def photo_with_phash(deal):
+    """Фото поста и его dHash (блокирующая — запускать в executor)."""
+    photo = render_photo(deal)
+    return photo, photo_phash(photo) if photo else None
 
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="Посмотреть", url=aff_link)]]
-    )
 
-    price_line = f"💰 <b>{price}</b>"
-    if old_price:
-        price_line += f" (было {old_price})"
+async def cluster_new_deals(deals):
+    """
+    Считает перцептивный хэш картинок новых товаров и объединяет
+    одинаковые товары из разных магазинов в кластеры.
+    :return: {ссылка: фото поста} — рендер берет фото отсюда и не скачивает
+             картинку второй раз
+    """
+    if not deals:
+        return {}
 
-    caption = (
-        f"👀 <b>Смотри, что нашел на {source_name}</b>\n\n"
-        f"{cleaned_title}\n\n"
-        f"{price_line}\n"
-        f"📏 {size_label}: EU {formatted_sizes}\n\n"
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(None, photo_with_phash, deal) for deal in deals),
+        return_exceptions=True,
     )
 
-    # --- Подготовка фото ---
-    photo_bytes = None
+    photos = {}
+    clustered = 0
+    for deal, result in zip(deals, results):
+        if isinstance(result, Exception):
+            continue
+        photo, phash = result
+        if photo:
+            photos[deal["link"]] = photo
+        if not phash:
+            continue
+        cluster_id = PRODUCT_INDEX.assign(deal["link"], int(phash, 16), deal["title"])
+        set_deal_cluster(deal["link"], phash, cluster_id)
+        if cluster_id != deal["link"]:
+            clustered += 1
+
+    print(
+        f"[Dedup] Hashed {len(deals)} new deals, {clustered} matched existing products"
+    )
+    return photos
 
-    # 1. Из base64 (если есть в БД)
-    if image_bytes_b64:
-        try:
-            img_data = base64.b64decode(image_bytes_b64)
-            func = partial(process_image, image_url, image_data=img_data)
-            photo_bytes = await loop.run_in_executor(None, func)
-        except Exception:
-            pass
 
-    # 2. По URL
-    if not photo_bytes and image_url:
-        try:
-            photo_bytes = await loop.run_in_executor(None, process_image, image_url)
-        except Exception:
-            pass
+def queue_alerts(deals):
+    """
+    Ставит новые скидки в очередь личных уведомлений пользователям с
+    подходящими подписками; отправляет их публикатор (alert_sender_task).
+    """
+    matched = 0
+    for deal in deals:
+        chat_ids = ALERT_INDEX.match_chats(deal)
+        if chat_ids:
+            queue_deliveries(alert_key(deal["link"]), chat_ids)
+            matched += len(chat_ids)
+
+    if matched:
+        print(f"[Alerts] Queued {matched} personal notifications")
+        if ALERTS_QUEUED is not None:
+            ALERTS_QUEUED.set()
 
-    # Функция отправки (копия старой логики)
-    async def do_send(chat_id):
-        if photo_bytes:
-            try:
-                photo_bytes.seek(0)
-                photo_file = BufferedInputFile(
-                    photo_bytes.read(), filename="sneaker.jpg"
-                )
-                await bot.send_photo(
-                    chat_id,
-                    photo=photo_file,
-                    caption=caption,
-                    parse_mode="HTML",
-                    reply_markup=keyboard,
-                )
-                return
-            except Exception:
-                pass
 
-        if image_url:
+async def alert_sender_task():
+    """Фоновая задача публикатора: рассылает очередь личных уведомлений."""
+    while True:
+        # Сбрасываем событие до проверки очереди, чтобы не пропустить сигнал
+        ALERTS_QUEUED.clear()
+        try:
+            sent = await send_queued_alerts()
+        except Exception as e:
+            print(f"[Alerts] Error sending notifications: {e!r}")
+            sent = 0
+        if not sent:
             try:
-                await bot.send_photo(
-                    chat_id,
-                    photo=image_url,
-                    caption=caption,
-                    parse_mode="HTML",
-                    reply_markup=keyboard,
-                )
-                return
-            except Exception:
+                await asyncio.wait_for(ALERTS_QUEUED.wait(), ALERT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
                 pass
 
-        # Текст
-        await bot.send_message(
-            chat_id, caption, parse_mode="HTML", reply_markup=keyboard
+
+async def send_queued_alerts():
+    """
+    Отправляет уведомления из очереди (queue_alerts).
+    :return: скольким чатам пробовали отправить
+    """
+    sent = 0
+    for key, chat_ids in get_queued_deliveries().items():
+        deal_data = get_deal(key[len(ALERT_PREFIX) :])
+        if not deal_data:
+            record_deliveries(
+                [(key, str(chat_id), DELIVERY_REJECTED) for chat_id in chat_ids]
+            )
+            continue
+        post = await prepare_post(deal_data)
+        await broadcast_post(bot, LIMITER, post, chat_ids, key)
+        sent += len(chat_ids)
+    if sent:
+        print(f"[Alerts] Sent {sent} personal notifications")
+    return sent
+
+
+def get_next_publishable_deal():
+    """
+    Берет следующую скидку из очереди. Если тот же товар есть в других магазинах,
+    публикуется только самое дешевое предложение, остальные снимаются с очереди.
+    """
+    fresh_since = datetime.datetime.now() - datetime.timedelta(days=REPOST_DAYS)
+
+    while True:
+        deal_data = get_next_pending_deal()
+        if not deal_data or not deal_data.get("cluster_id"):
+            return deal_data
+
+        best, skipped = choose_best_offer(
+            get_cluster_deals(deal_data["cluster_id"]), fresh_since
         )
+        if skipped:
+            print(f"[Dedup] Skipping {len(skipped)} duplicate offers")
+            mark_deals_skipped(skipped)
+        if best:
+            return best
 
-    # Отправка
-    if target_id:
-        try:
-            await do_send(target_id)
-        except Exception as e:
-            print(f"Error sending to {target_id}: {e}")
-    elif CHANNEL_ID:
-        try:
-            await do_send(CHANNEL_ID)
-        except Exception as e:
-            print(f"Error sending to channel: {e}")
+
+def store_render(deal_data, render_json, photo):
+    """
+    Сохраняет рендер скидки. Если картинка есть, а фото получить не
+    удалось, рендер не сохраняется (скидка будет перерисована, когда снова
+    попадется в скане) — пока не исчерпаны RENDER_PHOTO_RETRIES попыток.
+    :return: True, если рендер сохранен
+    """
+    if photo is None and has_image(deal_data):
+        if record_render_failure(deal_data["link"]) < RENDER_PHOTO_RETRIES:
+            return False
+        print(f"[Render] No photo for {deal_data['link']}, saving post without it")
+    save_render(deal_data["link"], RENDER_VERSION, render_json, photo)
+    return True
+
+
+async def render_pending_deals(links, photos=None):
+    """
+    Рендерит посты для скидок пачки links, у которых еще нет готового поста
+    (новые, изменившиеся, без фото в прошлый раз), и для скидок в очереди
+    с постом старой версии шаблона. Так скидка, у которой не получилось
+    фото, пробуется снова раз за скан, а не в каждой пачке.
+    :param photos: {ссылка: фото}, уже полученные при кластеризации
+    """
+    deals = get_unrendered_deals(RENDER_VERSION, links)
+    if not deals:
+        return
+    photos = photos or {}
+
+    loop = asyncio.get_running_loop()
+    renders = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                None, render_deal, deal, AFFILIATE, photos.get(deal["link"])
+            )
+            for deal in deals
+        ),
+        return_exceptions=True,
+    )
+    rendered = 0
+    for deal, result in zip(deals, renders):
+        if isinstance(result, Exception):
+            print(f"[Render] Error rendering {deal['link']}: {result}")
+            continue
+        if store_render(deal, *result):
+            rendered += 1
+    print(f"[Render] Rendered {rendered} posts")
+
+
+async def prepare_post(deal_data):
+    """
+    Готовый пост по скидке (словарь deal_data из БД): подпись, клавиатура,
+    обработанное фото и данные для кнопки в альбоме, плюс ссылки с subid
+    каждого канала.
+    Обычно пост уже отрендерен в run_scrapers; если нет — рендерим сейчас.
+    """
+    post = load_post(deal_data)
+    if post is None:
+        loop = asyncio.get_running_loop()
+        render_json, photo = await loop.run_in_executor(
+            None, render_deal, deal_data, AFFILIATE
+        )
+        store_render(deal_data, render_json, photo)
+        post = post_from_render(render_json, photo)
+    return track_channels(post, deal_data, AFFILIATE, get_recipients("channel"))
+
+
+async def send_single_deal(deal_data, target_id=None):
+    """
+    Отправляет одну конкретную скидку (словарь deal_data из БД) в target_id
+    (или всем каналам и подписчикам).
+    Возвращает True, если пост дошел хотя бы до одного получателя.
+    """
+    post = await prepare_post(deal_data)
+
+    # Отправка: в указанный чат или всем каналам и подписчикам
+    recipients = [target_id] if target_id else get_recipients()
+    if not recipients:
+        return False
+    return await broadcast_post(bot, LIMITER, post, recipients, deal_data["link"])
+
+
+async def send_deal_album(deals):
+    """
+    Публикует несколько скидок одним альбомом (send_media_group) и отдельным
+    сообщением с кнопками — к альбому нельзя прикрепить inline-клавиатуру.
+    Возвращает True, если альбом дошел хотя бы до одного получателя.
+    """
+    posts = await asyncio.gather(*(prepare_post(deal) for deal in deals))
+    recipients = get_recipients()
+    if not recipients:
+        return False
+    key = album_key([deal["link"] for deal in deals])
+    return await broadcast_album(bot, LIMITER, posts, recipients, key)
+
+
+def get_album(lead_deal):
+    """
+    Скидки альбома с lead_deal во главе или None, если набралось меньше
+    ALBUM_MIN_SIZE. Состав запоминается в bot_state до отправки, поэтому
+    прерванный альбом досылается тем же составом и с тем же ключом доставки.
+    """
+    saved = get_state(ALBUM_STATE_KEY, "")
+    if saved and lead_deal["link"] in album_links(saved):
+        deals = [get_deal(link) for link in album_links(saved)]
+        if all(deals):
+            return deals
+
+    companions = get_album_companions(lead_deal)
+    if len(companions) + 1 < ALBUM_MIN_SIZE:
+        return None
+    album = [lead_deal] + companions
+    set_state(ALBUM_STATE_KEY, album_key([deal["link"] for deal in album]))
+    return album
+
+
+def get_album_companions(lead_deal):
+    """
+    Подбирает к скидке lead_deal еще до ALBUM_SIZE - 1 скидок из очереди
+    того же магазина или бренда (см. ALBUM_GROUP_BY).
+    Дубликаты из других магазинов пропускаются, как и при обычной публикации.
+    """
+    fresh_since = datetime.datetime.now() - datetime.timedelta(days=REPOST_DAYS)
+    lead_brand = detect_brand(lead_deal["title"])
+
+    companions = []
+    for deal in get_pending_deals(limit=ALBUM_CANDIDATES):
+        if len(companions) >= ALBUM_SIZE - 1:
+            break
+        if deal["link"] == lead_deal["link"] or not deal.get("image_url"):
+            continue
+        if ALBUM_GROUP_BY == "brand":
+            if not lead_brand or detect_brand(deal["title"]) != lead_brand:
+                continue
+        elif deal.get("source") != lead_deal.get("source"):
+            continue
+        if deal.get("cluster_id"):
+            best, _ = choose_best_offer(
+                get_cluster_deals(deal["cluster_id"]), fresh_since
+            )
+            if not best or best["link"] != deal["link"]:
+                continue
+        companions.append(deal)
+
+    return companions
 
 
 async def publisher_task():
     """
-    Фоновая задача, которая проверяет очередь и отправляет посты раз в PUBLISH_INTERVAL.
+    Фоновая задача, которая публикует по одной скидке раз в PUBLISH_INTERVAL.
+    Спит ровно до следующего слота; если очередь пуста — до сигнала DEALS_QUEUED.
+    Время последней публикации хранится в БД, поэтому перезапуск не сбивает график.
     """
     global LAST_PUBLISH_TIME
     print("Publisher task started.")
 
-    # Даем фору при старте, чтобы не постить сразу, если только что запустили
-    # Или наоборот, хотим сразу? Пусть первый раз будет через интервал
-    LAST_PUBLISH_TIME = time.time() - (PUBLISH_INTERVAL - 60)  # Старт через минуту
+    LAST_PUBLISH_TIME = float(get_state("last_publish_time", 0))
+    if not LAST_PUBLISH_TIME:
+        # Первый запуск: первая публикация через минуту
+        LAST_PUBLISH_TIME = time.time() - (PUBLISH_INTERVAL - 60)
 
     while True:
-        now = time.time()
-        time_since = now - LAST_PUBLISH_TIME
-
-        if time_since >= PUBLISH_INTERVAL:
-            deal_data = get_next_pending_deal()
-
-            if deal_data:
-                print(f"[Publisher] Publishing deal: {deal_data['title']}")
-                await send_single_deal(deal_data)
-                mark_deal_as_sent(deal_data["link"])
-                LAST_PUBLISH_TIME = time.time()
-            else:
-                # Очередь пуста
-                pass
+        delay = LAST_PUBLISH_TIME + PUBLISH_INTERVAL - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-        await asyncio.sleep(60)
+        # Ошибка одной публикации (например, база занята другим процессом)
+        # не должна останавливать публикатор и весь процесс
+        try:
+            await publish_next()
+        except Exception as e:
+            print(f"[Publisher] Error: {e!r}")
+            await asyncio.sleep(SEND_RETRY_DELAY)
+
+
+async def publish_next():
+    """Досылает недошедшие посты и публикует следующую скидку из очереди."""
+    await retry_failed_deliveries()
+
+    # Сбрасываем событие до проверки очереди, чтобы не пропустить сигнал
+    DEALS_QUEUED.clear()
+    deal_data = get_next_publishable_deal()
+
+    if not deal_data:
+        # Очередь пуста: ждем, пока скрапер добавит новые скидки. Скрапер
+        # в другом процессе сигнал не подаст — проверяем очередь сами
+        print("[Publisher] Queue is empty, waiting for new deals...")
+        try:
+            await asyncio.wait_for(DEALS_QUEUED.wait(), QUEUE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        return
+
+    with profiling.profile("publish"):
+        published = await publish_deal(deal_data)
+    if not published:
+        await asyncio.sleep(SEND_RETRY_DELAY)
+
+
+async def retry_failed_deliveries():
+    """
+    Досылает опубликованные посты чатам, до которых они не дошли из-за
+    временной ошибки (не больше MAX_SEND_ATTEMPTS попыток на чат).
+    """
+    for link, chat_ids in get_failed_deliveries(MAX_SEND_ATTEMPTS).items():
+        if link.startswith(ALBUM_PREFIX):
+            links = album_links(link)
+        elif link.startswith(ALERT_PREFIX):
+            links = [link[len(ALERT_PREFIX) :]]
+        else:
+            links = [link]
+        deals = [get_deal(deal_link) for deal_link in links]
+        if not all(deals):
+            continue
+        print(f"[Publisher] Retrying {link} for {len(chat_ids)} chats")
+        posts = await asyncio.gather(*(prepare_post(deal) for deal in deals))
+        if link.endswith(BUTTONS_SUFFIX):
+            await broadcast_album_buttons(bot, LIMITER, posts, chat_ids, link)
+        elif link.startswith(ALBUM_PREFIX):
+            await broadcast_album(bot, LIMITER, posts, chat_ids, link)
+        else:
+            await broadcast_post(bot, LIMITER, posts[0], chat_ids, link)
+
+
+async def publish_deal(deal_data):
+    """
+    Публикует скидку (или альбом с ней) и запоминает время публикации.
+    Скидка считается опубликованной, если пост дошел хотя бы до одного
+    получателя; остальным его досылает retry_failed_deliveries.
+    :return: False, если пост не дошел ни до кого и скидка вернулась в очередь
+    """
+    global LAST_PUBLISH_TIME
+    album = get_album(deal_data) if ALBUM_MODE and deal_data.get("image_url") else None
+    if album:
+        print(f"[Publisher] Publishing album of {len(album)} deals")
+        delivered = await send_deal_album(album)
+        set_state(ALBUM_STATE_KEY, "")
+        if delivered:
+            # Альбом у кого-то уже есть — опубликованы все его скидки
+            for deal in album:
+                mark_deal_as_sent(deal["link"])
+                DEALS_SENT.inc(source=deal.get("source") or "")
+            LAST_PUBLISH_TIME = time.time()
+            set_state("last_publish_time", LAST_PUBLISH_TIME)
+            return True
+        print("[Publisher] Album was not delivered, falling back to a single post")
+
+    print(f"[Publisher] Publishing deal: {deal_data['title']}")
+    if not await send_single_deal(deal_data):
+        # Возвращаем в очередь и пробуем снова чуть позже
+        requeue_deal(deal_data["link"], MAX_SEND_ATTEMPTS)
+        print(f"[Publisher] Send failed, requeued. Stats: {dict(LIMITER.stats)}")
+        return False
+
+    mark_deal_as_sent(deal_data["link"])
+    DEALS_SENT.inc(source=deal_data.get("source") or "")
+    LAST_PUBLISH_TIME = time.time()
+    set_state("last_publish_time", LAST_PUBLISH_TIME)
+    return True
 
 
 async def scheduler():
-    """Фоновая задача скрапинга запускается раз в 30 минут"""
-    while True:
-        await run_scrapers()
-        await asyncio.sleep(60 * 30)
+    """
+    Фоновая задача скрапинга: у каждого магазина свой интервал, который
+    подстраивается под частоту изменений (см. source_scheduler.py).
+    Расписание общее для всех процессов с ролью scraper (см. roles.py).
+    """
+    await SourceScheduler(
+        SCRAPERS, run_scrapers, shared=True, holder=roles.NODE_ID
+    ).run()
 
 
-async def main():
-    init_db()
+async def publisher_role():
+    """Работа публикатора: посты по расписанию и личные уведомления."""
+    await asyncio.gather(publisher_task(), alert_sender_task())
 
-    # Запускаем планировщик скрапинга
-    asyncio.create_task(scheduler())
-    # Запускаем планировщик рассылки
-    asyncio.create_task(publisher_task())
 
-    print("Бот запущен!")
-    await dp.start_polling(bot)
+async def main(role=ROLE):
+    global DEALS_QUEUED, ALERTS_QUEUED
+    init_db()
+    sync_indexes()
+    DEALS_QUEUED = asyncio.Event()
+    ALERTS_QUEUED = asyncio.Event()
+
+    # Каналы из конфига всегда в списке получателей
+    for channel_id in [CHANNEL_ID] + EXTRA_CHANNELS:
+        if channel_id:
+            add_subscriber(channel_id, kind="channel")
+
+    profiling.watch_event_loop()
+
+    if METRICS_PORT:
+        QUEUE_DEPTH.set_function(count_pending_deals)
+        await start_server()
+
+    # Роли процесса (см. roles.py): публикатор и поллинг Telegram активны
+    # только в одном процессе, скраперов может быть несколько
+    tasks = []
+    if roles.has_role(role, "scraper"):
+        tasks.append(scheduler())
+    if roles.has_role(role, "publisher"):
+        tasks.append(roles.run_as_leader("publisher", publisher_role))
+    if roles.has_role(role, "bot"):
+        tasks.append(roles.run_as_leader("bot", lambda: dp.start_polling(bot)))
+
+    print(f"Бот запущен! Роль: {role} ({roles.NODE_ID})")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        shutdown_pools()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Sneaker deals bot")
+    parser.add_argument("--role", choices=roles.ROLES, default=ROLE)
+    asyncio.run(main(parser.parse_args().role))
@@ -0,0 +1,273 @@
+"""
+Метрики бота в формате Prometheus.
+
+Гистограмма sneaker_stage_seconds — длительность стадий (скан, каталог и
+обогащение по магазинам, обработка фото, рендер поста, отправка в
+Telegram), ожидания в скраперах и сэкономленное ими время (см. waits.py),
+счетчики разобранных, отфильтрованных, новых и опубликованных скидок,
+датчики глубины очереди и памяти браузеров. Отдаются по HTTP на
+METRICS_HOST:METRICS_PORT/metrics (aiohttp).
+
+Если METRICS_PORT не задан, метрики выключены: inc/observe сразу
+возвращаются, timed() возвращает функцию без обертки, сервер не запускается.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from contextlib import nullcontext
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+from process_tree import descendants, rss_bytes
+
+ENABLED = METRICS_PORT > 0
+
+# Границы корзин гистограмм (секунды): от запроса к БД до скана Lamoda
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), registry=_REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Датчик: значение задается set() или считается функцией при сборе."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = None
+
+    def set(self, value, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                print(f"[Metrics] Cannot collect {self.name}: {e}")
+            else:
+                with self._lock:
+                    self._values[()] = value
+        return super().render()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """with STAGE_SECONDS.time(stage="render"): ..."""
+        if not ENABLED:
+            return nullcontext()
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = _format_labels(self.labelnames, key, [("le", f"{bound:g}")])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "sneaker_stage_seconds", "Duration of pipeline stages", ("stage", "source")
+)
+ITEMS_PARSED = Counter(
+    "sneaker_items_parsed_total", "Catalog items parsed by scrapers", ("source",)
+)
+ITEMS_FILTERED = Counter(
+    "sneaker_items_filtered_total",
+    "Catalog items dropped by scraper filters (brand, sizes)",
+    ("source",),
+)
+DEALS_NEW = Counter("sneaker_deals_new_total", "New deals queued", ("source",))
+DEALS_SENT = Counter("sneaker_deals_sent_total", "Deals published", ("source",))
+WAIT_SECONDS = Histogram(
+    "sneaker_wait_seconds", "Condition-based waits in scrapers", ("wait", "source")
+)
+WAIT_SAVED_SECONDS = Counter(
+    "sneaker_wait_saved_seconds_total",
+    "Time saved by condition-based waits versus the fixed sleeps they replaced",
+    ("wait", "source"),
+)
+SCRAPER_RESTARTS = Counter(
+    "sneaker_scraper_restarts_total",
+    "Browser restarts after a hung or dead browser session",
+    ("source",),
+)
+SCRAPER_TIMEOUTS = Counter(
+    "sneaker_scraper_timeouts_total",
+    "Scraper calls killed by the watchdog",
+    ("source",),
+)
+BROWSER_KILLED = Counter(
+    "sneaker_browser_processes_killed_total",
+    "Browser and driver processes killed by the watchdog",
+    ("source",),
+)
+SIZE_COVERAGE = Gauge(
+    "sneaker_size_coverage_ratio",
+    "Share of listing items whose sizes were found on the catalog page",
+    ("source",),
+)
+QUEUE_DEPTH = Gauge("sneaker_queue_depth", "Deals waiting for publication")
+BROWSER_RSS = Gauge(
+    "sneaker_browser_rss_bytes", "Resident memory of browsers and drivers"
+)
+BROWSER_RSS.set_function(lambda: sum(rss_bytes(pid) for pid in descendants()))
+
+
+def timed(stage, source=""):
+    """
+    Декоратор: длительность вызовов функции (обычной или async) в
+    STAGE_SECONDS. При выключенных метриках функция не оборачивается.
+    """
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with STAGE_SECONDS.time(stage=stage, source=source):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage, source=source):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render(registry=_REGISTRY):
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Запускает HTTP-сервер /metrics. :return: aiohttp AppRunner"""
+
+    async def handle(request):
+        loop = asyncio.get_running_loop()
+        # Датчики читают БД и /proc — не в event loop
+        body = await loop.run_in_executor(None, render)
+        return web.Response(text=body, content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"[Metrics] Serving on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,85 @@
+"""
+Потоковая обработка скидок: несколько асинхронных потоков (по одному на
+магазин) сливаются в один и режутся на небольшие пачки для записи в БД.
+
+Пачка уходит, когда набралось BATCH_SIZE скидок или с первой скидки в
+пачке прошло BATCH_INTERVAL секунд — первые скидки попадают в очередь
+публикации через секунды после начала скана, а не после его окончания.
+"""
+
+import asyncio
+
+BATCH_SIZE = 50
+BATCH_INTERVAL = 2.0  # секунд
+
+_DONE = object()
+
+
+async def merge(streams):
+    """Отдает элементы всех асинхронных потоков по мере их появления."""
+    queue = asyncio.Queue(maxsize=BATCH_SIZE * 2)
+
+    async def pump(stream):
+        try:
+            async for item in stream:
+                await queue.put(item)
+        finally:
+            await queue.put(_DONE)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Ошибки потоков всплывают здесь, после того как отданы все элементы
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+
+async def micro_batches(stream, max_items=BATCH_SIZE, max_delay=BATCH_INTERVAL):
+    """
+    Режет асинхронный поток на пачки: не больше max_items элементов и не
+    дольше max_delay секунд ожидания с первого элемента пачки.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = stream.__aiter__()
+    batch = []
+    deadline = None
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(deadline - loop.time(), 0) if batch else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Время вышло — отдаем то, что набралось
+                yield batch
+                batch = []
+                continue
+
+            future, pending = pending, None
+            try:
+                item = future.result()
+            except StopAsyncIteration:
+                break
+            if not batch:
+                deadline = loop.time() + max_delay
+            batch.append(item)
+            if len(batch) >= max_items or loop.time() >= deadline:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,126 @@
+"""
+Дерево процессов бота: сам бот и запущенные им браузеры и драйверы.
+
+Читает /proc, поэтому работает только на Linux; на других системах
+функции возвращают пустой список и 0.
+"""
+
+import os
+import signal
+import time
+
+PROC = "/proc"
+
+
+def _stat(pid):
+    """(состояние, PID родителя) процесса или None, если его уже нет."""
+    try:
+        with open(f"{PROC}/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Имя процесса в скобках может содержать пробелы: поля считаем после ')'
+    fields = stat[stat.rfind(b")") + 2 :].split()
+    if len(fields) < 2:
+        return None
+    return fields[0].decode(), int(fields[1])
+
+
+def _ppid(pid):
+    stat = _stat(pid)
+    return stat[1] if stat else None
+
+
+def descendants(pid=None):
+    """PID всех потомков процесса (по умолчанию — текущего)."""
+    pid = pid or os.getpid()
+    try:
+        pids = [int(name) for name in os.listdir(PROC) if name.isdigit()]
+    except OSError:
+        return []
+
+    children = {}
+    for child in pids:
+        parent = _ppid(child)
+        if parent is not None:
+            children.setdefault(parent, []).append(child)
+
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def rss_bytes(pid):
+    """Резидентная память процесса в байтах (0, если процесса уже нет)."""
+    try:
+        with open(f"{PROC}/{pid}/statm") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident * os.sysconf("SC_PAGE_SIZE")
+
+
+def tree_rss(pid=None):
+    """Суммарная резидентная память процесса и всех его потомков."""
+    pid = pid or os.getpid()
+    return rss_bytes(pid) + sum(rss_bytes(child) for child in descendants(pid))
+
+
+def kill_tree(pid, sig=signal.SIGKILL):
+    """
+    Убивает процесс и всех его потомков. Дерево собирается до первого
+    сигнала: после смерти родителя потомки переходят к init.
+    :return: PID процессов, получивших сигнал
+    """
+    killed = []
+    for target in [pid] + descendants(pid):
+        try:
+            os.kill(target, sig)
+            killed.append(target)
+        except OSError:
+            pass
+    return killed
+
+
+def is_running(pid):
+    """Процесс еще работает (есть и не зомби)."""
+    stat = _stat(pid)
+    return stat is not None and stat[0] != "Z"
+
+
+def wait_exited(pids, timeout=2.0, poll=0.02):
+    """
+    Ждет, пока процессы pids завершатся (исчезнут или станут зомби), но не
+    дольше timeout. :return: PID процессов, которые все еще работают
+    """
+    deadline = time.monotonic() + timeout
+    running = [pid for pid in pids if is_running(pid)]
+    while running and time.monotonic() < deadline:
+        time.sleep(poll)
+        running = [pid for pid in running if is_running(pid)]
+    return running
+
+
+def reap_zombies(pids):
+    """
+    Забирает статус завершившихся процессов из pids, если они — зомби-потомки
+    бота. Нужно, когда бот — PID 1 в контейнере: осиротевшие процессы
+    браузера достаются ему. Передавать только осиротевших потомков убитого
+    дерева: статус процессов, у которых есть владелец (subprocess.Popen,
+    multiprocessing), забирает сам владелец. :return: сколько зомби убрано
+    """
+    reaped = 0
+    for pid in pids:
+        stat = _stat(pid)
+        if stat is None or stat[0] != "Z" or stat[1] != os.getpid():
+            continue
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                reaped += 1
+        except ChildProcessError:
+            pass
+    return reaped
@@ -0,0 +1,223 @@
+"""
+Профилирование циклов скана и публикации по запросу.
+
+Включается для выбранных циклов переменной PROFILE=scan,publish или
+командой /profile. Каждый цикл, обернутый в profile(cycle), пишет отчет в
+data/profiles/ (хранятся последние PROFILE_KEEP на цикл):
+
+  sample   — семплирующий профилировщик (по умолчанию): раз в
+             PROFILE_SAMPLE_INTERVAL снимает стеки всех потоков, включая
+             потоки скраперов и executor'а. Видно и ожидания — time.sleep,
+             браузер, SQLite. Пишет <цикл>-<время>.folded (формат
+             flamegraph.pl / speedscope) и .txt с топом функций.
+  cprofile — cProfile только потока event loop: точные счетчики вызовов,
+             .prof (pstats, snakeviz) и .txt с топом по cumulative.
+
+Пока профилирование включено, event loop работает в debug-режиме и
+логирует колбэки дольше PROFILE_SLOW_CALLBACK секунд.
+"""
+
+import asyncio
+import collections
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import (
+    PROFILE_CYCLES,
+    PROFILE_KEEP,
+    PROFILE_MODE,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_SLOW_CALLBACK,
+    PROFILES_DIR,
+)
+
+CYCLES = ("scan", "publish")
+MODES = ("sample", "cprofile")
+TOP = 40  # строк в текстовом отчете
+
+# Для каких циклов профилирование включено сейчас (меняет /profile)
+ENABLED = set(PROFILE_CYCLES)
+MODE = PROFILE_MODE
+
+# Циклы скана идут параллельно, а профилировщик один на процесс
+_ACTIVE = threading.Lock()
+_LOOP = None
+
+
+def watch_event_loop(loop=None):
+    """
+    Запоминает event loop и включает на нем debug-режим, если профилирование
+    включено хотя бы для одного цикла: asyncio пишет в лог (logger "asyncio")
+    колбэки дольше PROFILE_SLOW_CALLBACK.
+    """
+    global _LOOP
+    _LOOP = loop or asyncio.get_running_loop()
+    _LOOP.slow_callback_duration = PROFILE_SLOW_CALLBACK
+    _LOOP.set_debug(bool(ENABLED))
+
+
+def enable(cycles, mode=None):
+    """Включает профилирование циклов cycles (и режим mode, если задан)."""
+    global MODE
+    unknown = set(cycles) - set(CYCLES)
+    if unknown:
+        raise ValueError(f"Unknown cycles: {', '.join(sorted(unknown))}")
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        MODE = mode
+    ENABLED.update(cycles)
+    if _LOOP is not None:
+        watch_event_loop(_LOOP)
+
+
+def disable():
+    ENABLED.clear()
+    if _LOOP is not None:
+        watch_event_loop(_LOOP)
+
+
+class Sampler:
+    """Семплирующий профилировщик: стеки всех потоков раз в interval секунд."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def __enter__(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="profile-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        (
+                            code.co_name,
+                            os.path.basename(code.co_filename),
+                            frame.f_lineno,
+                        )
+                    )
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(thread_id, str(thread_id)), tuple(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Строки «поток;функция (файл:строка);... число» для flamegraph."""
+        lines = []
+        for (thread, stack), count in sorted(self.stacks.items()):
+            frames = [thread] + [
+                f"{name} ({file}:{line})" for name, file, line in stack
+            ]
+            lines.append(f"{';'.join(frames)} {count}")
+        return lines
+
+    def report(self, cycle, duration):
+        """Топ функций по числу семплов: собственных (self) и со вложенными."""
+        own = collections.Counter()
+        total = collections.Counter()
+        for (thread, stack), count in self.stacks.items():
+            if not stack:
+                continue
+            name, file, line = stack[-1]
+            own[f"{name} ({file}:{line})"] += count
+            for function in {(name, file) for name, file, _ in stack}:
+                total[f"{function[0]} ({function[1]})"] += count
+
+        lines = [
+            f"{cycle}: {duration:.2f} s, {self.samples} samples "
+            f"every {self.interval * 1000:g} ms (all threads)",
+            "",
+            "Self (leaf frame):",
+        ]
+        for label, count in own.most_common(TOP):
+            lines.append(f"{count:>8}  {label}")
+        lines += ["", "Total (function on stack):"]
+        for label, count in total.most_common(TOP):
+            lines.append(f"{count:>8}  {label}")
+        return lines
+
+
+def rotate(cycle, directory=PROFILES_DIR, keep=PROFILE_KEEP):
+    """Удаляет старые отчеты цикла, оставляя keep последних прогонов."""
+    prefix = f"{cycle}-"
+    runs = sorted(
+        {
+            os.path.splitext(name)[0]
+            for name in os.listdir(directory)
+            if name.startswith(prefix)
+        }
+    )
+    stale = set(runs[:-keep] if keep > 0 else runs)
+    for name in os.listdir(directory):
+        if os.path.splitext(name)[0] in stale:
+            os.remove(os.path.join(directory, name))
+
+
+def _write(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profile(cycle, directory=PROFILES_DIR):
+    """
+    with profile("scan"): ... — профилирует блок, если цикл включен.
+    Если уже идет профилирование другого цикла, блок выполняется без него.
+    """
+    if cycle not in ENABLED or not _ACTIVE.acquire(blocking=False):
+        yield
+        return
+
+    mode = MODE
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    base = os.path.join(directory, f"{cycle}-{stamp}")
+    started = time.perf_counter()
+    try:
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - started
+                profiler.dump_stats(f"{base}.prof")
+                with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                    f.write(f"{cycle}: {duration:.2f} s (event loop thread)\n\n")
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats("cumulative").print_stats(TOP)
+        else:
+            with Sampler() as sampler:
+                yield
+            duration = time.perf_counter() - started
+            _write(f"{base}.folded", sampler.folded())
+            _write(f"{base}.txt", sampler.report(cycle, duration))
+        print(f"[Profile] {cycle} took {duration:.2f} s, report: {base}.txt")
+        rotate(cycle, directory)
+    finally:
+        _ACTIVE.release()
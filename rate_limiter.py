@@ -0,0 +1,175 @@
+"""
+Ограничитель исходящих запросов к Telegram Bot API.
+
+Лимиты Telegram: около 30 сообщений в секунду на бота, 1 сообщение в секунду
+в личный чат и 20 сообщений в минуту в группу/канал. Каждый вызов проходит
+через общий token bucket и bucket своего чата. TelegramRetryAfter (flood
+control) выдерживается ровно столько, сколько просит Telegram, сетевые и
+серверные ошибки повторяются с экспоненциальной задержкой и джиттером.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+GLOBAL_RATE = 25  # сообщений в секунду на бота (с запасом от 30)
+PRIVATE_CHAT_RATE = 1.0  # сообщений в секунду в личный чат
+GROUP_CHAT_RATE = 20 / 60  # сообщений в секунду в группу/канал
+GROUP_CHAT_BURST = 3
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0  # секунды, удваивается на каждой попытке
+BACKOFF_MAX = 30.0
+RETRY_AFTER_JITTER = 1.0  # секунды сверх RetryAfter, чтобы не стартовать всем разом
+
+# Сколько bucket'ов чатов копить, прежде чем выбросить простаивающие:
+# рассылка по тысячам подписчиков иначе оставляет по bucket'у на чат навсегда
+CHAT_BUCKETS_PRUNE = 1024
+
+
+class SendFailed(Exception):
+    """Запрос не удалось выполнить за MAX_ATTEMPTS попыток."""
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # до этого момента запросы запрещены (RetryAfter)
+        # Создается лениво: на Python 3.9 Lock привязывается к текущему loop
+        self._lock = None
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self, now):
+        """
+        Bucket снова полон и не заблокирован: его можно выбросить,
+        новый bucket с полным запасом ведет себя так же.
+        """
+        if self._lock is not None and self._lock.locked():
+            return False
+        if now < self.blocked_until:
+            return False
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def is_group_chat(chat_id):
+    """Каналы и группы: @username или отрицательный id."""
+    if isinstance(chat_id, str):
+        if chat_id.startswith("@"):
+            return True
+        chat_id = int(chat_id)
+    return chat_id < 0
+
+
+class RateLimiter:
+    """
+    Центральная точка для всех исходящих вызовов бота.
+
+    Пример:
+        await limiter.call(chat_id, lambda: bot.send_message(chat_id, text))
+    """
+
+    def __init__(
+        self,
+        global_rate=GLOBAL_RATE,
+        private_rate=PRIVATE_CHAT_RATE,
+        group_rate=GROUP_CHAT_RATE,
+        max_attempts=MAX_ATTEMPTS,
+    ):
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_attempts = max_attempts
+        self._chats = {}
+        self._prune_at = CHAT_BUCKETS_PRUNE
+        # Счетчики по исходам: sent, retry_after, retried, failed
+        self.stats = Counter()
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                self._prune()
+            if is_group_chat(chat_id):
+                bucket = TokenBucket(self.group_rate, capacity=GROUP_CHAT_BURST)
+            else:
+                bucket = TokenBucket(self.private_rate)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        """Выбрасывает bucket'ы простаивающих чатов (см. TokenBucket.idle)."""
+        now = time.monotonic()
+        self._chats = {
+            chat_id: bucket
+            for chat_id, bucket in self._chats.items()
+            if not bucket.idle(now)
+        }
+        # Порог растет вместе с числом активных чатов — чистка O(1) в среднем
+        self._prune_at = max(CHAT_BUCKETS_PRUNE, 2 * len(self._chats))
+
+    async def call(self, chat_id, request):
+        """
+        Выполняет request() (фабрику корутины) с учетом лимитов и повторов.
+        Ошибки, которые не лечатся повтором (TelegramBadRequest и т.п.),
+        пробрасываются сразу. После исчерпания попыток — SendFailed.
+        """
+        bucket = self._bucket(chat_id)
+        last_error = None
+
+        for attempt in range(self.max_attempts):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                result = await request()
+            except TelegramRetryAfter as e:
+                self.stats["retry_after"] += 1
+                print(f"[RateLimiter] Flood control for {chat_id}: {e.retry_after}s")
+                bucket.block(e.retry_after + random.uniform(0, RETRY_AFTER_JITTER))
+                last_error = e
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                last_error = e
+                if attempt + 1 < self.max_attempts:
+                    self.stats["retried"] += 1
+                    delay = min(BACKOFF_BASE * 2**attempt, BACKOFF_MAX)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                continue
+
+            self.stats["sent"] += 1
+            return result
+
+        self.stats["failed"] += 1
+        raise SendFailed(f"{chat_id}: {last_error}") from last_error
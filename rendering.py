@@ -0,0 +1,168 @@
+"""
+Подготовка поста по скидке: подпись, клавиатура и фото.
+
+Пост рендерится один раз, когда скидка попадает в очередь, и хранится в
+deals (render_json, render_photo). Публикация и рассылка берут готовый
+пост из БД и только отправляют его. Если поменять шаблон поста, нужно
+увеличить RENDER_VERSION — сохраненные посты старой версии будут
+перерисованы при следующем скане (или при отправке).
+
+Если у скидки есть картинка, но получить фото не удалось (сеть, битый
+файл), рендер не сохраняется и повторяется при следующем скане — до
+RENDER_PHOTO_RETRIES попыток, после чего пост сохраняется без фото.
+
+Сохраненная кнопка ведет на общую партнерскую ссылку. Если subid сети
+содержит {channel}, перед отправкой track_channels добавляет к посту
+ссылки и кнопки для каждого канала (channel_urls, channel_keyboards).
+"""
+
+import base64
+import json
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from image_processing import process_image
+from metrics import timed
+from sizes import normalize_sizes
+from text_normalization import clean_title
+from utils import format_sizes
+
+RENDER_VERSION = 1
+# Сколько раз пробовать получить фото, прежде чем сохранить пост без него
+RENDER_PHOTO_RETRIES = 3
+
+
+def render_text(deal_data, affiliate):
+    """
+    Текстовая часть поста.
+    :param deal_data: словарь скидки (из БД или от скрапера)
+    :param affiliate: AffiliateManager для ссылки на кнопке
+    :return: словарь caption, keyboard (JSON), title, url, image_url
+    """
+    link = deal_data["link"]
+    price = deal_data["price"]
+    old_price = deal_data["old_price"]
+    source_name = deal_data.get("source") or "Unknown"
+
+    # В БД хранятся канонические размеры EU "41,42,42.5" (sizes_eu).
+    # Для старых записей без sizes_eu разбираем исходную строку.
+    sizes_list = normalize_sizes(
+        deal_data.get("sizes_eu") or deal_data.get("sizes", "")
+    )
+    formatted_sizes = format_sizes(sizes_list)
+    size_label = "Размер" if len(sizes_list) == 1 else "Размеры"
+    cleaned_title = clean_title(deal_data["title"])
+
+    # Партнерская ссылка
+    aff_link = affiliate.convert_link(link, source_name)
+    keyboard = link_keyboard(aff_link)
+
+    price_line = f"💰 <b>{price}</b>"
+    if old_price:
+        price_line += f" (было {old_price})"
+
+    caption = (
+        f"👀 <b>Смотри, что нашел на {source_name}</b>\n\n"
+        f"{cleaned_title}\n\n"
+        f"{price_line}\n"
+        f"📏 {size_label}: EU {formatted_sizes}\n\n"
+    )
+
+    return {
+        "caption": caption,
+        "keyboard": keyboard.model_dump_json(exclude_none=True),
+        "title": cleaned_title,
+        "url": aff_link,
+        "image_url": deal_data.get("image_url"),
+    }
+
+
+def link_keyboard(url):
+    """Кнопка поста со ссылкой на товар."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Посмотреть", url=url)]]
+    )
+
+
+def track_channels(post, deal_data, affiliate, channels):
+    """
+    Добавляет к посту партнерские ссылки с subid каждого канала из channels
+    (только для каналов, чья ссылка отличается от общей).
+    :return: тот же post
+    """
+    source_name = deal_data.get("source") or "Unknown"
+    urls = {}
+    for channel in channels:
+        url = affiliate.convert_link(deal_data["link"], source_name, channel)
+        if url != post["url"]:
+            urls[channel] = url
+    post["channel_urls"] = urls
+    post["channel_keyboards"] = {
+        channel: link_keyboard(url) for channel, url in urls.items()
+    }
+    return post
+
+
+def render_photo(deal_data):
+    """Обработанное фото (JPEG) из сохраненных байтов или по URL, либо None."""
+    image_url = deal_data.get("image_url")
+    image_bytes_b64 = deal_data.get("image_bytes_b64")
+
+    # 1. Из base64 (если есть в БД)
+    if image_bytes_b64:
+        try:
+            photo = process_image(
+                image_url, image_data=base64.b64decode(image_bytes_b64)
+            )
+            if photo:
+                return photo.getvalue()
+        except Exception:
+            pass
+
+    # 2. По URL
+    if image_url:
+        try:
+            photo = process_image(image_url)
+            if photo:
+                return photo.getvalue()
+        except Exception:
+            pass
+    return None
+
+
+def has_image(deal_data):
+    """Есть ли у скидки картинка, из которой можно сделать фото поста."""
+    return bool(deal_data.get("image_url") or deal_data.get("image_bytes_b64"))
+
+
+@timed("render")
+def render_deal(deal_data, affiliate, photo=None):
+    """
+    Полный рендер для сохранения в БД (блокирующий — запускать в executor).
+    :param photo: уже обработанное фото (например, из кластеризации) —
+                  тогда картинка не скачивается повторно
+    :return: (render_json, render_photo)
+    """
+    if photo is None:
+        photo = render_photo(deal_data)
+    return json.dumps(render_text(deal_data, affiliate)), photo
+
+
+def load_post(deal_data):
+    """
+    Готовый пост из строки deals или None, если рендера нет или он
+    сделан другой версией шаблона.
+    :return: словарь caption, keyboard, photo_bytes, image_url, title, url
+    """
+    if deal_data.get("render_version") != RENDER_VERSION:
+        return None
+    if not deal_data.get("render_json"):
+        return None
+    return post_from_render(deal_data["render_json"], deal_data.get("render_photo"))
+
+
+def post_from_render(render_json, photo_bytes):
+    post = json.loads(render_json)
+    post["keyboard"] = InlineKeyboardMarkup.model_validate_json(post["keyboard"])
+    post["photo_bytes"] = photo_bytes
+    return post
@@ -0,0 +1,76 @@
+"""
+Роли процесса бота и координация нескольких процессов через базу.
+
+python main.py --role bot|scraper|publisher|all (по умолчанию all — все
+в одном процессе, как раньше). Процессы делят одну базу SQLite в режиме
+WAL и договариваются арендами (таблица leases, database.acquire_lease):
+
+  publisher — активен ровно один публикатор: он держит аренду "publisher",
+              остальные ждут в резерве и подхватывают ее, если активный
+              умер и аренда истекла (LEASE_TTL). Публикатор отправляет
+              все рассылки, в том числе личные уведомления, которые
+              скраперы ставят в очередь (database.queue_deliveries), —
+              так общий лимит Telegram не растет с числом узлов;
+  bot       — так же ровно один процесс поллит Telegram (аренда "bot");
+  scraper   — узлов может быть сколько угодно: расписание магазинов общее
+              (source_schedule), а скан магазина берется под аренду
+              "scan:<магазин>", так что каждый магазин сканирует один узел.
+
+Аренда продлевается каждые LEASE_TTL / 3 секунд. Если продлить не удалось
+(узел завис дольше срока и аренду забрал другой), работа роли отменяется
+и узел возвращается в резерв.
+"""
+
+import asyncio
+import contextlib
+import os
+import socket
+
+from config import LEASE_TTL
+from database import acquire_lease, release_lease
+
+ROLES = ("all", "bot", "scraper", "publisher")
+
+# Имя этого процесса в таблице leases
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def has_role(role, name):
+    """Выполняет ли процесс с ролью role работу name."""
+    return role == "all" or role == name
+
+
+async def run_as_leader(name, start, ttl=LEASE_TTL, holder=NODE_ID):
+    """
+    Запускает корутину start() только пока holder держит аренду name.
+    Без аренды ждет в резерве; при потере аренды отменяет работу и снова
+    ждет.
+    :return: результат start(), если она завершилась сама
+    """
+    renew = ttl / 3
+    standby = False
+    while True:
+        if not acquire_lease(name, holder, ttl):
+            if not standby:
+                print(f"[Role] {name}: standby, lease is held by another node")
+                standby = True
+            await asyncio.sleep(renew)
+            continue
+
+        standby = False
+        print(f"[Role] {name}: active on {holder}")
+        task = asyncio.create_task(start())
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=renew)
+                if done:
+                    return task.result()
+                if not acquire_lease(name, holder, ttl):
+                    print(f"[Role] {name}: lease lost, stopping")
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+            release_lease(name, holder)
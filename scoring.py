@@ -0,0 +1,83 @@
+"""
+Оценка «качества» скидки для приоритетной очереди публикации.
+Чем больше score, тем раньше скидка уйдет в канал.
+"""
+
+import math
+from functools import lru_cache
+
+from sizes import normalize_sizes
+from text_normalization import title_keys
+from utils import parse_price
+
+# Веса составляющих оценки
+DISCOUNT_WEIGHT = 1.0  # за каждый процент скидки
+SAVINGS_WEIGHT = 10.0  # за log(1 + экономия в тысячах рублей)
+SIZE_WEIGHT = 2.0  # за каждый подходящий размер (до MAX_SIZES_BONUS)
+MAX_SIZES_BONUS = 5
+MIN_VALID_SIZE = 41.0  # как в has_valid_size
+
+# Бонус популярным брендам (ищется в названии, в нижнем регистре)
+BRAND_BONUS = {
+    "jordan": 10,
+    "nike": 8,
+    "new balance": 8,
+    "adidas": 7,
+    "asics": 6,
+    "salomon": 6,
+    "puma": 4,
+    "reebok": 4,
+    "converse": 3,
+    "vans": 3,
+    "saucony": 3,
+}
+
+# Поправка по магазину (например, где лучше доставка/возврат)
+SOURCE_BONUS = {
+    "Brandshop": 2,
+    "StreetBeat": 1,
+    "Lamoda": 0,
+}
+
+
+def discount_percent(price, old_price):
+    """Процент скидки по текстовым ценам ('9 990 ₽', '14 990 ₽') или 0."""
+    price_num = parse_price(price)
+    old_num = parse_price(old_price)
+    if not price_num or not old_num or old_num <= price_num:
+        return 0.0
+    return (old_num - price_num) / old_num * 100
+
+
+@lru_cache(maxsize=8192)
+def detect_brand(title):
+    """Известный бренд из названия (в нижнем регистре) или None."""
+    keys = title_keys(title)
+    found = [brand for brand in BRAND_BONUS if brand in keys]
+    # "jordan" важнее "nike" в "Nike Air Jordan" — берем самый ценный
+    return max(found, key=BRAND_BONUS.get, default=None)
+
+
+def brand_bonus(title):
+    return BRAND_BONUS.get(detect_brand(title), 0)
+
+
+def deal_score(deal):
+    """
+    Считает приоритет скидки.
+    :param deal: словарь с ключами title, price, old_price, sizes, source
+        (sizes — список или строка из БД через запятую)
+    """
+    price_num = parse_price(deal.get("price")) or 0
+    old_num = parse_price(deal.get("old_price")) or 0
+    savings = max(old_num - price_num, 0)
+
+    sizes = normalize_sizes(deal.get("sizes_eu") or deal.get("sizes"))
+    valid_sizes = sum(1 for s in sizes if s >= MIN_VALID_SIZE)
+
+    score = DISCOUNT_WEIGHT * discount_percent(deal.get("price"), deal.get("old_price"))
+    score += SAVINGS_WEIGHT * math.log1p(savings / 1000)
+    score += SIZE_WEIGHT * min(valid_sizes, MAX_SIZES_BONUS)
+    score += brand_bonus(deal.get("title"))
+    score += SOURCE_BONUS.get(deal.get("source"), 0)
+    return round(score, 3)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -6,6 +7,9 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 
 from config import TARGET_URL
+from fixtures import shop_url, wrap_driver
+from metrics import ITEMS_FILTERED
+from text_normalization import make_title
 from utils import has_valid_size
 
 
@@ -13,10 +17,28 @@ class BaseScraper(ABC):
     """
     Abstract base class for all scrapers.
     Handles browser initialization and common cleanup.
+
+    A scan has two stages: fetch_catalog() collects items from listing pages,
+    enrich() fills in what needs extra requests (sizes, photos).
+    Both are generators: items are yielded as soon as they are parsed, so the
+    registry (scraper_registry.py) can stream them to the DB in batches.
+    A page is parsed completely before its first item is yielded: enrich()
+    may navigate away while fetch_catalog() is suspended.
+
+    Errors that end the scan (dead browser, driver failure) propagate out of
+    fetch_catalog(). A page that could not be loaded is skipped, and the
+    reason is stored in `incomplete`: the registry then fails the scan after
+    the items already collected are saved, so the source's queue is not
+    cleaned up from a partial catalog.
     """
 
+    # Value of the "source" key in deals (used for stale-deal cleanup)
+    SOURCE = None
+    # Why the last fetch_catalog() missed part of the catalog (None if it did not)
+    incomplete = None
+
     def __init__(self):
-        self.driver = self._get_driver()
+        self.driver = wrap_driver(self._get_driver())
 
     def _get_driver(self):
         options = Options()
@@ -32,84 +54,99 @@ class BaseScraper(ABC):
         driver = webdriver.Chrome(service=service, options=options)
         return driver
 
+    def browser_pid(self):
+        """PID of chromedriver; Chrome and its helpers are its children."""
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
     def close(self):
         if self.driver:
             self.driver.quit()
 
     @abstractmethod
-    def scrape(self, max_pages: int = 3) -> list:
+    def fetch_catalog(self, max_pages: int = 3) -> Iterator[Dict]:
         """
-        Main scrapping method.
-        Must return a list of dictionaries with standardized keys:
+        Collects items from catalog pages.
+        Must yield dictionaries with standardized keys:
         - title, price, old_price, discount, link, image_url, sizes, source
         """
         pass
 
+    def enrich(self, items: Iterable[Dict]) -> Iterator[Dict]:
+        """Fills in details that require extra page loads. Default: nothing."""
+        yield from items
+
+    def scrape(self, max_pages: int = 3) -> list:
+        """Main scrapping method: catalog + enrichment as one list."""
+        return list(self.enrich(list(self.fetch_catalog(max_pages=max_pages))))
+
 
 class BrandshopScraper(BaseScraper):
     """
     Scraper implementation for Brandshop.ru using Nuxt.js state extraction.
     """
 
-    def scrape(self, max_pages: int = 3) -> list:
-        print(f"[{self.__class__.__name__}] Starting scrape for {TARGET_URL}")
-        deals = []
+    SOURCE = "Brandshop"
 
-        try:
-            for page_num in range(1, max_pages + 1):
-                # Construct URL
-                url = TARGET_URL if page_num == 1 else f"{TARGET_URL}?page={page_num}"
-                print(f"[{self.__class__.__name__}] Loading page {page_num}: {url}")
-
-                self.driver.get(url)
+    def fetch_catalog(self, max_pages: int = 3) -> Iterator[Dict]:
+        print(f"[{self.__class__.__name__}] Starting scrape for {TARGET_URL}")
+        self.incomplete = None
 
-                # Wait for Nuxt state
-                try:
-                    WebDriverWait(self.driver, 10).until(
-                        lambda d: d.execute_script(
-                            "return window.__NUXT__ !== undefined"
-                        )
-                    )
-                except Exception:
-                    print(
-                        f"[{self.__class__.__name__}] Timeout waiting for data on page {page_num}"
-                    )
-                    continue
+        for page_num in range(1, max_pages + 1):
+            # Construct URL
+            url = TARGET_URL if page_num == 1 else f"{TARGET_URL}?page={page_num}"
+            print(f"[{self.__class__.__name__}] Loading page {page_num}: {url}")
 
-                # Extract data
-                try:
-                    items_data = self.driver.execute_script(
-                        "return window.__NUXT__ && window.__NUXT__.data && window.__NUXT__.data[0] ? window.__NUXT__.data[0].catalogProducts : null"
-                    )
-                except Exception as e:
-                    print(
-                        f"[{self.__class__.__name__}] Error extracting data on page {page_num}: {e}"
-                    )
-                    continue
+            self.driver.get(shop_url(url))
 
-                if not items_data:
-                    print(
-                        f"[{self.__class__.__name__}] No items found on page {page_num}, stopping."
-                    )
-                    break
+            # Wait for Nuxt state
+            try:
+                WebDriverWait(self.driver, 10).until(
+                    lambda d: d.execute_script("return window.__NUXT__ !== undefined")
+                )
+            except Exception:
+                print(
+                    f"[{self.__class__.__name__}] Timeout waiting for data on page {page_num}"
+                )
+                self.incomplete = f"page {page_num} timed out"
+                continue
 
+            # Extract data
+            try:
+                items_data = self.driver.execute_script(
+                    "return window.__NUXT__ && window.__NUXT__.data && window.__NUXT__.data[0] ? window.__NUXT__.data[0].catalogProducts : null"
+                )
+            except Exception as e:
                 print(
-                    f"[{self.__class__.__name__}] Found {len(items_data)} raw items on page {page_num}"
+                    f"[{self.__class__.__name__}] Error extracting data on page {page_num}: {e}"
                 )
+                self.incomplete = f"page {page_num}: {e}"
+                continue
 
-                for item in items_data:
-                    try:
-                        parsed_item = self._parse_item(item)
-                        if parsed_item:
-                            deals.append(parsed_item)
-                    except Exception as e:
-                        print(f"[{self.__class__.__name__}] Error parsing item: {e}")
-                        continue
+            if not items_data:
+                print(
+                    f"[{self.__class__.__name__}] No items found on page {page_num}, stopping."
+                )
+                break
 
-        except Exception as e:
-            print(f"[{self.__class__.__name__}] Critical Selenium Error: {e}")
+            print(
+                f"[{self.__class__.__name__}] Found {len(items_data)} raw items on page {page_num}"
+            )
 
-        return deals
+            page_deals = []
+            for item in items_data:
+                try:
+                    parsed_item = self._parse_item(item)
+                    if parsed_item:
+                        page_deals.append(parsed_item)
+                    else:
+                        ITEMS_FILTERED.inc(source=self.SOURCE)
+                except Exception as e:
+                    print(f"[{self.__class__.__name__}] Error parsing item: {e}")
+                    continue
+            yield from page_deals
 
     def _parse_item(self, item: dict) -> dict:
         """Helper to parse a single raw item dictionary."""
@@ -121,11 +158,7 @@ class BrandshopScraper(BaseScraper):
         if len(subtitles) > 1:
             model = subtitles[1].get("subtitle", "")
 
-        if model:
-            title = f"{brand} {model}".strip()
-        else:
-            full_name = item.get("fullName", "")
-            title = f"{brand} {full_name}".strip()
+        title = make_title(brand, model or item.get("fullName", ""))
 
         # Prices
         price_info = item.get("price", {})
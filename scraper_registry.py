@@ -0,0 +1,352 @@
+"""
+Реестр скраперов магазинов.
+
+Оркестратор (main.run_scrapers) работает с любым магазином через общий
+асинхронный интерфейс Scraper: fetch_catalog() -> enrich(items) -> close().
+fetch_catalog и enrich — асинхронные генераторы: товары отдаются по мере
+разбора, stream_scraper склеивает стадии в один поток скидок.
+Какие магазины сканировать, задается в config.SCRAPERS (переменная окружения
+SCRAPERS). Элемент списка — имя из реестра ("lamoda"), имя плагина из
+entry points группы ENTRY_POINT_GROUP или путь "модуль:класс".
+
+Блокирующие скраперы (Selenium/Playwright) оборачиваются в ThreadedScraper:
+все вызовы одного скрапера идут в его собственном потоке, потому что ни
+WebDriver, ни sync API Playwright нельзя дергать из разных потоков. Каждый
+вызов ограничен по времени; зависший браузер убивается сторожем
+(browser_watchdog.py). При SCRAPER_WORKERS=process они оборачиваются в
+ProcessScraper и работают в отдельном процессе (scraper_workers.py).
+
+Ошибки, обрывающие скан, скрапер пробрасывает из fetch_catalog. Если он
+пропустил страницу каталога, то пишет причину в атрибут incomplete:
+stream_scraper отдает все собранные скидки, а затем завершает скан ошибкой
+IncompleteScan — очередь магазина по неполному каталогу не чистится.
+"""
+
+import asyncio
+import importlib
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.metadata import entry_points
+from typing import AsyncIterator, List, Protocol, runtime_checkable
+
+import metrics
+from browser_watchdog import BrowserDied, IncompleteScan, ScrapeTimeout, kill_browser
+from config import (
+    SCRAPE_CALL_TIMEOUT,
+    SCRAPE_MAX_RESTARTS,
+    SCRAPE_TIMEOUT,
+    SCRAPER_WORKERS,
+    SCRAPERS,
+)
+from metrics import ITEMS_PARSED, SCRAPER_RESTARTS, SCRAPER_TIMEOUTS, STAGE_SECONDS
+from scraper_workers import ProcessScraper
+
+ENTRY_POINT_GROUP = "sneaker_bot.scrapers"
+
+# Сколько товаров каталога набирать перед обогащением: первые скидки
+# уходят в БД, не дожидаясь, пока обойдется весь каталог
+ENRICH_BATCH_SIZE = 20
+
+_DONE = object()
+
+
+@runtime_checkable
+class Scraper(Protocol):
+    """Общий интерфейс магазина для оркестратора."""
+
+    # Значение ключа "source" у скидок этого магазина
+    source: str
+
+    def fetch_catalog(self) -> AsyncIterator[dict]: ...
+
+    def enrich(self, items: List[dict]) -> AsyncIterator[dict]: ...
+
+    async def close(self) -> None: ...
+
+
+class ThreadedScraper:
+    """
+    Асинхронная обертка над блокирующим скрапером с методами-генераторами
+    fetch_catalog(max_pages), enrich(items) и методом close().
+    Экземпляр скрапера создается лениво, уже в рабочем потоке; следующий
+    элемент генератора тоже запрашивается в этом потоке.
+
+    Каждый вызов в потоке ограничен call_timeout, а все вызовы вместе —
+    timeout с первого вызова. Если вызов не уложился или скрапер выбросил
+    BrowserDied, браузер убивается, поток заменяется новым (старый
+    освободится, когда зависший вызов упадет), а скрапер создается заново.
+    enrich() после этого продолжается с оставшихся товаров (не больше
+    max_restarts раз за скан): enrich скрапера отдает по одному товару на
+    входной в том же порядке, а товар, на котором браузер завис, отдается
+    без обогащения. Каталог не перезапускается — скан магазина завершается
+    ошибкой ScrapeTimeout.
+    """
+
+    def __init__(
+        self,
+        scraper_cls,
+        max_pages=1,
+        call_timeout=SCRAPE_CALL_TIMEOUT,
+        timeout=SCRAPE_TIMEOUT,
+        max_restarts=SCRAPE_MAX_RESTARTS,
+    ):
+        self.scraper_cls = scraper_cls
+        self.source = getattr(scraper_cls, "SOURCE", None) or scraper_cls.__name__
+        self.max_pages = max_pages
+        self.call_timeout = call_timeout
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.incomplete = None
+        self._deadline = None
+        self._scraper = None
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"scraper-{self.source}"
+        )
+
+    async def _run(self, func, *args):
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.timeout
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            await self._reclaim()
+            raise ScrapeTimeout(f"{self.source}: scan exceeded {self.timeout} s")
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, func, *args)
+        timeout = min(self.call_timeout, remaining)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            SCRAPER_TIMEOUTS.inc(source=self.source)
+            print(f"[Watchdog] {self.source}: no response in {timeout:.0f} s")
+            await self._reclaim()
+            raise ScrapeTimeout(
+                f"{self.source}: browser hung for {timeout:.0f} s"
+            ) from None
+        except BrowserDied as e:
+            print(f"[Watchdog] {self.source}: browser died: {e}")
+            await self._reclaim()
+            raise
+
+    async def _reclaim(self):
+        """Убивает браузер и заменяет поток; скрапер создастся заново."""
+        scraper, self._scraper = self._scraper, None
+        # Убийство и ожидание процессов блокируют — не в потоке event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, kill_browser, scraper, self.source)
+        self._executor.shutdown(wait=False)
+        self._executor = self._new_executor()
+
+    def _get_scraper(self):
+        if self._scraper is None:
+            self._scraper = self.scraper_cls()
+        return self._scraper
+
+    def _fetch_catalog(self):
+        return iter(self._get_scraper().fetch_catalog(self.max_pages))
+
+    def _enrich(self, items):
+        return iter(self._get_scraper().enrich(items))
+
+    async def _iterate(self, start, *args):
+        iterator = await self._run(start, *args)
+        while True:
+            item = await self._run(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    def _close(self):
+        if self._scraper is not None:
+            try:
+                self._scraper.close()
+            finally:
+                self._scraper = None
+
+    async def fetch_catalog(self):
+        async for item in self._iterate(self._fetch_catalog):
+            yield item
+        # Читаем сразу: после перезапуска браузера в enrich скрапер будет новым
+        self.incomplete = getattr(self._scraper, "incomplete", None)
+
+    async def enrich(self, items):
+        items = list(items)
+        done = 0
+        while True:
+            try:
+                async for item in self._iterate(self._enrich, items[done:]):
+                    done += 1
+                    yield item
+                return
+            except (ScrapeTimeout, BrowserDied) as e:
+                out_of_time = time.monotonic() >= self._deadline
+                if out_of_time or self.restarts >= self.max_restarts:
+                    raise
+                if done >= len(items):
+                    return
+                self.restarts += 1
+                SCRAPER_RESTARTS.inc(source=self.source)
+                print(
+                    f"[Watchdog] {self.source}: restarting browser "
+                    f"({self.restarts}/{self.max_restarts}) after: {e}"
+                )
+                # Товар, на котором браузер завис, — как есть
+                yield items[done]
+                done += 1
+
+    async def close(self):
+        try:
+            await self._run(self._close)
+        except (ScrapeTimeout, BrowserDied):
+            pass  # браузер уже убит сторожем
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+# Встроенные магазины: имя -> ("модуль:класс", страниц каталога).
+# Модули импортируются только при использовании (Playwright не нужен,
+# если Lamoda сканируется через Selenium, и наоборот).
+BUILTIN_SCRAPERS = {
+    "brandshop": ("scraper:BrandshopScraper", 3),
+    "lamoda": ("lamoda_scraper_pw:LamodaScraperPW", 1),
+    "lamoda_selenium": ("lamoda_scraper:LamodaScraper", 1),
+    "streetbeat": ("streetbeat_scraper:StreetBeatScraper", 3),
+}
+
+# Магазины, зарегистрированные из кода (register_scraper)
+_REGISTRY = {}
+
+
+def register_scraper(name, factory):
+    """
+    Регистрирует магазин.
+    :param factory: вызываемый объект без аргументов, возвращающий Scraper
+    """
+    _REGISTRY[name] = factory
+
+
+def _import(path):
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _as_factory(obj, max_pages=1):
+    """
+    Класс блокирующего скрапера -> фабрика ThreadedScraper (или
+    ProcessScraper при SCRAPER_WORKERS=process), иначе как есть.
+    """
+    if isinstance(obj, type) and hasattr(obj, "fetch_catalog"):
+        if not inspect.isasyncgenfunction(obj.fetch_catalog):
+            if SCRAPER_WORKERS == "process":
+                return lambda: ProcessScraper(
+                    obj, max_pages=max_pages, enrich_batch=ENRICH_BATCH_SIZE
+                )
+            return lambda: ThreadedScraper(obj, max_pages=max_pages)
+    return obj
+
+
+def _plugin_entry_points():
+    """Entry points группы ENTRY_POINT_GROUP (entry_points(group=) — с 3.10)."""
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group=ENTRY_POINT_GROUP)
+    return eps.get(ENTRY_POINT_GROUP, [])
+
+
+def resolve_scraper(name):
+    """Фабрика Scraper по имени из реестра, entry point или пути модуль:класс."""
+    if name in _REGISTRY:
+        return _REGISTRY[name]
+    if name in BUILTIN_SCRAPERS:
+        path, max_pages = BUILTIN_SCRAPERS[name]
+        return _as_factory(_import(path), max_pages)
+
+    for entry_point in _plugin_entry_points():
+        if entry_point.name == name:
+            return _as_factory(entry_point.load())
+
+    if ":" in name:
+        return _as_factory(_import(name))
+    raise KeyError(f"Unknown scraper: {name}")
+
+
+def load_scrapers(names=None):
+    """
+    Новые экземпляры скраперов для одного скана.
+    Магазины, которые не удалось загрузить, пропускаются с сообщением в лог.
+    """
+    scrapers = []
+    for name in SCRAPERS if names is None else names:
+        try:
+            scrapers.append(resolve_scraper(name)())
+        except Exception as e:
+            print(f"[Scraper] Cannot load scraper {name}: {e}")
+    return scrapers
+
+
+async def _timed(stream, durations, stage):
+    """
+    Поток как есть, но время ожидания каждого элемента копится в
+    durations[stage] (без времени, пока элемент обрабатывает потребитель).
+    """
+    iterator = stream.__aiter__()
+    while True:
+        started = time.perf_counter()
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            durations[stage] += time.perf_counter() - started
+        yield item
+
+
+async def stream_scraper(scraper, enrich_batch=ENRICH_BATCH_SIZE):
+    """
+    Поток скидок одного магазина: товары каталога обогащаются пачками по
+    enrich_batch и отдаются сразу. Скрапер закрывается в конце (или при
+    ошибке).
+    """
+    # Время стадий копится только при включенных метриках
+    durations = {"catalog": 0.0, "enrich": 0.0}
+
+    def enrich(items):
+        stream = scraper.enrich(items)
+        return _timed(stream, durations, "enrich") if metrics.ENABLED else stream
+
+    catalog = scraper.fetch_catalog()
+    if metrics.ENABLED:
+        catalog = _timed(catalog, durations, "catalog")
+
+    try:
+        batch = []
+        async for item in catalog:
+            ITEMS_PARSED.inc(source=scraper.source)
+            batch.append(item)
+            if len(batch) >= enrich_batch:
+                async for deal in enrich(batch):
+                    yield deal
+                batch = []
+        if batch:
+            async for deal in enrich(batch):
+                yield deal
+        incomplete = getattr(scraper, "incomplete", None)
+        if incomplete:
+            raise IncompleteScan(f"{scraper.source}: {incomplete}")
+    finally:
+        try:
+            await scraper.close()
+        finally:
+            if metrics.ENABLED:
+                for stage, seconds in durations.items():
+                    STAGE_SECONDS.observe(seconds, stage=stage, source=scraper.source)
+
+
+async def run_scraper(scraper):
+    """Полный скан одного магазина одним списком."""
+    return [deal async for deal in stream_scraper(scraper)]
@@ -0,0 +1,301 @@
+"""
+Скраперы в отдельных процессах (SCRAPER_WORKERS=process).
+
+В режиме thread блокирующий скрапер работает в потоке процесса бота, и
+память Selenium/Playwright, утекшие дескрипторы и разбор страниц под GIL
+сказываются на задержках aiogram. В режиме process у каждого магазина свой
+процесс-воркер (WorkerPool: ProcessPoolExecutor на один процесс, запуск
+через spawn). Воркер выполняет скан магазина целиком — каталог и
+обогащение пачками, как stream_scraper, — и отправляет скидки по одной в
+очередь multiprocessing (pickle). Процесс пересоздается после
+SCRAPER_WORKER_MAX_RUNS сканов, так что память браузера не копится
+(вручную: max_tasks_per_child у ProcessPoolExecutor есть только с
+Python 3.11, а образ собирается на 3.9).
+
+Сканы одного магазина идут по очереди (_scan_lock): у пула магазина одна
+очередь результатов, и два одновременных скана забирали бы скидки друг
+друга, а сторож ждущего скана убил бы воркер посреди чужого.
+
+Сторож тот же, что и для потоков: если от воркера нет сообщений дольше
+SCRAPE_CALL_TIMEOUT или скан не уложился в SCRAPE_TIMEOUT, дерево процессов
+воркера (вместе с браузером) убивается, пул магазина пересоздается, а скан
+завершается ошибкой ScrapeTimeout. Перезапуска с середины, как в
+ThreadedScraper, нет: следующий скан начнется в новом процессе.
+
+Метрики, которые скраперы пишут изнутри (ожидания, покрытие размеров),
+в режиме process остаются в процессе воркера и в /metrics не попадают.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from browser_watchdog import IncompleteScan, ScrapeTimeout
+from config import SCRAPE_CALL_TIMEOUT, SCRAPE_TIMEOUT, SCRAPER_WORKER_MAX_RUNS
+from metrics import BROWSER_KILLED, SCRAPER_RESTARTS, SCRAPER_TIMEOUTS
+from process_tree import kill_tree, reap_zombies, wait_exited
+
+POLL = 1.0  # секунд ожидания очереди между проверками сторожа
+
+# Сообщения воркера: (скан, вид, данные)
+STARTED, DEAL, ERROR, DONE = "started", "deal", "error", "done"
+
+# Очередь результатов в процессе воркера (задается инициализатором пула)
+_QUEUE = None
+
+
+def _init_worker(results):
+    global _QUEUE
+    _QUEUE = results
+
+
+def _scan(scan_id, scraper_cls, max_pages, enrich_batch):
+    """Скан магазина в процессе воркера; скидки уходят в очередь по одной."""
+    _QUEUE.put((scan_id, STARTED, os.getpid()))
+    scraper = None
+    try:
+        scraper = scraper_cls()
+        batch = []
+        for item in scraper.fetch_catalog(max_pages):
+            batch.append(item)
+            if len(batch) >= enrich_batch:
+                for deal in scraper.enrich(batch):
+                    _QUEUE.put((scan_id, DEAL, deal))
+                batch = []
+        if batch:
+            for deal in scraper.enrich(batch):
+                _QUEUE.put((scan_id, DEAL, deal))
+        if getattr(scraper, "incomplete", None):
+            raise IncompleteScan(scraper.incomplete)
+    except Exception as e:
+        _QUEUE.put((scan_id, ERROR, f"{type(e).__name__}: {e}"))
+    finally:
+        try:
+            if scraper is not None:
+                scraper.close()
+        finally:
+            _QUEUE.put((scan_id, DONE, None))
+
+
+class WorkerPool:
+    """Процесс-воркер одного магазина и очередь его результатов."""
+
+    def __init__(self, source, max_runs=SCRAPER_WORKER_MAX_RUNS):
+        self.source = source
+        self.max_runs = max_runs
+        self._start()
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.results,),
+        )
+        self.runs = 0
+
+    def submit(self, *args):
+        if self.runs >= self.max_runs:
+            # Прошлый скан закончен, воркер свободен и выходит сам
+            self.shutdown()
+            self._start()
+        self.runs += 1
+        return self.executor.submit(_scan, *args)
+
+    def worker_pids(self):
+        return list(getattr(self.executor, "_processes", None) or {})
+
+    def kill(self):
+        """
+        Убивает процессы воркера вместе с потомками (браузером) и ждет,
+        пока они завершатся.
+        :return: PID убитых процессов
+        """
+        killed = [pid for worker in self.worker_pids() for pid in kill_tree(worker)]
+        still_running = wait_exited(killed)
+        if still_running:
+            print(
+                f"[Watchdog] {self.source}: still running after kill: {still_running}"
+            )
+        return killed
+
+    def restart(self):
+        """Пересоздает пул с новой очередью (после kill или смерти воркера)."""
+        self.shutdown()
+        self._start()
+        SCRAPER_RESTARTS.inc(source=self.source)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.results.close()
+        self.results.cancel_join_thread()
+
+
+# Пулы по магазинам: процесс живет между сканами (до max_runs сканов)
+_POOLS = {}
+
+# event loop -> {магазин: asyncio.Lock}: один скан магазина за раз
+_SCAN_LOCKS = weakref.WeakKeyDictionary()
+
+
+def _scan_lock(source):
+    locks = _SCAN_LOCKS.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get(source)
+    if lock is None:
+        lock = locks[source] = asyncio.Lock()
+    return lock
+
+
+def get_pool(source, max_runs=SCRAPER_WORKER_MAX_RUNS):
+    pool = _POOLS.get(source)
+    if pool is None or pool.max_runs != max_runs:
+        if pool is not None:
+            pool.shutdown()
+        pool = _POOLS[source] = WorkerPool(source, max_runs)
+    return pool
+
+
+def shutdown_pools():
+    """Останавливает воркеры всех магазинов (при выходе бота)."""
+    for pool in _POOLS.values():
+        pool.kill()
+        pool.shutdown()
+    _POOLS.clear()
+
+
+class ProcessScraper:
+    """
+    Scraper, который сканирует блокирующий скрапер scraper_cls в процессе
+    воркера. fetch_catalog() отдает уже обогащенные скидки, enrich() отдает
+    товары как есть.
+    """
+
+    def __init__(
+        self,
+        scraper_cls,
+        max_pages=1,
+        enrich_batch=20,
+        call_timeout=SCRAPE_CALL_TIMEOUT,
+        timeout=SCRAPE_TIMEOUT,
+        max_runs=SCRAPER_WORKER_MAX_RUNS,
+    ):
+        self.scraper_cls = scraper_cls
+        self.source = getattr(scraper_cls, "SOURCE", None) or scraper_cls.__name__
+        self.max_pages = max_pages
+        self.enrich_batch = enrich_batch
+        self.call_timeout = call_timeout
+        self.timeout = timeout
+        self.max_runs = max_runs
+        self.pid = None
+        self._future = None
+        self._pool = None
+        self._lock = None
+
+    async def fetch_catalog(self):
+        lock = _scan_lock(self.source)
+        await lock.acquire()
+        self._lock = lock
+        try:
+            async for deal in self._stream():
+                yield deal
+        finally:
+            self._release()
+
+    def _release(self):
+        lock, self._lock = self._lock, None
+        if lock is not None:
+            lock.release()
+
+    async def _stream(self):
+        self._pool = get_pool(self.source, self.max_runs)
+        scan_id = f"{os.getpid()}-{id(self)}-{time.monotonic()}"
+        self._future = self._pool.submit(
+            scan_id, self.scraper_cls, self.max_pages, self.enrich_batch
+        )
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.timeout
+        last = time.monotonic()
+        error = None
+        while True:
+            try:
+                message = await loop.run_in_executor(
+                    None, self._pool.results.get, True, POLL
+                )
+            except queue.Empty:
+                await self._check(deadline, last)
+                continue
+            except (EOFError, OSError) as e:
+                await self._reclaim()
+                raise RuntimeError(f"{self.source}: worker queue broken: {e}")
+
+            sender, kind, payload = message
+            if sender != scan_id:
+                continue  # хвост прерванного скана
+            last = time.monotonic()
+            if kind == STARTED:
+                self.pid = payload
+            elif kind == DEAL:
+                yield payload
+            elif kind == ERROR:
+                error = payload  # дождемся, пока воркер закроет браузер
+            elif kind == DONE:
+                self._future = None
+                if error:
+                    raise RuntimeError(f"{self.source} worker: {error}")
+                return
+
+    async def _check(self, deadline, last):
+        """Сторож: воркер умер, скан не уложился или воркер молчит."""
+        if self._future.done() and self._future.exception() is not None:
+            error = self._future.exception()
+            print(f"[Worker] {self.source}: worker died: {error!r}")
+            await self._reclaim()
+            raise RuntimeError(f"{self.source}: worker died: {error!r}")
+
+        now = time.monotonic()
+        if now >= deadline:
+            reason = f"scan exceeded {self.timeout} s"
+        elif now - last >= self.call_timeout:
+            reason = f"no response in {self.call_timeout:.0f} s"
+        else:
+            return
+        SCRAPER_TIMEOUTS.inc(source=self.source)
+        print(f"[Watchdog] {self.source}: worker {reason}")
+        await self._reclaim()
+        raise ScrapeTimeout(f"{self.source}: {reason}")
+
+    async def _reclaim(self):
+        """Убивает воркер вместе с браузером и пересоздает пул магазина."""
+        # Убийство и ожидание процессов блокируют — не в потоке event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._kill)
+        self._future = None
+
+    def _kill(self):
+        workers = self._pool.worker_pids()
+        killed = self._pool.kill()
+        self._pool.restart()
+        # Статус самих воркеров забирает multiprocessing
+        reaped = reap_zombies([pid for pid in killed if pid not in workers])
+        BROWSER_KILLED.inc(len(killed), source=self.source)
+        print(
+            f"[Watchdog] {self.source}: killed {len(killed)} worker processes"
+            + (f", reaped {reaped} zombies" if reaped else "")
+        )
+
+    async def enrich(self, items):
+        for item in items:
+            yield item
+
+    async def close(self):
+        # Скан прерван потребителем — воркер еще работает, его не дождаться
+        if self._future is not None and not self._future.done():
+            await self._reclaim()
+        self._future = None
+        self._release()
@@ -0,0 +1,149 @@
+"""
+Разбор и нормализация размеров обуви.
+
+Магазины отдают размеры в разном виде: '42', '42,5 EU', 'EU 42', '41 RUS',
+'US 9', '42 2/3' или '35 RUS\\n36 EUR' в одной ячейке. Здесь все это
+приводится к одному числовому европейскому размеру (EU), которым пользуются
+format_sizes, has_valid_size, подписки и колонка sizes_eu в БД.
+"""
+
+import re
+from functools import lru_cache
+
+# Разумные границы размера EU для кроссовок: все, что вне, — не размер
+MIN_EU_SIZE = 30.0
+MAX_EU_SIZE = 52.0
+
+_NUM = r"(\d{1,2}(?:[.,]\d{1,2})?)(?:\s+([12])/3)?"
+_EU_RE = re.compile(rf"(?:\bEU[R]?\s*{_NUM})|(?:{_NUM}\s*EU[R]?\b)", re.IGNORECASE)
+_US_RE = re.compile(rf"(?:\bUS\s*{_NUM})|(?:{_NUM}\s*US\b)", re.IGNORECASE)
+_UK_RE = re.compile(rf"(?:\bUK\s*{_NUM})|(?:{_NUM}\s*UK\b)", re.IGNORECASE)
+_RUS_RE = re.compile(
+    rf"(?:\bRU[S]?\s*{_NUM})|(?:{_NUM}\s*(?:RU[S]?|РОС)\b)", re.IGNORECASE
+)
+_PLAIN_RE = re.compile(_NUM)
+
+# Мужская сетка (по таблицам Nike/adidas): US -> EU
+US_TO_EU = {
+    6.0: 38.5,
+    6.5: 39.0,
+    7.0: 40.0,
+    7.5: 40.5,
+    8.0: 41.0,
+    8.5: 42.0,
+    9.0: 42.5,
+    9.5: 43.0,
+    10.0: 44.0,
+    10.5: 44.5,
+    11.0: 45.0,
+    11.5: 45.5,
+    12.0: 46.0,
+    12.5: 47.0,
+    13.0: 47.5,
+    14.0: 48.5,
+}
+
+# UK -> EU
+UK_TO_EU = {
+    5.5: 38.5,
+    6.0: 39.0,
+    6.5: 40.0,
+    7.0: 40.5,
+    7.5: 41.0,
+    8.0: 42.0,
+    8.5: 42.5,
+    9.0: 43.0,
+    9.5: 44.0,
+    10.0: 44.5,
+    10.5: 45.0,
+    11.0: 46.0,
+    11.5: 46.5,
+    12.0: 47.0,
+    13.0: 48.5,
+}
+
+# Российская сетка на Lamoda идет на размер меньше европейской: 41 RUS = 42 EU
+RUS_TO_EU = {r / 2: r / 2 + 1 for r in range(2 * 33, 2 * 50 + 1)}
+
+
+def _match_value(match):
+    """Число из совпадения (с учетом дробей adidas вида '42 2/3')."""
+    groups = match.groups()
+    # В каждом шаблоне две альтернативы по две группы: (число, дробь)
+    for i in range(0, len(groups), 2):
+        if groups[i]:
+            value = float(groups[i].replace(",", "."))
+            if groups[i + 1]:
+                # 1/3 и 2/3 округляем до половинки: 42 2/3 -> 42.5
+                value += 0.5
+            return value
+    return None
+
+
+def _convert(value, table):
+    """Перевод по таблице; между строками таблицы — ближайшее меньшее значение."""
+    if value in table:
+        return table[value]
+    lower = [k for k in table if k <= value]
+    if not lower:
+        return None
+    key = max(lower)
+    return table[key] + (value - key)
+
+
+@lru_cache(maxsize=4096)
+def parse_size(text):
+    """
+    Размер EU из строки или None, если размер не распознан.
+    Если в строке несколько систем (Lamoda: '35 RUS 36 EUR'), приоритет у EU.
+    """
+    if text is None:
+        return None
+    text = str(text)
+
+    match = _EU_RE.search(text)
+    if match:
+        value = _match_value(match)
+    else:
+        value = None
+        for regex, table in (
+            (_US_RE, US_TO_EU),
+            (_UK_RE, UK_TO_EU),
+            (_RUS_RE, RUS_TO_EU),
+        ):
+            match = regex.search(text)
+            if match:
+                value = _convert(_match_value(match), table)
+                break
+        else:
+            match = _PLAIN_RE.search(text)
+            if match:
+                value = _match_value(match)
+
+    if value is None or not MIN_EU_SIZE <= value <= MAX_EU_SIZE:
+        return None
+    return value
+
+
+def normalize_sizes(sizes):
+    """
+    Канонический набор размеров EU: отсортированный кортеж без повторов.
+    :param sizes: список строк или строка из БД через запятую
+    """
+    if not sizes:
+        return ()
+    if isinstance(sizes, str):
+        sizes = sizes.split(",")
+    values = {parse_size(s) for s in sizes}
+    values.discard(None)
+    return tuple(sorted(values))
+
+
+def format_size(value):
+    """42.0 -> '42', 42.5 -> '42.5'"""
+    return f"{int(value)}" if float(value).is_integer() else f"{value:g}"
+
+
+def sizes_to_db(sizes):
+    """Канонические размеры для колонки sizes_eu: '41,42,42.5'."""
+    return ",".join(format_size(v) for v in normalize_sizes(sizes))
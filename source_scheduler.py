@@ -0,0 +1,229 @@
+"""
+Адаптивное расписание сканов по магазинам.
+
+Вместо одного общего цикла раз в 30 минут у каждого магазина свой интервал.
+После скана считается скорость изменений магазина (новые и изменившиеся
+скидки в час, экспоненциальное сглаживание) и интервал подбирается так,
+чтобы за скан набиралось около SCAN_TARGET_CHANGES изменений: магазин, где
+все меняется, сканируется чаще, а «тихий» — реже. Интервал меняется не
+более чем в MAX_STEP раз за скан и не выходит за границы из config.
+
+К каждому сроку добавляется случайный разброс (SCAN_JITTER), чтобы сканы
+магазинов не сбивались в одно время. Если подошел срок, а предыдущий скан
+магазина еще идет, очередной запуск пропускается. Расписание хранится в
+таблице source_schedule и переживает перезапуск бота.
+
+С shared=True расписание общее для нескольких процессов-скраперов (см.
+roles.py): перед каждой проверкой оно перечитывается из БД, скан магазина
+берется под аренду "scan:<магазин>", а новый срок записывается сразу при
+запуске, чтобы другие узлы не взяли тот же магазин.
+"""
+
+import asyncio
+import random
+import time
+
+from config import (
+    LEASE_TTL,
+    SCAN_INTERVAL,
+    SCAN_MIN_INTERVAL,
+    SCAN_MAX_INTERVAL,
+    SCAN_JITTER,
+    SCAN_TARGET_CHANGES,
+    SCAN_INTERVALS,
+)
+from database import (
+    acquire_lease,
+    get_source_schedules,
+    release_lease,
+    save_source_schedule,
+)
+
+# Как часто проверять, не пора ли сканировать (секунд)
+TICK = 15
+# Вес последнего скана в сглаженной скорости изменений
+RATE_ALPHA = 0.3
+# Во сколько раз максимум меняется интервал за один скан
+MAX_STEP = 2.0
+# Срок аренды скана магазина; пока скан идет (в том числе ждет свободного
+# слота SCRAPER_CONCURRENCY), она продлевается каждые SCAN_LEASE_TTL / 3
+SCAN_LEASE_TTL = LEASE_TTL
+
+
+def interval_bounds(source):
+    """Границы интервала магазина (min, max) в секундах."""
+    return SCAN_INTERVALS.get(source, (SCAN_MIN_INTERVAL, SCAN_MAX_INTERVAL))
+
+
+def clamp_interval(interval, bounds):
+    low, high = bounds
+    return min(high, max(low, interval))
+
+
+def update_rate(rate, changes, interval):
+    """
+    Сглаженная скорость изменений (в час) после скана.
+    :param rate: прежняя скорость или None, если магазин еще не сканировали
+    :param changes: новые и изменившиеся скидки за скан
+    :param interval: интервал, за который они накопились (секунд)
+    """
+    sample = changes * 3600 / interval
+    if rate is None:
+        return sample
+    return RATE_ALPHA * sample + (1 - RATE_ALPHA) * rate
+
+
+def next_interval(interval, rate, bounds, target=SCAN_TARGET_CHANGES):
+    """Интервал, за который при скорости rate набирается target изменений."""
+    if rate > 0:
+        wanted = target / rate * 3600
+    else:
+        wanted = interval * MAX_STEP
+    wanted = min(interval * MAX_STEP, max(interval / MAX_STEP, wanted))
+    return clamp_interval(wanted, bounds)
+
+
+class SourceScheduler:
+    """
+    Запускает сканы магазинов по их расписанию.
+    :param sources: имена магазинов (как в config.SCRAPERS)
+    :param scan: корутина scan(names) -> {имя: число изменений или None,
+        если скан упал} (main.run_scrapers)
+    :param shared: расписание общее с другими процессами (holder — имя
+        этого процесса в таблице leases)
+    """
+
+    def __init__(
+        self, sources, scan, clock=time.time, rng=None, shared=False, holder=None
+    ):
+        self.sources = list(sources)
+        self.scan = scan
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.shared = shared
+        self.holder = holder
+        self.schedule = {}
+        self.running = {}
+
+    def load(self):
+        """Берет расписание из БД; новые магазины сканируются сразу."""
+        saved = get_source_schedules()
+        now = self.clock()
+        for source in self.sources:
+            row = saved.get(source) or {}
+            bounds = interval_bounds(source)
+            # Время начала идущего скана остается в памяти
+            self.schedule.setdefault(source, {}).update(
+                {
+                    "interval": clamp_interval(
+                        row.get("interval") or SCAN_INTERVAL, bounds
+                    ),
+                    "next_run": row.get("next_run") or now,
+                    "change_rate": row.get("change_rate"),
+                    "last_changes": row.get("last_changes"),
+                }
+            )
+
+    def jittered(self, interval):
+        return interval * (1 + self.rng.uniform(-SCAN_JITTER, SCAN_JITTER))
+
+    def _save(self, source):
+        entry = self.schedule[source]
+        save_source_schedule(
+            source,
+            entry["interval"],
+            entry["next_run"],
+            entry["change_rate"],
+            entry["last_changes"],
+        )
+
+    def due_sources(self):
+        now = self.clock()
+        return [s for s in self.sources if self.schedule[s]["next_run"] <= now]
+
+    def tick(self):
+        """Запускает сканы магазинов, у которых подошел срок."""
+        if self.shared:
+            self.load()
+        started = []
+        for source in self.due_sources():
+            if self.shared and source not in self.running:
+                if not acquire_lease(
+                    f"scan:{source}", self.holder, SCAN_LEASE_TTL, now=self.clock()
+                ):
+                    continue  # магазин сканирует другой узел
+            entry = self.schedule[source]
+            # Сроки считаются от начала скана, поэтому долгий скан может
+            # не успеть закончиться к следующему
+            entry["next_run"] = self.clock() + self.jittered(entry["interval"])
+            if source in self.running:
+                self._save(source)
+                print(f"[Schedule] {source}: previous scan still running, skipping")
+                continue
+            entry["started"] = self.clock()
+            if self.shared:
+                self._save(source)
+            self.running[source] = asyncio.create_task(self._run(source))
+            started.append(source)
+        return started
+
+    def record(self, source, changes):
+        """
+        Пересчитывает расписание после скана.
+        :param changes: число изменений за скан или None, если скан упал
+            (тогда интервал и скорость не меняются)
+        """
+        entry = self.schedule[source]
+        if changes is not None:
+            entry["change_rate"] = update_rate(
+                entry["change_rate"], changes, entry["interval"]
+            )
+            entry["last_changes"] = changes
+            entry["interval"] = next_interval(
+                entry["interval"], entry["change_rate"], interval_bounds(source)
+            )
+        started = entry.get("started", self.clock())
+        entry["next_run"] = started + self.jittered(entry["interval"])
+        self._save(source)
+        print(
+            f"[Schedule] {source}: {changes} changes, "
+            f"next scan in {entry['interval'] / 60:.0f} min"
+        )
+
+    async def _renew(self, source, scan):
+        """Продлевает аренду скана; если ее забрал другой узел — отменяет скан."""
+        while True:
+            await asyncio.sleep(SCAN_LEASE_TTL / 3)
+            if not acquire_lease(
+                f"scan:{source}", self.holder, SCAN_LEASE_TTL, now=self.clock()
+            ):
+                print(f"[Schedule] {source}: scan lease lost, stopping the scan")
+                scan.cancel()
+                return
+
+    async def _run(self, source):
+        changes = None
+        renewal = None
+        if self.shared:
+            renewal = asyncio.create_task(self._renew(source, asyncio.current_task()))
+        try:
+            results = await self.scan([source])
+            changes = (results or {}).get(source)
+        except Exception as e:
+            print(f"[Schedule] {source} scan error: {e}")
+        finally:
+            if renewal is not None:
+                renewal.cancel()
+            self.running.pop(source, None)
+            try:
+                self.record(source, changes)
+            finally:
+                if self.shared:
+                    release_lease(f"scan:{source}", self.holder)
+
+    async def run(self, tick=TICK):
+        """Бесконечный цикл планировщика."""
+        self.load()
+        while True:
+            self.tick()
+            await asyncio.sleep(tick)
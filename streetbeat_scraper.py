@@ -7,23 +7,225 @@ from selenium_stealth import stealth
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from database import deal_exists
+from fixtures import shop_url
+from metrics import ITEMS_FILTERED, SIZE_COVERAGE
+from scraper import BaseScraper
+from text_normalization import make_title
+from waits import record_wait
 
 # Constants
-STREETBEAT_URL = "https://street-beat.ru/cat/man/krossovki/sale/"
-
-
-class StreetBeatScraper:
+STREETBEAT_HOST = "https://street-beat.ru"
+STREETBEAT_URL = f"{STREETBEAT_HOST}/cat/man/krossovki/sale/"
+CARD_SELECTOR = "div.product-card"
+
+# Догрузка листинга прокруткой (SCROLL_LOADER_SCRIPT)
+# Запросы, которыми листинг догружает товары; пока они идут, ждем дальше
+LISTING_REQUESTS = r"/api/|/cat/"
+SCROLL_IDLE_MS = 2000  # листинг не растет столько после прокрутки — он кончился
+SCROLL_SETTLE_MS = 300  # пауза после роста DOM перед следующей прокруткой
+SCROLL_DEADLINE_MS = 60000  # жесткий предел на всю догрузку
+SCROLL_BUDGET = 6  # секунд занимали прежние три прокрутки по 2 с (для метрик)
+
+SIZE_LABEL_SELECTOR = ".block-hover__product-size .radio__label"
+
+# arguments: cardSelector, sizeLabelSelector.
+# Возвращает {items: товары digitalData.listing.items с ключом sizes, cards: N}.
+# Товар и карточка связываются по пути ссылки: href карточки бывает и
+# абсолютным, и относительным, а при воспроизведении фикстур ведет на
+# /street-beat.ru/... локального сервера.
+EXTRACT_LISTING_SCRIPT = """
+var cardSelector = arguments[0];
+var labelSelector = arguments[1];
+var hostPrefix = '/street-beat.ru/';
+
+function key(url) {
+    if (!url) return '';
+    var path;
+    try { path = new URL(url, location.href).pathname; } catch (e) { return url; }
+    return path.indexOf(hostPrefix) === 0 ? path.slice(hostPrefix.length - 1) : path;
+}
+
+var sizes = {};
+var cards = document.querySelectorAll(cardSelector);
+for (var i = 0; i < cards.length; i++) {
+    var info = cards[i].querySelector('.product-card__info');
+    if (!info || !info.href) continue;
+    var labels = cards[i].querySelectorAll(labelSelector);
+    var list = [];
+    for (var j = 0; j < labels.length; j++) {
+        var text = labels[j].textContent.trim();
+        if (text) list.push(text);
+    }
+    sizes[key(info.href)] = list;
+}
+
+var d = window.digitalData;
+var listing = d && d.listing && d.listing.items ? d.listing.items : [];
+var items = [];
+for (var k = 0; k < listing.length; k++) {
+    var item = Object.assign({}, listing[k]);
+    item.sizes = sizes[key(item.url)] || [];
+    items.push(item);
+}
+return {items: items, cards: cards.length};
+"""
+
+# arguments: maxPages, cardSelector, requestPattern, idleMs, settleMs, deadlineMs, callback.
+# Листает вниз, пока растут digitalData.listing.items и число карточек:
+# MutationObserver ловит новые карточки и запускает следующую прокрутку, а
+# если после прокрутки ничего не растет (и не идут запросы листинга) idleMs —
+# листинг кончился. Цель — maxPages «страниц» размером с первую подгрузку.
+SCROLL_LOADER_SCRIPT = """
+var maxPages = arguments[0];
+var cardSelector = arguments[1];
+var requestPattern = new RegExp(arguments[2]);
+var idleMs = arguments[3];
+var settleMs = arguments[4];
+var deadlineMs = arguments[5];
+var callback = arguments[arguments.length - 1];
+var started = Date.now();
+var scrolls = 0;
+var finished = false;
+var idleTimer = null;
+var settleTimer = null;
+
+function listingCount() {
+    var d = window.digitalData;
+    return d && d.listing && d.listing.items ? d.listing.items.length : 0;
+}
+function cardCount() { return document.querySelectorAll(cardSelector).length; }
+function requestCount() {
+    return performance.getEntriesByType('resource')
+        .filter(function(e) { return requestPattern.test(e.name); }).length;
+}
+function snapshot() { return [listingCount(), cardCount(), requestCount()]; }
+
+var last = snapshot();
+var target = maxPages * Math.max(last[0], last[1]);
+
+function grew() {
+    var now = snapshot();
+    var changed = now[0] > last[0] || now[1] > last[1] || now[2] > last[2];
+    last = now;
+    return changed;
+}
+function reached() {
+    var loaded = last[0] ? Math.min(last[0], last[1]) : last[1];
+    return loaded >= target;
+}
+function finish(reason) {
+    if (finished) return;
+    finished = true;
+    clearTimeout(idleTimer);
+    clearTimeout(settleTimer);
+    clearTimeout(deadlineTimer);
+    mutations.disconnect();
+    callback({items: listingCount(), cards: cardCount(), target: target,
+              scrolls: scrolls, reason: reason, ms: Date.now() - started});
+}
+function scrollDown() {
+    if (finished) return;
+    scrolls++;
+    window.scrollTo(0, document.body.scrollHeight);
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(onIdle, idleMs);
+}
+function onIdle() {
+    // digitalData и запросы меняются без мутаций DOM — проверяем их здесь
+    if (!grew()) { finish('idle'); return; }
+    if (reached()) { finish('target'); return; }
+    scrollDown();
+}
+
+var mutations = new MutationObserver(function() {
+    if (finished || !grew()) return;
+    if (reached()) { finish('target'); return; }
+    clearTimeout(idleTimer);
+    clearTimeout(settleTimer);
+    settleTimer = setTimeout(scrollDown, settleMs);
+});
+var deadlineTimer = setTimeout(function() { finish('deadline'); }, deadlineMs);
+
+if (reached()) {
+    finish('target');
+} else {
+    mutations.observe(document.body, {childList: true, subtree: true});
+    scrollDown();
+}
+"""
+
+# Пакетное скачивание фото внутри страницы
+IMAGE_CONCURRENCY = 6  # одновременных fetch внутри страницы
+IMAGE_BATCH_SIZE = 24  # URL-ов за один вызов execute_async_script
+IMAGE_TIMEOUT_MS = 10000  # таймаут на одну картинку
+IMAGE_BATCH_DEADLINE_MS = 30000  # жесткий предел на всю пачку
+
+# arguments: urls, concurrency, per-image timeout, deadline, callback.
+# Возвращает объект {url: dataURL | null}; по дедлайну отдает то, что успело скачаться.
+BATCH_FETCH_SCRIPT = """
+var urls = arguments[0];
+var limit = arguments[1];
+var timeoutMs = arguments[2];
+var deadlineMs = arguments[3];
+var callback = arguments[arguments.length - 1];
+var results = {};
+var next = 0;
+var finished = false;
+
+function finish() {
+    if (finished) return;
+    finished = true;
+    callback(results);
+}
+
+function toDataUrl(blob) {
+    return new Promise(function(resolve) {
+        var reader = new FileReader();
+        reader.onload = function() { resolve(reader.result); };
+        reader.onerror = function() { resolve(null); };
+        reader.readAsDataURL(blob);
+    });
+}
+
+function fetchOne(url) {
+    var ctrl = new AbortController();
+    var timer = setTimeout(function() { ctrl.abort(); }, timeoutMs);
+    return fetch(url, {signal: ctrl.signal})
+        .then(function(response) {
+            if (!response.ok) throw new Error(response.status);
+            return response.blob();
+        })
+        .then(toDataUrl)
+        .catch(function() { return null; })
+        .finally(function() { clearTimeout(timer); });
+}
+
+function worker() {
+    if (finished || next >= urls.length) return Promise.resolve();
+    var url = urls[next++];
+    return fetchOne(url).then(function(data) {
+        results[url] = data;
+        return worker();
+    });
+}
+
+setTimeout(finish, deadlineMs);
+var workers = [];
+for (var i = 0; i < Math.min(limit, urls.length); i++) workers.push(worker());
+Promise.all(workers).then(finish);
+"""
+
+
+class StreetBeatScraper(BaseScraper):
     """
     Парсер для сайта street-beat.ru.
     Использует стандартный Selenium + selenium-stealth.
     """
 
-    def __init__(self):
-        self.driver = self._get_driver()
+    SOURCE = "StreetBeat"
 
     def _get_driver(self):
         options = Options()
@@ -51,196 +253,229 @@ class StreetBeatScraper:
 
         return driver
 
-    def close(self):
-        if self.driver:
-            self.driver.quit()
-
-    def scrape(self, max_pages: int = 1) -> List[Dict]:
+    def fetch_catalog(self, max_pages: int = 1) -> Iterator[Dict]:
         """
-        Основной метод парсинга.
-        :param max_pages: Количество страниц для (пока скролл, но оставим параметр)
-        :return: Список словарей с данными о товарах
+        Каталог: товары из JSON листинга и размеры из DOM.
+        :param max_pages: Сколько подгрузок листинга (размером с первую) долистать
+        :return: Генератор словарей с данными о товарах
         """
         print(f"[StreetBeatScraper] Запуск парсинга: {STREETBEAT_URL}")
-        deals = []
+        self.incomplete = None
 
-        try:
-            self.driver.get(STREETBEAT_URL)
+        self.driver.get(shop_url(STREETBEAT_URL))
 
-            # Ждем загрузки первых карточек
+        # Ждем загрузки первых карточек
+        try:
+            WebDriverWait(self.driver, 15).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR))
+            )
+        except Exception:
+            print("[StreetBeatScraper] Тайм-аут ожидания карточек товаров.")
+            self.incomplete = "listing timed out"
+            return
+
+        # Прокрутка для ленивой загрузки (чтобы DOM с размерами отрендерился)
+        if self._load_listing(max_pages) is None:
+            self.incomplete = "listing scroll failed"
+
+        # Товары из JSON (надежно для Title, Image, Price) вместе с размерами
+        # из DOM (они есть в HTML, но нет в листинге JSON) — одним вызовом
+        listing = self._extract_listing()
+        json_items = listing["items"]
+        print(
+            f"[StreetBeatScraper] Найдено элементов в JSON: {len(json_items)}, "
+            f"карточек в DOM: {listing['cards']}"
+        )
+        self._report_coverage(json_items)
+
+        # 3. Объединяем данные
+        if not json_items:
+            print(
+                "[StreetBeatScraper] JSON пуст, переходим к DOM-only парсингу (резервный механизм)"
+            )
+            # Тут можно оставить старую логику или просто вернуть то что удалось собрать из DOM если бы мы собирали все
+            # Но лучше полагаться на JSON. Если его нет - сайт вероятно сильно изменился.
+            pass
+
+        for item in json_items:
             try:
-                WebDriverWait(self.driver, 15).until(
-                    EC.presence_of_element_located(
-                        (By.CSS_SELECTOR, "div.product-card")
-                    )
+                product_url = item.get("url", "")
+                sizes = item.get("sizes") or []
+
+                # Если размеров нет в мапе, возможно DOM не прогрузился или структура другая.
+                # Но пробуем добавить товар, если есть размеры?
+                # Требование: "приходят сообщения ... без размеров".
+                # Если размеров нет - скипаем, как и раньше.
+                if not sizes:
+                    ITEMS_FILTERED.inc(source=self.SOURCE)
+                    continue
+
+                title = make_title(item.get("name", ""))
+                price_num = item.get("unitSalePrice")
+                old_price_num = item.get("unitPrice")
+
+                price_text = (
+                    f"{int(price_num)}".replace(",", " ") + " ₽" if price_num else ""
                 )
+
+                # Show old price only if it's strictly greater than current price
+                if old_price_num and old_price_num > price_num:
+                    old_price_text = f"{int(old_price_num)}".replace(",", " ") + " ₽"
+                else:
+                    old_price_text = ""
+
+                # Скидка
+                discount = ""
+                if price_num and old_price_num and old_price_num > price_num:
+                    disc_percent = int(100 - (price_num / old_price_num * 100))
+                    discount = f"-{disc_percent}%"
+
+                image_url = item.get("imageUrl", "")
+
+                deal = {
+                    "title": title,
+                    "price": price_text,
+                    "old_price": old_price_text,
+                    "discount": discount,
+                    "link": product_url,
+                    "image_url": image_url,
+                    "sizes": sizes,
+                    "source": "StreetBeat",
+                }
+
+                yield deal
+
             except Exception:
-                print("[StreetBeatScraper] Тайм-аут ожидания карточек товаров.")
-                return []
+                # print(f"Error processing item: {e}")
+                continue
 
-            # Прокрутка для ленивой загрузки (чтобы DOM с размерами отрендерился)
-            for _ in range(3):
-                self.driver.execute_script("window.scrollBy(0, 1000);")
-                time.sleep(2)
+    def _load_listing(self, max_pages: int) -> Optional[Dict]:
+        """
+        Догружает листинг прокруткой одним вызовом execute_async_script
+        (см. SCROLL_LOADER_SCRIPT).
+        :return: итог догрузки (items, cards, target, scrolls, reason, ms)
+        """
+        try:
+            self.driver.set_script_timeout(SCROLL_DEADLINE_MS / 1000 + 5)
+            result = self.driver.execute_async_script(
+                SCROLL_LOADER_SCRIPT,
+                max_pages,
+                CARD_SELECTOR,
+                LISTING_REQUESTS,
+                SCROLL_IDLE_MS,
+                SCROLL_SETTLE_MS,
+                SCROLL_DEADLINE_MS,
+            )
+        except Exception as e:
+            print(f"[StreetBeatScraper] Ошибка прокрутки листинга: {e}")
+            return None
 
-            # 1. Извлекаем данные из JSON (надежно для Title, Image, Price)
-            try:
-                json_items = self.driver.execute_script(
-                    "return window.digitalData && window.digitalData.listing ? window.digitalData.listing.items : [];"
-                )
-                print(
-                    f"[StreetBeatScraper] Найдено элементов в JSON: {len(json_items)}"
+        record_wait("scroll", self.SOURCE, result["ms"] / 1000, SCROLL_BUDGET)
+        print(
+            f"[StreetBeatScraper] Листинг: {result['items']} в JSON, "
+            f"{result['cards']} карточек (цель {result['target']}), "
+            f"прокруток {result['scrolls']}, {result['ms'] / 1000:.1f} с, "
+            f"остановка: {result['reason']}"
+        )
+        return result
+
+    def _extract_listing(self) -> Dict:
+        """
+        Листинг JSON с размерами из карточек за один execute_script
+        (см. EXTRACT_LISTING_SCRIPT).
+        :return: {"items": товары digitalData с ключом sizes, "cards": число карточек}
+        """
+        try:
+            listing = self.driver.execute_script(
+                EXTRACT_LISTING_SCRIPT, CARD_SELECTOR, SIZE_LABEL_SELECTOR
+            )
+            if listing:
+                return listing
+        except Exception as e:
+            print(f"[StreetBeatScraper] Ошибка извлечения листинга: {e}")
+            self.incomplete = f"listing extraction failed: {e}"
+        return {"items": [], "cards": 0}
+
+    def _report_coverage(self, json_items: List[Dict]) -> float:
+        """Доля товаров JSON, для которых в DOM нашлись размеры."""
+        found = sum(1 for item in json_items if item.get("sizes"))
+        coverage = found / len(json_items) if json_items else 0.0
+        SIZE_COVERAGE.set(coverage, source=self.SOURCE)
+        print(
+            f"[StreetBeatScraper] Размеры найдены для {found}/{len(json_items)} "
+            f"товаров JSON ({coverage:.0%})"
+        )
+        return coverage
+
+    def enrich(self, items: List[Dict]) -> Iterator[Dict]:
+        """
+        Скачивает фото новых товаров браузером и отдает товары пачками
+        по IMAGE_BATCH_SIZE, не дожидаясь остальных фото.
+        Это нужно, так как обычные requests (process_image) блокируются (403 Forbidden)
+        """
+        downloaded = pending = 0
+        for start in range(0, len(items), IMAGE_BATCH_SIZE):
+            chunk = items[start : start + IMAGE_BATCH_SIZE]
+            pending_images = [
+                deal
+                for deal in chunk
+                if deal.get("image_url")
+                and not deal.get("image_bytes_b64")
+                and not deal_exists(deal["link"])
+            ]
+            if pending_images:
+                pending += len(pending_images)
+                images = self._download_images(
+                    [deal["image_url"] for deal in pending_images]
                 )
-            except Exception as e:
-                print(f"[StreetBeatScraper] Ошибка извлечения JSON: {e}")
-                json_items = []
+                for deal in pending_images:
+                    b64_data = images.get(deal["image_url"])
+                    if b64_data:
+                        deal["image_bytes_b64"] = b64_data
+                        downloaded += 1
+            yield from chunk
+
+        if pending:
+            print(f"[StreetBeatScraper] Скачано фото: {downloaded}/{pending}")
 
-            # 2. Извлекаем размеры из DOM (они есть в HTML, но нет в листинге JSON)
-            # Создаем карту url -> sizes
-            dom_sizes_map = {}
+    def _download_images(self, urls: List[str]) -> Dict[str, str]:
+        """
+        Скачивает картинки внутри страницы (с куками и заголовками браузера).
+        URL-ы отправляются пачками по IMAGE_BATCH_SIZE: внутри пачки fetch идут
+        параллельно (не больше IMAGE_CONCURRENCY одновременно), а результат
+        возвращается одним ответом execute_async_script.
+        :return: словарь url -> base64 (без префикса data:)
+        """
+        results = {}
+        unique_urls = list(dict.fromkeys(u for u in urls if u))
+
+        for start in range(0, len(unique_urls), IMAGE_BATCH_SIZE):
+            chunk = unique_urls[start : start + IMAGE_BATCH_SIZE]
+            # Верхняя граница времени на пачку: волны по IMAGE_CONCURRENCY запросов
+            waves = -(-len(chunk) // IMAGE_CONCURRENCY)
+            deadline_ms = min(waves * IMAGE_TIMEOUT_MS, IMAGE_BATCH_DEADLINE_MS)
             try:
-                cards = self.driver.find_elements(By.CSS_SELECTOR, "div.product-card")
-                print(f"[StreetBeatScraper] Найдено карточек в DOM: {len(cards)}")
-
-                for card in cards:
-                    try:
-                        # Ссылка для связывания
-                        info_el = card.find_element(
-                            By.CSS_SELECTOR, ".product-card__info"
-                        )
-                        link_href = info_el.get_attribute("href")
-
-                        # Размеры
-                        sizes = []
-                        size_labels = card.find_elements(
-                            By.CSS_SELECTOR, ".block-hover__product-size .radio__label"
-                        )
-                        sizes = [
-                            lbl.get_attribute("textContent").strip()
-                            for lbl in size_labels
-                        ]
-                        sizes = [s for s in sizes if s]
-
-                        if link_href:
-                            # Нормализуем ссылку для ключа (убираем домен если есть)
-                            # href обычно абсолютный или относительный, приведем к относительному
-                            rel_link = link_href.replace("https://street-beat.ru", "")
-                            dom_sizes_map[rel_link] = sizes
-
-                    except Exception:
-                        continue
+                self.driver.set_script_timeout(deadline_ms / 1000 + 5)
+                data = self.driver.execute_async_script(
+                    BATCH_FETCH_SCRIPT,
+                    chunk,
+                    IMAGE_CONCURRENCY,
+                    IMAGE_TIMEOUT_MS,
+                    deadline_ms,
+                )
             except Exception as e:
-                print(f"[StreetBeatScraper] Ошибка парсинга DOM размеров: {e}")
+                print(f"[StreetBeatScraper] Ошибка пакетного скачивания фото: {e}")
+                continue
 
-            # 3. Объединяем данные
-            if not json_items:
-                print(
-                    "[StreetBeatScraper] JSON пуст, переходим к DOM-only парсингу (резервный механизм)"
-                )
-                # Тут можно оставить старую логику или просто вернуть то что удалось собрать из DOM если бы мы собирали все
-                # Но лучше полагаться на JSON. Если его нет - сайт вероятно сильно изменился.
-                pass
-
-            for item in json_items:
-                try:
-                    product_url = item.get("url", "")
-                    # Нормализация для поиска в map
-                    rel_url = product_url.replace("https://street-beat.ru", "")
-
-                    sizes = dom_sizes_map.get(rel_url, [])
-
-                    # Если размеров нет в мапе, возможно DOM не прогрузился или структура другая.
-                    # Но пробуем добавить товар, если есть размеры?
-                    # Требование: "приходят сообщения ... без размеров".
-                    # Если размеров нет - скипаем, как и раньше.
-                    if not sizes:
-                        continue
-
-                    title = item.get("name", "")
-                    price_num = item.get("unitSalePrice")
-                    old_price_num = item.get("unitPrice")
-
-                    price_text = (
-                        f"{int(price_num)}".replace(",", " ") + " ₽"
-                        if price_num
-                        else ""
-                    )
-
-                    # Show old price only if it's strictly greater than current price
-                    if old_price_num and old_price_num > price_num:
-                        old_price_text = (
-                            f"{int(old_price_num)}".replace(",", " ") + " ₽"
-                        )
-                    else:
-                        old_price_text = ""
-
-                    # Скидка
-                    discount = ""
-                    if price_num and old_price_num and old_price_num > price_num:
-                        disc_percent = int(100 - (price_num / old_price_num * 100))
-                        discount = f"-{disc_percent}%"
-
-                    image_url = item.get("imageUrl", "")
-
-                    deal = {
-                        "title": title,
-                        "price": price_text,
-                        "old_price": old_price_text,
-                        "discount": discount,
-                        "link": product_url,
-                        "image_url": image_url,
-                        "sizes": sizes,
-                        "source": "StreetBeat",
-                    }
-
-                    # Проверяем, новый ли это товар, и если да — скачиваем фото браузером
-                    # Это нужно, так как обычные requests (process_image) блокируются (403 Forbidden)
-                    if not deal_exists(product_url):
-                        if image_url:
-                            try:
-                                script = """
-                                var url = arguments[0];
-                                var callback = arguments[1];
-                                fetch(url)
-                                    .then(response => response.blob())
-                                    .then(blob => {
-                                        var reader = new FileReader();
-                                        reader.onload = function() {
-                                            callback(reader.result);
-                                        };
-                                        reader.readAsDataURL(blob);
-                                    })
-                                    .catch(err => callback(null));
-                                """
-                                # execute_async_script allows passing a callback
-                                b64_data = self.driver.execute_async_script(
-                                    script, image_url
-                                )
-                                if b64_data:
-                                    # Remove header if present
-                                    if "," in b64_data:
-                                        _, b64_data = b64_data.split(",", 1)
-                                    deal["image_bytes_b64"] = b64_data
-                                    print(
-                                        f"[StreetBeatScraper] Скачано фото для {title}"
-                                    )
-                            except Exception as e:
-                                print(
-                                    f"[StreetBeatScraper] Ошибка скачивания фото JS: {e}"
-                                )
-
-                    deals.append(deal)
-
-                except Exception:
-                    # print(f"Error processing item: {e}")
+            for url, data_url in (data or {}).items():
+                if not data_url:
                     continue
+                # Убираем заголовок data:image/...;base64,
+                if "," in data_url:
+                    _, data_url = data_url.split(",", 1)
+                results[url] = data_url
 
-        except Exception as e:
-            print(f"[StreetBeatScraper] Критическая ошибка: {e}")
-        finally:
-            self.close()
-
-        return deals
+        return results
 
     def _parse_card(self, card) -> Optional[Dict]:
         """Устаревший метод, оставлен для совместимости или если понадобится вернуть DOM парсинг."""
@@ -249,8 +484,13 @@ class StreetBeatScraper:
 
 def get_streetbeat_discounts(max_pages=1):
     """Обертка для вызова парсера."""
-    scraper = StreetBeatScraper()
-    return scraper.scrape(max_pages)
+    scraper = None
+    try:
+        scraper = StreetBeatScraper()
+        return scraper.scrape(max_pages)
+    finally:
+        if scraper:
+            scraper.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from affiliate_manager import AffiliateManager
+from affiliate_manager import AffiliateManager, quote_url
 import urllib.parse
 
 
@@ -47,5 +47,46 @@ def test_affiliate_manager():
     print("\nSUCCESS: AffiliateManager logic works correctly.")
 
 
+def test_affiliate_templates():
+    print("Testing subid/UTM templates...")
+
+    manager = AffiliateManager(
+        networks={
+            "ShopA": {
+                "type": "admitad",
+                "base_url": "https://ad.admitad.com/g/123/?ulp=",
+                "subid": "tg_{channel}",
+                "utm": {"utm_source": "telegram"},
+            },
+            "ShopB": {"type": "custom", "base_url": "https://mysite.com/r?to="},
+        }
+    )
+
+    url = "https://shop-a.com/product/123?color=red"
+    expected_target = urllib.parse.quote(f"{url}&utm_source=telegram")
+    res = manager.convert_link(url, "ShopA", channel="@sneakers")
+    print(f"[ShopA] Result:   {res}")
+    assert res == (
+        f"https://ad.admitad.com/g/123/?ulp={expected_target}&subid=tg_%40sneakers"
+    )
+
+    links = [(url, "ShopA"), (url, "ShopB"), (url, "Unknown"), (url, "ShopA")]
+    results = manager.convert_many(links)
+    assert results[0].endswith("&subid=tg_dm")
+    assert results[1] == f"https://mysite.com/r?to={urllib.parse.quote(url)}"
+    assert results[2] == url
+    assert results[3] == results[0]
+    assert manager.cache_info().hits == 1, "Repeated link is served from cache"
+
+    # Быстрое кодирование совпадает с urllib.parse.quote
+    for sample in [
+        url,
+        "https://lamoda.ru/p/кеды/?a=1 2",
+        "".join(map(chr, range(128))),
+    ]:
+        assert quote_url(sample) == urllib.parse.quote(sample)
+
+
 if __name__ == "__main__":
     test_affiliate_manager()
+    test_affiliate_templates()
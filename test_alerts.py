@@ -0,0 +1,110 @@
+import random
+import time
+
+from alerts import AlertIndex, parse_alert_args
+
+
+def make_alert(alert_id, chat_id, **fields):
+    alert = {"brand": None, "sizes": None, "max_price": None, "min_discount": None}
+    alert.update(fields, id=alert_id, chat_id=chat_id)
+    return alert
+
+
+def test_parse_alert_args():
+    print("Testing parse_alert_args...")
+
+    alert = parse_alert_args("brand=New Balance size=42,42.5 price=15000 discount=30%")
+    assert alert == {
+        "brand": "new balance",
+        "sizes": "42,42.5",
+        "max_price": 15000,
+        "min_discount": 30,
+    }
+    assert parse_alert_args("size=43")["sizes"] == "43"
+
+    for bad in ("", "color=red", "size=big"):
+        try:
+            parse_alert_args(bad)
+            raise AssertionError(f"ValueError expected for {bad!r}")
+        except ValueError:
+            pass
+
+    for bad, message in (
+        ("price=15k", "Не понял цену: 15k"),
+        ("discount=много", "Не понял скидку: много"),
+    ):
+        try:
+            parse_alert_args(bad)
+            raise AssertionError(f"ValueError expected for {bad!r}")
+        except ValueError as e:
+            assert str(e) == message, str(e)
+
+
+def test_alert_matching():
+    print("Testing AlertIndex.match...")
+
+    index = AlertIndex()
+    index.load(
+        [
+            make_alert(1, 100, brand="nike", sizes="42,43"),
+            make_alert(2, 200, brand="new balance"),
+            make_alert(3, 300, sizes="44", max_price=10000),
+            make_alert(4, 400, min_discount=50),
+            make_alert(5, 100, brand="nike"),
+        ]
+    )
+
+    deal = {
+        "title": "Nike Air Max 90",
+        "price": "8 990 ₽",
+        "old_price": "14 990 ₽",
+        "sizes": ["EU 42", "EU 44"],
+    }
+    assert sorted(a["id"] for a in index.match(deal)) == [1, 3, 5]
+    chats = index.match_chats(deal)
+    assert sorted(chats) == [100, 300], "Chat 100 must be notified once"
+
+    nb = dict(deal, title="New Balance 550", price="4 990 ₽")
+    assert sorted(a["id"] for a in index.match(nb)) == [2, 3, 4]
+
+    index.remove(3)
+    assert sorted(a["id"] for a in index.match(nb)) == [2, 4]
+
+
+def test_alert_index_scales():
+    print("Testing AlertIndex on 50k rules...")
+
+    rng = random.Random(1)
+    brands = ["nike", "adidas", "puma", "new balance", "asics", "vans", "reebok"]
+    index = AlertIndex()
+    for i in range(50_000):
+        index.add(
+            make_alert(
+                i,
+                i,
+                brand=rng.choice(brands),
+                sizes=str(rng.choice(range(38, 48))),
+                max_price=rng.choice([None, 10000, 20000]),
+            )
+        )
+
+    deal = {
+        "title": "Adidas Samba OG",
+        "price": "9 990 ₽",
+        "old_price": "12 990 ₽",
+        "sizes": "41,42",
+    }
+    started = time.perf_counter()
+    for _ in range(100):
+        matched = index.match(deal)
+    per_deal = (time.perf_counter() - started) / 100
+    print(f"{len(matched)} matches, {per_deal * 1000:.2f} ms per deal")
+    assert matched and all(a["brand"] == "adidas" for a in matched)
+    assert per_deal < 0.05
+
+
+if __name__ == "__main__":
+    test_parse_alert_args()
+    test_alert_matching()
+    test_alert_index_scales()
+    print("\nSUCCESS: alerts work correctly.")
@@ -0,0 +1,198 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+)
+from aiogram.methods import SendPhoto
+
+import database
+from broadcast import (
+    BUTTONS_SUFFIX,
+    album_key,
+    album_links,
+    alert_key,
+    broadcast_album,
+    broadcast_post,
+)
+from rate_limiter import RateLimiter
+from test_helpers import temp_db
+
+
+class FakeBot:
+    """Запоминает вызовы вместо обращения к Telegram."""
+
+    def __init__(self, blocked=(), broken=(), missing=()):
+        self.calls = []
+        self.blocked = set(blocked)
+        self.broken = set(broken)
+        self.missing = set(missing)
+        self.markups = {}
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.calls.append((chat_id, photo))
+        self.markups[chat_id] = kwargs.get("reply_markup")
+        method = SendPhoto(chat_id=chat_id, photo="x")
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, "Forbidden: bot was blocked")
+        if chat_id in self.broken:
+            raise TelegramNetworkError(method, "Connection reset")
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{chat_id}")])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append((chat_id, "text"))
+        method = SendPhoto(chat_id=chat_id, photo="x")
+        if chat_id in self.broken:
+            raise TelegramNetworkError(method, "Connection reset")
+        if chat_id in self.missing:
+            raise TelegramBadRequest(method, "chat not found")
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append((chat_id, [m.media for m in media]))
+        return [
+            SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{chat_id}-{i}")])
+            for i in range(len(media))
+        ]
+
+
+def test_broadcast_fan_out():
+    print("Testing broadcast_post...")
+
+    with temp_db():
+        database.add_subscriber("@channel", kind="channel")
+        for chat_id in range(1, 31):
+            database.add_subscriber(chat_id)
+
+        recipients = database.get_recipients()
+        assert recipients[0] == "@channel", "Channels go first"
+        assert len(recipients) == 31
+
+        post = {
+            "caption": "<b>Nike</b>",
+            "keyboard": None,
+            "photo_bytes": b"jpeg",
+            "image_url": "https://example.com/a.jpg",
+        }
+        bot = FakeBot(blocked={5}, broken={7})
+        limiter = RateLimiter(global_rate=1000, private_rate=1000, max_attempts=1)
+
+        ok = asyncio.run(broadcast_post(bot, limiter, post, recipients, "link-1"))
+        assert ok, "Post reached the channel, chat 7 is retried later"
+        failed = database.get_failed_deliveries(max_attempts=3)
+        assert failed == {"link-1": [7]}
+
+        uploads = [photo for _, photo in bot.calls if not isinstance(photo, str)]
+        assert len(uploads) == 1, "Photo must be uploaded only once"
+        assert all(
+            photo == "file-@channel"
+            for chat_id, photo in bot.calls
+            if chat_id != "@channel"
+        ), "Other recipients reuse file_id"
+
+        # Заблокировавший бота пользователь больше не получает рассылку
+        assert 5 not in database.get_recipients()
+
+        # Повторная рассылка отправляет только тем, кому не дошло
+        bot = FakeBot()
+        ok = asyncio.run(broadcast_post(bot, limiter, post, recipients, "link-1"))
+        assert ok
+        assert [chat_id for chat_id, _ in bot.calls] == [7]
+        assert database.get_failed_deliveries(max_attempts=3) == {}
+
+        # Не дошло ни до кого — рассылка не удалась; чат, которого нет,
+        # больше не пробуем, а сетевую ошибку — до max_attempts раз
+        text_post = dict(post, photo_bytes=None, image_url=None)
+        bot = FakeBot(broken={"@channel"}, missing={3})
+        ok = asyncio.run(
+            broadcast_post(bot, limiter, text_post, ["@channel", 3], "link-2")
+        )
+        assert not ok
+        failed = database.get_failed_deliveries(max_attempts=3)
+        assert failed == {"link-2": ["@channel"]}
+        assert database.get_failed_deliveries(max_attempts=1) == {}
+
+        # Пост, полученный другим чатом, не считается доставленным в канал
+        bot = FakeBot(broken={"@channel"})
+        asyncio.run(broadcast_post(bot, limiter, text_post, [999], "link-4"))
+        ok = asyncio.run(
+            broadcast_post(bot, limiter, text_post, ["@channel"], "link-4")
+        )
+        assert not ok
+        assert alert_key("link-4") == "alert:link-4"
+
+        # Уведомления из очереди скрапера рассылает публикатор
+        database.queue_deliveries(alert_key("link-5"), [1, 2])
+        database.queue_deliveries(alert_key("link-5"), [2])  # без дублей
+        queued = database.get_queued_deliveries()
+        assert queued == {"alert:link-5": [1, 2]}
+        bot = FakeBot()
+        ok = asyncio.run(
+            broadcast_post(bot, limiter, text_post, [1, 2], "alert:link-5")
+        )
+        assert ok and sorted(chat_id for chat_id, _ in bot.calls) == [1, 2]
+        assert database.get_queued_deliveries() == {}
+
+        # Канал со своей партнерской ссылкой получает свою кнопку
+        tracked = dict(
+            post,
+            keyboard="shared",
+            channel_keyboards={"@channel": "channel"},
+        )
+        bot = FakeBot()
+        asyncio.run(broadcast_post(bot, limiter, tracked, ["@channel", 1], "link-3"))
+        assert bot.markups == {"@channel": "channel", 1: "shared"}
+
+
+def test_broadcast_album():
+    print("Testing broadcast_album...")
+
+    with temp_db():
+        posts = [
+            {
+                "caption": f"Deal {i}",
+                "photo_bytes": b"jpeg" if i == 1 else None,
+                "image_url": f"https://example.com/{i}.jpg",
+                "title": f"Nike {i}",
+                "url": f"https://shop/{i}",
+            }
+            for i in range(1, 4)
+        ]
+        bot = FakeBot()
+        limiter = RateLimiter(global_rate=1000, private_rate=1000)
+
+        ok = asyncio.run(
+            broadcast_album(bot, limiter, posts, ["@channel", 1, 2], "album:1")
+        )
+        assert ok
+
+        albums = [(chat_id, media) for chat_id, media in bot.calls if media != "text"]
+        buttons = [chat_id for chat_id, media in bot.calls if media == "text"]
+        assert len(albums) == 3 and buttons == ["@channel", 1, 2]
+        # Первому каналу — файл и URL, остальным — file_id из ответа
+        assert albums[0][1][1] == "https://example.com/2.jpg"
+        assert albums[1][1] == [
+            "file-@channel-0",
+            "file-@channel-1",
+            "file-@channel-2",
+        ]
+
+        # Кнопки не дошли — альбом не повторяется, досылаются только кнопки
+        bot = FakeBot(broken={2})
+        limiter = RateLimiter(global_rate=1000, private_rate=1000, max_attempts=1)
+        key = album_key(["https://shop/1", "https://shop/2", "https://shop/3"])
+        assert album_links(key + BUTTONS_SUFFIX)[2] == "https://shop/3"
+        assert asyncio.run(broadcast_album(bot, limiter, posts, [1, 2], key))
+        failed = database.get_failed_deliveries(max_attempts=3)
+        assert failed == {key + BUTTONS_SUFFIX: [2]}
+
+        bot = FakeBot()
+        asyncio.run(broadcast_album(bot, limiter, posts, [2], key))
+        assert bot.calls == [(2, "text")]
+
+
+if __name__ == "__main__":
+    test_broadcast_fan_out()
+    test_broadcast_album()
+    print("\nSUCCESS: broadcast works correctly.")
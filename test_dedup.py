@@ -0,0 +1,96 @@
+import datetime
+
+from PIL import Image, ImageDraw
+
+from database import DEAL_PENDING, DEAL_SENT
+from dedup import ProductIndex, choose_best_offer, dhash, hamming
+
+
+def make_sneaker_image(offset=0, size=(400, 300), background=(255, 255, 255)):
+    """Простая синтетическая «картинка товара»."""
+    img = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((60 + offset, 120, 340 + offset, 220), fill=(20, 20, 20))
+    draw.rectangle((120 + offset, 80, 220 + offset, 150), fill=(200, 30, 30))
+    return img
+
+
+def test_dhash_similar_images():
+    print("Testing dhash...")
+
+    base = dhash(make_sneaker_image())
+    # Та же картинка в другом разрешении (как у разных магазинов)
+    resized = dhash(make_sneaker_image().resize((800, 600)))
+    flipped = dhash(make_sneaker_image().transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+
+    print(f"resized distance: {hamming(base, resized)}")
+    print(f"flipped distance: {hamming(base, flipped)}")
+    assert hamming(base, resized) <= 3, "Resized image should have close hash"
+    assert hamming(base, flipped) > 10, "Different image should have far hash"
+
+
+def test_product_index_clusters():
+    print("Testing ProductIndex...")
+
+    index = ProductIndex()
+    phash = 0x0F0F_F0F0_1234_ABCD
+
+    c1 = index.assign("https://brandshop.ru/a", phash, "Nike Air Force 1 '07")
+    assert c1 == "https://brandshop.ru/a", "First product opens its own cluster"
+
+    # Отличается на 2 бита, название почти то же
+    c2 = index.assign(
+        "https://lamoda.ru/b", phash ^ 0b101, "Кроссовки мужские Nike Air Force 1 07"
+    )
+    assert c2 == c1, "Same product from another shop should join the cluster"
+
+    # Похожая картинка, но другое название
+    c3 = index.assign("https://street-beat.ru/c", phash ^ 0b1, "Adidas Samba OG")
+    assert c3 == "https://street-beat.ru/c", "Different title must not be merged"
+
+    # Название то же, но картинка далеко
+    c4 = index.assign(
+        "https://street-beat.ru/d", ~phash & (2**64 - 1), "Nike Air Force 1"
+    )
+    assert c4 == "https://street-beat.ru/d", "Different image must not be merged"
+
+    assert len(index) == 4
+    index.remove("https://lamoda.ru/b")
+    assert len(index) == 3
+    assert "https://lamoda.ru/b" not in index.candidates(phash ^ 0b101)
+
+
+def test_choose_best_offer():
+    print("Testing choose_best_offer...")
+
+    now = datetime.datetime.now()
+    week_ago = now - datetime.timedelta(days=7)
+    cluster = [
+        {"link": "a", "price": "12 990 ₽", "sent": DEAL_PENDING, "last_seen": now},
+        {"link": "b", "price": "10 490 ₽", "sent": DEAL_PENDING, "last_seen": now},
+        {"link": "c", "price": "11 000 ₽", "sent": DEAL_PENDING, "last_seen": now},
+    ]
+
+    best, skipped = choose_best_offer(cluster, week_ago)
+    assert best["link"] == "b", "Cheapest offer should win"
+    assert sorted(skipped) == ["a", "c"]
+
+    # Уже опубликовано дешевле и все еще продается -> ничего не публикуем
+    cluster.append(
+        {"link": "d", "price": "9 990 ₽", "sent": DEAL_SENT, "last_seen": now}
+    )
+    best, skipped = choose_best_offer(cluster, week_ago)
+    assert best is None
+    assert sorted(skipped) == ["a", "b", "c"]
+
+    # Старую публикацию не учитываем
+    cluster[-1]["last_seen"] = now - datetime.timedelta(days=30)
+    best, _ = choose_best_offer(cluster, week_ago)
+    assert best["link"] == "b"
+
+
+if __name__ == "__main__":
+    test_dhash_similar_images()
+    test_product_index_clusters()
+    test_choose_best_offer()
+    print("\nSUCCESS: dedup logic works correctly.")
@@ -0,0 +1,119 @@
+import json
+import tempfile
+import urllib.error
+import urllib.request
+
+import fixtures
+from fixtures import FixtureRecorder, FixtureServer, RecordingDriver, shop_url
+
+CATALOG_URL = "https://shop.test/sale/?page=2"
+
+CATALOG_HTML = """<html><head>
+<script src="https://cdn.shop.test/app.js"></script>
+<link rel="stylesheet" href="https://cdn.shop.test/app.css">
+<script>window.__NUXT__ = (function(a){return {items: [a]}})("live")</script>
+</head><body>
+<div class="product-card"><a href="/p/1/">Nike Air Max</a>
+<img src="//img.shop.test/1.jpg"></div>
+</body></html>"""
+
+
+class FakeDriver:
+    """Браузер, который «открывает» страницы из словаря."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.current = None
+        self.quit_called = False
+
+    def get(self, url):
+        self.current = url
+
+    @property
+    def page_source(self):
+        return self.pages[self.current]
+
+    def execute_script(self, script):
+        assert "__NUXT__" in script
+        state = {"items": ["Nike Air Max </script>"]}
+        return json.dumps({"__NUXT__": state, "digitalData": None})
+
+    def quit(self):
+        self.quit_called = True
+
+
+def fetch(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def test_record_and_replay():
+    print("Testing fixtures record/replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = FixtureRecorder(f"{tmp}/shop")
+        driver = RecordingDriver(
+            FakeDriver(
+                {CATALOG_URL: CATALOG_HTML, "https://shop.test/p/1/": "<p>42</p>"}
+            ),
+            recorder,
+        )
+        driver.get(CATALOG_URL)
+        driver.get("https://shop.test/p/1/")
+        driver.quit()
+        recorder.add("https://img.shop.test/1.jpg", b"JPEG", "image/jpeg")
+        recorder.save()
+        assert driver.quit_called
+        assert set(recorder.manifest) == {
+            CATALOG_URL,
+            "https://shop.test/p/1/",
+            "https://img.shop.test/1.jpg",
+        }
+
+        with FixtureServer(tmp) as server:
+            old_replay = fixtures.REPLAY_URL
+            fixtures.REPLAY_URL = server.url
+            try:
+                url = shop_url(CATALOG_URL)
+                assert url == f"{server.url}/shop.test/sale/?page=2"
+                assert shop_url(url) == url
+            finally:
+                fixtures.REPLAY_URL = old_replay
+
+            html = fetch(url).decode("utf-8")
+            # Внешние скрипты и стили убраны, состояние страницы вставлено
+            assert "app.js" not in html and "app.css" not in html
+            assert '"live"' not in html
+            assert "window.__NUXT__" in html and "<\\/script>" in html
+            assert "digitalData" not in html
+            # Ссылки на записанные хосты ведут на локальный сервер
+            assert f'src="{server.url}/img.shop.test/1.jpg"' in html
+
+            assert fetch(f"{server.url}/img.shop.test/1.jpg") == b"JPEG"
+            # Относительная ссылка со страницы (href="/p/1/") без хоста
+            product = fetch(f"{server.url}/p/1/")
+            assert product.endswith(b"<p>42</p>")
+
+            try:
+                fetch(f"{server.url}/shop.test/missing/")
+                assert False, "Unknown URL is 404"
+            except urllib.error.HTTPError as e:
+                assert e.code == 404
+
+            requests, sent = server.totals()
+            assert requests == 4
+            assert sent == len(html.encode("utf-8")) + len(b"JPEG") + len(product)
+
+
+def test_shop_url_without_replay():
+    old_replay = fixtures.REPLAY_URL
+    fixtures.REPLAY_URL = ""
+    try:
+        assert shop_url(CATALOG_URL) == CATALOG_URL
+    finally:
+        fixtures.REPLAY_URL = old_replay
+
+
+if __name__ == "__main__":
+    test_record_and_replay()
+    test_shop_url_without_replay()
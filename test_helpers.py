@@ -0,0 +1,25 @@
+"""Общие заготовки для тестов."""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import database
+
+
+@contextmanager
+def temp_db(init=True):
+    """
+    Подменяет database.DB_NAME на БД во временной папке и возвращает ее путь.
+    По выходу исходное имя БД восстанавливается.
+    :param init: Сразу создать таблицы (init_db)
+    """
+    old_db = database.DB_NAME
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "deals.db")
+        try:
+            if init:
+                database.init_db()
+            yield database.DB_NAME
+        finally:
+            database.DB_NAME = old_db
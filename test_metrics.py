@@ -0,0 +1,104 @@
+import asyncio
+
+import aiohttp
+
+import metrics
+from metrics import Counter, Gauge, Histogram, render, start_server, timed
+
+
+def test_disabled_metrics_are_noop():
+    print("Testing disabled metrics...")
+    old_enabled = metrics.ENABLED
+    metrics.ENABLED = False
+    try:
+        registry = []
+        counter = Counter("test_disabled_total", "Test", ("source",), registry)
+        counter.inc(source="Lamoda")
+        histogram = Histogram("test_disabled_seconds", "Test", registry=registry)
+        with histogram.time():
+            pass
+
+        def func():
+            return 42
+
+        # Без метрик функция не оборачивается
+        assert timed("stage")(func) is func
+        assert "test_disabled_total{" not in render(registry)
+        assert "test_disabled_seconds_count" not in render(registry)
+    finally:
+        metrics.ENABLED = old_enabled
+
+
+def test_render():
+    print("Testing metrics rendering...")
+    old_enabled = metrics.ENABLED
+    metrics.ENABLED = True
+    try:
+        registry = []
+        counter = Counter("test_items_total", "Items", ("source",), registry)
+        counter.inc(source="Lamoda")
+        counter.inc(2, source="Lamoda")
+        counter.inc(source='Street"Beat')
+
+        gauge = Gauge("test_queue_depth", "Queue", registry=registry)
+        gauge.set_function(lambda: 7)
+
+        histogram = Histogram(
+            "test_stage_seconds", "Stages", ("stage",), registry, buckets=(0.1, 1)
+        )
+        histogram.observe(0.05, stage="render")
+        histogram.observe(0.5, stage="render")
+        histogram.observe(5, stage="render")
+
+        text = render(registry)
+        print(text)
+        assert "# TYPE test_items_total counter" in text
+        assert 'test_items_total{source="Lamoda"} 3' in text
+        assert 'test_items_total{source="Street\\"Beat"} 1' in text
+        assert "test_queue_depth 7" in text
+        assert 'test_stage_seconds_bucket{stage="render",le="0.1"} 1' in text
+        assert 'test_stage_seconds_bucket{stage="render",le="1"} 2' in text
+        assert 'test_stage_seconds_bucket{stage="render",le="+Inf"} 3' in text
+        assert 'test_stage_seconds_count{stage="render"} 3' in text
+        assert 'test_stage_seconds_sum{stage="render"} 5.55' in text
+    finally:
+        metrics.ENABLED = old_enabled
+
+
+def test_timed_and_server():
+    print("Testing timed() and /metrics endpoint...")
+    old_enabled = metrics.ENABLED
+    metrics.ENABLED = True
+    try:
+
+        @timed("test_async_stage")
+        async def send():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        async def run():
+            assert await send() == "ok"
+            runner = await start_server("127.0.0.1", 0)
+            try:
+                port = runner.addresses[0][1]
+                async with aiohttp.ClientSession() as session:
+                    url = f"http://127.0.0.1:{port}/metrics"
+                    async with session.get(url) as response:
+                        assert response.status == 200
+                        return await response.text()
+            finally:
+                await runner.cleanup()
+
+        text = asyncio.run(run())
+        assert (
+            'sneaker_stage_seconds_count{stage="test_async_stage",source=""} 1' in text
+        )
+        assert "# TYPE sneaker_browser_rss_bytes gauge" in text
+    finally:
+        metrics.ENABLED = old_enabled
+
+
+if __name__ == "__main__":
+    test_disabled_metrics_are_noop()
+    test_render()
+    test_timed_and_server()
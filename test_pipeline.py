@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import database
+from pipeline import merge, micro_batches
+from scraper_registry import stream_scraper
+from test_helpers import temp_db
+
+
+async def slow_stream(name, count, delay):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield f"{name}{i}"
+
+
+def test_micro_batches():
+    print("Testing micro_batches...")
+
+    async def collect(stream, **kwargs):
+        started = time.monotonic()
+        result = []
+        async for batch in micro_batches(stream, **kwargs):
+            result.append((list(batch), time.monotonic() - started))
+        return result
+
+    # По размеру: 7 элементов пачками по 3
+    batches = asyncio.run(collect(slow_stream("a", 7, 0), max_items=3, max_delay=10))
+    assert [len(b) for b, _ in batches] == [3, 3, 1]
+
+    # По времени: элемент раз в 0.05 с, пачка не ждет дольше 0.12 с
+    batches = asyncio.run(
+        collect(slow_stream("b", 6, 0.05), max_items=100, max_delay=0.12)
+    )
+    print([(b, round(t, 2)) for b, t in batches])
+    assert len(batches) >= 2, "Slow stream is flushed by time"
+    assert batches[0][1] < 0.3, "First batch arrives before the stream ends"
+    assert sum(len(b) for b, _ in batches) == 6
+
+
+def test_merge_streams():
+    print("Testing merge...")
+
+    async def collect():
+        return [
+            item
+            async for item in merge(
+                [slow_stream("x", 3, 0.02), slow_stream("y", 2, 0.01)]
+            )
+        ]
+
+    items = asyncio.run(collect())
+    assert sorted(items) == ["x0", "x1", "x2", "y0", "y1"]
+    assert items.index("y0") < items.index("x2"), "Streams are interleaved"
+
+
+class CrashingScraper:
+    """Отдает две скидки и падает — уже отданные должны сохраниться."""
+
+    source = "CrashShop"
+
+    async def fetch_catalog(self):
+        for i in range(2):
+            yield {
+                "title": f"Nike {i}",
+                "price": "1 000 ₽",
+                "old_price": "2 000 ₽",
+                "link": f"https://crash.shop/{i}",
+                "source": self.source,
+            }
+        raise RuntimeError("browser died")
+
+    async def enrich(self, items):
+        for item in items:
+            yield item
+
+    async def close(self):
+        pass
+
+
+def test_partial_progress_survives_failure():
+    print("Testing partial progress...")
+
+    with temp_db():
+
+        async def run():
+            saved = []
+            try:
+                stream = stream_scraper(CrashingScraper(), enrich_batch=1)
+                async for batch in micro_batches(stream, max_items=1):
+                    saved += database.save_deals(batch)[0]
+            except RuntimeError:
+                pass
+            return saved
+
+        saved = asyncio.run(run())
+        assert saved == ["https://crash.shop/0", "https://crash.shop/1"]
+        assert database.deal_exists("https://crash.shop/1")
+
+        # Повторное сохранение: скидки уже известны и не изменились
+        deal = database.get_deal("https://crash.shop/0")
+        assert database.save_deals([deal]) == ([], [])
+
+        # Новая цена — скидка считается изменившейся
+        deal["price"] = "900 ₽"
+        assert database.save_deals([deal]) == ([], ["https://crash.shop/0"])
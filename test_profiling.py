@@ -0,0 +1,99 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import profiling
+from profiling import profile, rotate
+
+
+def busy_worker(stop):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def test_sample_profile():
+    print("Testing sampling profiler...")
+    old_enabled = set(profiling.ENABLED)
+    old_mode = profiling.MODE
+    try:
+        profiling.disable()
+        profiling.enable(["scan"], "sample")
+        with tempfile.TemporaryDirectory() as tmp:
+            # Выключенный цикл не профилируется
+            with profile("publish", tmp):
+                pass
+            assert os.listdir(tmp) == []
+
+            stop = threading.Event()
+            worker = threading.Thread(target=busy_worker, args=(stop,), name="worker")
+            worker.start()
+            try:
+                with profile("scan", tmp):
+                    time.sleep(0.2)
+            finally:
+                stop.set()
+                worker.join()
+
+            names = sorted(os.listdir(tmp))
+            assert [os.path.splitext(n)[1] for n in names] == [".folded", ".txt"]
+            with open(os.path.join(tmp, names[0]), encoding="utf-8") as f:
+                folded = f.read().splitlines()
+            # Видны стеки и основного потока, и рабочего
+            assert any(line.startswith("worker;") for line in folded)
+            assert any("test_sample_profile (test_profiling.py:" in l for l in folded)
+            assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+            with open(os.path.join(tmp, names[1]), encoding="utf-8") as f:
+                assert "busy_worker (test_profiling.py)" in f.read()
+    finally:
+        profiling.ENABLED.clear()
+        profiling.ENABLED.update(old_enabled)
+        profiling.MODE = old_mode
+
+
+def test_cprofile_and_rotation():
+    print("Testing cProfile mode and rotation...")
+    old_enabled = set(profiling.ENABLED)
+    old_mode = profiling.MODE
+    try:
+        profiling.enable(["publish"], "cprofile")
+
+        async def cycle():
+            with profile("publish", tmp):
+                await asyncio.sleep(0.01)
+                sum(range(1000))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(cycle())
+            names = sorted(os.listdir(tmp))
+            assert [os.path.splitext(n)[1] for n in names] == [".prof", ".txt"]
+
+            for i in range(5):
+                for ext in (".prof", ".txt"):
+                    open(os.path.join(tmp, f"publish-0000{i}{ext}"), "w").close()
+            open(os.path.join(tmp, "scan-00000.txt"), "w").close()
+            rotate("publish", tmp, keep=2)
+            # Остались два последних прогона publish, чужие отчеты не тронуты
+            assert sorted(os.listdir(tmp)) == sorted(
+                ["publish-00004.prof", "publish-00004.txt", "scan-00000.txt"] + names
+            )
+    finally:
+        profiling.ENABLED.clear()
+        profiling.ENABLED.update(old_enabled)
+        profiling.MODE = old_mode
+
+
+def test_enable_validation():
+    try:
+        profiling.enable(["render"])
+        assert False, "Unknown cycle is rejected"
+    except ValueError:
+        pass
+    assert "render" not in profiling.ENABLED
+
+
+if __name__ == "__main__":
+    test_sample_profile()
+    test_cprofile_and_rotation()
+    test_enable_validation()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import rate_limiter
+from rate_limiter import RateLimiter, SendFailed, TokenBucket, is_group_chat
+
+
+def test_token_bucket_rate():
+    print("Testing TokenBucket...")
+
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    print(f"5 tokens at 20/s took {elapsed:.3f}s")
+    # Первый токен есть сразу, остальные 4 — по 50 мс
+    assert 0.18 <= elapsed < 0.5
+
+
+def test_chat_kinds():
+    assert is_group_chat("@Sneaker_Deals")
+    assert is_group_chat(-1001234567890)
+    assert is_group_chat("-100123")
+    assert not is_group_chat(123456)
+
+
+def test_idle_chats_evicted():
+    print("Testing idle chat buckets eviction...")
+    old_prune = rate_limiter.CHAT_BUCKETS_PRUNE
+    rate_limiter.CHAT_BUCKETS_PRUNE = 10
+    try:
+        limiter = RateLimiter(private_rate=100)
+
+        async def send(chat_id):
+            return await limiter.call(chat_id, lambda: asyncio.sleep(0))
+
+        async def run():
+            for chat_id in range(10):
+                await send(chat_id)
+            blocked = limiter._bucket(5)
+            blocked.block(60)
+            # Через 1/rate все bucket'ы снова полны, кроме заблокированного
+            await asyncio.sleep(0.02)
+            await send(100)
+
+        asyncio.run(run())
+        assert set(limiter._chats) == {5, 100}
+    finally:
+        rate_limiter.CHAT_BUCKETS_PRUNE = old_prune
+
+
+def test_retry_after_is_honored():
+    print("Testing RetryAfter handling...")
+    old_jitter = rate_limiter.RETRY_AFTER_JITTER
+    rate_limiter.RETRY_AFTER_JITTER = 0
+    method = SendMessage(chat_id=1, text="x")
+    calls = []
+
+    async def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method, "Flood control", retry_after=0)
+        return "ok"
+
+    async def run():
+        limiter = RateLimiter(global_rate=100, private_rate=100)
+        result = await limiter.call(1, flaky)
+        return limiter, result
+
+    try:
+        limiter, result = asyncio.run(run())
+    finally:
+        rate_limiter.RETRY_AFTER_JITTER = old_jitter
+    assert result == "ok"
+    assert len(calls) == 2
+    assert limiter.stats["retry_after"] == 1
+    assert limiter.stats["sent"] == 1
+
+
+def test_failures():
+    print("Testing failures...")
+    old_jitter = rate_limiter.RETRY_AFTER_JITTER
+    rate_limiter.RETRY_AFTER_JITTER = 0
+    method = SendMessage(chat_id=1, text="x")
+
+    async def always_flood():
+        raise TelegramRetryAfter(method, "Flood control", retry_after=0)
+
+    async def bad_request():
+        raise TelegramBadRequest(method, "Bad Request: wrong file")
+
+    async def run():
+        limiter = RateLimiter(global_rate=100, private_rate=100, max_attempts=2)
+        try:
+            await limiter.call(1, always_flood)
+            raise AssertionError("SendFailed expected")
+        except SendFailed:
+            pass
+
+        # Ошибки запроса не повторяются, а пробрасываются вызывающему
+        try:
+            await limiter.call(1, bad_request)
+            raise AssertionError("TelegramBadRequest expected")
+        except TelegramBadRequest:
+            pass
+        return limiter
+
+    try:
+        limiter = asyncio.run(run())
+    finally:
+        rate_limiter.RETRY_AFTER_JITTER = old_jitter
+    assert limiter.stats["failed"] == 1
+    assert limiter.stats["retry_after"] == 2
+
+
+if __name__ == "__main__":
+    test_token_bucket_rate()
+    test_chat_kinds()
+    test_idle_chats_evicted()
+    test_retry_after_is_honored()
+    test_failures()
+    print("\nSUCCESS: RateLimiter works correctly.")
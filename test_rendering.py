@@ -0,0 +1,141 @@
+import database
+import rendering
+from affiliate_manager import AffiliateManager
+from rendering import (
+    RENDER_VERSION,
+    has_image,
+    load_post,
+    render_deal,
+    track_channels,
+)
+from test_helpers import temp_db
+
+
+def test_render_once():
+    print("Testing stored renders...")
+
+    with temp_db():
+        deal = {
+            "title": "Кроссовки Nike Air Max 90",
+            "price": "9 990 ₽",
+            "old_price": "14 990 ₽",
+            "link": "https://brandshop.ru/goods/1/",
+            "sizes": ["41 RUS", "EU 43"],
+            "source": "Brandshop",
+        }
+        database.save_deal(
+            deal["title"],
+            deal["price"],
+            deal["old_price"],
+            deal["link"],
+            sizes=deal["sizes"],
+            source=deal["source"],
+        )
+
+        pending = database.get_unrendered_deals(RENDER_VERSION)
+        assert [d["link"] for d in pending] == [deal["link"]]
+
+        affiliate = AffiliateManager(
+            networks={"Brandshop": {"base_url": "https://go.example.com/?to="}}
+        )
+        render_json, photo = render_deal(pending[0], affiliate)
+        database.save_render(deal["link"], RENDER_VERSION, render_json, photo)
+        assert not database.get_unrendered_deals(RENDER_VERSION)
+
+        post = load_post(database.get_deal(deal["link"]))
+        print(post["caption"])
+        assert "Nike Air Max 90" in post["caption"]
+        assert "EU 42, 43" in post["caption"]
+        button = post["keyboard"].inline_keyboard[0][0]
+        assert button.url.startswith("https://go.example.com/?to=https%3A")
+        assert post["url"] == button.url
+
+        # Тот же товар в следующем скане — готовый пост остается
+        database.save_deal(
+            deal["title"],
+            deal["price"],
+            deal["old_price"],
+            deal["link"],
+            sizes=deal["sizes"],
+            source=deal["source"],
+        )
+        assert load_post(database.get_deal(deal["link"])) is not None
+
+        # Новая шаблонная версия — пост нужно перерисовать
+        rendering.RENDER_VERSION = RENDER_VERSION + 1
+        try:
+            assert load_post(database.get_deal(deal["link"])) is None
+        finally:
+            rendering.RENDER_VERSION = RENDER_VERSION
+
+        # Цена изменилась — старый пост сбрасывается
+        database.save_deal(
+            deal["title"],
+            "8 990 ₽",
+            deal["old_price"],
+            deal["link"],
+            sizes=deal["sizes"],
+            source=deal["source"],
+        )
+        assert load_post(database.get_deal(deal["link"])) is None
+        assert database.get_unrendered_deals(RENDER_VERSION)
+
+        # Фото из кластеризации — картинка не скачивается второй раз
+        render_json, photo = render_deal(pending[0], affiliate, photo=b"jpeg")
+        assert photo == b"jpeg"
+
+        # Картинка есть, а фото нет — попытки копятся, рендер не сохранен
+        assert not has_image(pending[0])
+        assert has_image(dict(pending[0], image_url="https://img/1.jpg"))
+        assert database.record_render_failure(deal["link"]) == 1
+        assert database.record_render_failure(deal["link"]) == 2
+        assert database.get_unrendered_deals(RENDER_VERSION)
+        # ...и повторяется, только когда скидка снова попадется в скане
+        assert not database.get_unrendered_deals(RENDER_VERSION, links=["other"])
+        again = database.get_unrendered_deals(RENDER_VERSION, links=[deal["link"]])
+        assert [d["link"] for d in again] == [deal["link"]]
+
+        # Пост старой версии шаблона перерисовывается в любой пачке
+        database.save_render(deal["link"], RENDER_VERSION - 1, render_json, None)
+        stale = database.get_unrendered_deals(RENDER_VERSION, links=[])
+        assert [d["link"] for d in stale] == [deal["link"]]
+        database.record_render_failure(deal["link"])
+        assert not database.get_unrendered_deals(RENDER_VERSION, links=[])
+
+
+def test_channel_links():
+    print("Testing per-channel affiliate links...")
+
+    deal = {
+        "title": "Кроссовки Nike Air Max 90",
+        "price": "9 990 ₽",
+        "old_price": "14 990 ₽",
+        "link": "https://brandshop.ru/goods/1/",
+        "source": "Brandshop",
+    }
+    network = {"base_url": "https://go.example.com/?to="}
+    affiliate = AffiliateManager(networks={"Brandshop": network})
+    post = load_post(
+        {
+            "render_version": RENDER_VERSION,
+            "render_json": render_deal(deal, affiliate)[0],
+        }
+    )
+    # subid без {channel} — у всех каналов общая кнопка
+    track_channels(post, deal, affiliate, ["@a", "@b"])
+    assert post["channel_urls"] == {}
+
+    affiliate = AffiliateManager(
+        networks={"Brandshop": dict(network, subid="tg_{channel}")}
+    )
+    post = load_post(
+        {
+            "render_version": RENDER_VERSION,
+            "render_json": render_deal(deal, affiliate)[0],
+        }
+    )
+    track_channels(post, deal, affiliate, ["@a", "@b"])
+    assert post["channel_urls"]["@a"].endswith("&subid=tg_%40a")
+    assert post["channel_urls"]["@b"].endswith("&subid=tg_%40b")
+    button = post["channel_keyboards"]["@a"].inline_keyboard[0][0]
+    assert button.url == post["channel_urls"]["@a"]
@@ -0,0 +1,198 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+
+import database
+import roles
+import source_scheduler
+from database import acquire_lease, get_leases, release_lease
+from source_scheduler import SourceScheduler
+from test_helpers import temp_db
+
+
+def _try_lease(db_name, holder):
+    database.DB_NAME = db_name
+    return acquire_lease("publisher", holder, ttl=60)
+
+
+def test_leases():
+    print("Testing leases...")
+    with temp_db():
+        with sqlite3.connect(database.DB_NAME) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        # Писатели других процессов ждут друг друга, а не падают сразу
+        with database._connect() as conn:
+            busy = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        assert busy == database.DB_TIMEOUT * 1000
+
+        assert acquire_lease("publisher", "a", ttl=10, now=100)
+        assert not acquire_lease("publisher", "b", ttl=10, now=105)
+        assert acquire_lease("publisher", "a", ttl=10, now=105)  # продление
+        # Владелец не продлил вовремя — аренду забирает другой
+        assert acquire_lease("publisher", "b", ttl=10, now=116)
+        assert get_leases(now=120) == {"publisher": ("b", 6)}
+        release_lease("publisher", "a")  # чужую аренду не отпустить
+        assert "publisher" in get_leases(now=120)
+        release_lease("publisher", "b")
+        assert get_leases(now=120) == {}
+
+        # Несколько процессов разом: аренда достается ровно одному
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(4) as pool:
+            won = pool.starmap(
+                _try_lease, [(database.DB_NAME, f"node{n}") for n in range(8)]
+            )
+        assert sum(won) == 1
+
+
+def test_run_as_leader():
+    print("Testing leader election...")
+    with temp_db():
+        active = []
+
+        def worker(node):
+            async def publish():
+                active.append(node)
+                await asyncio.Event().wait()
+
+            return publish
+
+        async def run():
+            first = asyncio.create_task(
+                roles.run_as_leader("publisher", worker("a"), ttl=0.3, holder="a")
+            )
+            await asyncio.sleep(0.05)
+            second = asyncio.create_task(
+                roles.run_as_leader("publisher", worker("b"), ttl=0.3, holder="b")
+            )
+            await asyncio.sleep(0.5)
+            # Активен только первый, второй в резерве
+            assert active == ["a"]
+
+            # Активный узел остановился — резерв подхватывает аренду
+            first.cancel()
+            await asyncio.sleep(0.3)
+            assert active == ["a", "b"]
+            second.cancel()
+            await asyncio.gather(first, second, return_exceptions=True)
+
+        asyncio.run(run())
+        assert get_leases() == {}
+
+
+def test_shared_schedule():
+    print("Testing shared scraper schedule...")
+    with temp_db():
+        calls = []
+
+        def scan(node):
+            async def run(names):
+                calls.append((node, names[0]))
+                return {names[0]: 1}
+
+            return run
+
+        async def run():
+            nodes = [
+                SourceScheduler(["a", "b"], scan(n), shared=True, holder=n)
+                for n in ("n1", "n2")
+            ]
+            for node in nodes:
+                node.load()
+            # Оба узла видят срок, но каждый магазин берет только один
+            assert nodes[0].tick() == ["a", "b"]
+            assert nodes[1].tick() == []
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert nodes[1].tick() == []  # новый срок уже в БД
+
+            # /latest в процессе бота: скраперы видят перенос срока
+            database.force_source_scans()
+            assert nodes[1].tick() == ["a", "b"]
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        assert calls == [("n1", "a"), ("n1", "b"), ("n2", "a"), ("n2", "b")]
+        assert get_leases() == {}
+
+
+def test_scan_lease_renewed():
+    print("Testing scan lease renewal...")
+    old_ttl = source_scheduler.SCAN_LEASE_TTL
+    source_scheduler.SCAN_LEASE_TTL = 0.3
+    try:
+        with temp_db():
+            calls = []
+
+            def scan(node):
+                async def run(names):
+                    calls.append(node)
+                    # Скан (с ожиданием слота) дольше срока аренды
+                    await asyncio.sleep(1)
+                    return {names[0]: 1}
+
+                return run
+
+            async def run():
+                first, second = [
+                    SourceScheduler(["a"], scan(n), shared=True, holder=n)
+                    for n in ("n1", "n2")
+                ]
+                first.load()
+                second.load()
+                assert first.tick() == ["a"]
+                await asyncio.sleep(0.6)
+                # Срок снова подошел (например, /latest), но аренда продлена
+                database.force_source_scans()
+                assert second.tick() == []
+                await asyncio.sleep(0.6)
+                assert not first.running
+
+            asyncio.run(run())
+            assert calls == ["n1"]
+            assert get_leases() == {}
+    finally:
+        source_scheduler.SCAN_LEASE_TTL = old_ttl
+
+
+def test_index_versions():
+    print("Testing cross-process index sync queries...")
+    with temp_db():
+        # Подписки: любое добавление или удаление в процессе бота меняет версию
+        empty = database.get_alerts_version()
+        first = database.add_alert(1, brand="nike")
+        added = database.get_alerts_version()
+        assert added != empty
+        database.add_alert(2, brand="adidas")
+        database.delete_alert(1, first["id"])
+        assert database.get_alerts_version() not in (empty, added)
+        assert [alert["chat_id"] for alert in database.get_alerts()] == [2]
+
+        # Хэши: другой узел догружает только новые товары
+        deals = [
+            {
+                "title": f"Nike {i}",
+                "price": "1 000 ₽",
+                "old_price": "2 000 ₽",
+                "link": f"https://shop/{i}",
+                "source": "Shop",
+            }
+            for i in range(2)
+        ]
+        database.save_deals(deals)
+        database.set_deal_cluster("https://shop/0", "ff", "https://shop/0")
+        synced = time.time()
+        database.set_deal_cluster("https://shop/1", "fe", "https://shop/0")
+        assert len(database.get_hashed_deals()) == 2
+        fresh = database.get_hashed_deals(since=synced)
+        assert [row["link"] for row in fresh] == ["https://shop/1"]
+
+
+if __name__ == "__main__":
+    test_leases()
+    test_run_as_leader()
+    test_shared_schedule()
+    test_scan_lease_renewed()
+    test_index_versions()
@@ -0,0 +1,81 @@
+import datetime
+
+from database import get_last_source_runs, get_scan_stats, record_scan_run
+from test_helpers import temp_db
+
+
+def make_run(started_at, durations, errors=None):
+    """Цикл скана: по магазину на каждую длительность из durations."""
+    errors = errors or {}
+    source_runs = [
+        {
+            "source": source,
+            "started_at": started_at,
+            "duration": duration,
+            "items": 10,
+            "new_deals": 2,
+            "changed_deals": 1,
+            "dropped_deals": 0,
+            "error": errors.get(source),
+        }
+        for source, duration in durations.items()
+    ]
+    run = {
+        "started_at": started_at,
+        "duration": max(durations.values()),
+        "sources": len(source_runs),
+        "items": 10 * len(source_runs),
+        "new_deals": 2 * len(source_runs),
+        "changed_deals": len(source_runs),
+        "dropped_deals": 0,
+        "errors": len(errors),
+    }
+    return run, source_runs
+
+
+def test_scan_stats():
+    print("Testing scan-run log and /stats aggregates...")
+    with temp_db():
+        now = datetime.datetime.now()
+
+        # 20 циклов: Lamoda 1..20 с, StreetBeat всегда 5 с
+        for i in range(1, 21):
+            errors = {"StreetBeat": "timeout"} if i == 20 else None
+            run, source_runs = make_run(
+                now - datetime.timedelta(hours=i),
+                {"Lamoda": float(i), "StreetBeat": 5.0},
+                errors,
+            )
+            assert record_scan_run(run, source_runs) == i
+
+        # Старый цикл вне окна в 7 дней не учитывается
+        run, source_runs = make_run(
+            now - datetime.timedelta(days=30), {"Lamoda": 1000.0}
+        )
+        record_scan_run(run, source_runs)
+
+        runs, sources = get_scan_stats(days=7)
+        print(runs, sources)
+        assert runs["runs"] == 20
+        assert runs["failed_runs"] == 1
+        assert runs["p50"] == 10.0
+        assert runs["p95"] == 19.0
+
+        by_source = {row["source"]: row for row in sources}
+        assert by_source["Lamoda"]["runs"] == 20
+        assert by_source["Lamoda"]["errors"] == 0
+        assert by_source["Lamoda"]["p50"] == 10.0
+        assert by_source["Lamoda"]["p95"] == 19.0
+        assert by_source["Lamoda"]["avg_items"] == 10
+        assert by_source["Lamoda"]["new_deals"] == 40
+        assert by_source["StreetBeat"]["errors"] == 1
+        assert by_source["StreetBeat"]["p95"] == 5.0
+
+        # Последний (самый поздний) скан каждого магазина
+        last = {row["source"]: row for row in get_last_source_runs()}
+        assert last["StreetBeat"]["error"] is None
+        assert last["Lamoda"]["started_at"] == str(now - datetime.timedelta(hours=1))
+
+
+if __name__ == "__main__":
+    test_scan_stats()
@@ -0,0 +1,80 @@
+import datetime
+import sqlite3
+
+import database
+from scoring import deal_score, discount_percent
+from test_helpers import temp_db
+
+
+def test_deal_score_ordering():
+    print("Testing deal_score...")
+
+    big = {
+        "title": "Nike Air Max 90",
+        "price": "6 990 ₽",
+        "old_price": "15 990 ₽",
+        "sizes": ["41", "42", "43", "44"],
+        "source": "Brandshop",
+    }
+    mediocre = dict(big, price="13 990 ₽")
+    no_sizes = dict(big, sizes=["38", "39"])
+
+    print(f"big={deal_score(big)} mediocre={deal_score(mediocre)}")
+    assert round(discount_percent("5 000 ₽", "10 000 ₽")) == 50
+    assert discount_percent("5 000 ₽", "N/A") == 0
+    assert deal_score(big) > deal_score(mediocre), "Bigger discount must win"
+    assert deal_score(big) > deal_score(no_sizes), "Valid sizes must add score"
+    # Строка размеров из БД считается так же, как список
+    assert deal_score(dict(big, sizes="41,42,43,44")) == deal_score(big)
+
+
+def test_priority_queue():
+    print("Testing priority queue...")
+
+    with temp_db():
+        database.save_deal("A", "9 990 ₽", "10 990 ₽", "a", source="Lamoda", score=5)
+        database.save_deal("B", "4 990 ₽", "10 990 ₽", "b", source="Lamoda", score=50)
+        database.save_deal("C", "8 990 ₽", "10 990 ₽", "c", source="Lamoda", score=20)
+
+        assert database.get_next_pending_deal()["link"] == "b"
+        database.mark_deal_as_sent("b")
+        assert database.get_next_pending_deal()["link"] == "c"
+
+        # Выбор следующей скидки не должен требовать сортировки
+        with sqlite3.connect(database.DB_NAME) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM deals WHERE sent = 0 "
+                "ORDER BY score DESC, last_seen ASC LIMIT 1"
+            ).fetchall()
+        plan_text = " ".join(str(row[-1]) for row in plan)
+        print(f"Plan: {plan_text}")
+        assert "idx_deals_queue" in plan_text
+        assert "TEMP B-TREE" not in plan_text
+
+        # Скан Lamoda начался после сохранения "c", а "a" обновился в нем
+        scan_started = datetime.datetime.now()
+        database.save_deal("A", "9 990 ₽", "10 990 ₽", "a", source="Lamoda", score=5)
+        # "c" мог просто уйти дальше по каталогу: снимается только после
+        # трех сканов подряд без него
+        assert database.drop_stale_deals("Lamoda", scan_started, scans=3) == 0
+        assert database.get_next_pending_deal()["link"] == "c"
+        assert database.drop_stale_deals("Lamoda", scan_started, scans=3) == 0
+        assert database.drop_stale_deals("Lamoda", scan_started, scans=3) == 1
+        assert database.get_next_pending_deal()["link"] == "a"
+
+        # Скидка снова нашлась — счетчик пропусков сбрасывается
+        database.save_deal("D", "7 990 ₽", "10 990 ₽", "d", source="Brandshop", score=1)
+        first_scan = datetime.datetime.now()
+        assert database.drop_stale_deals("Brandshop", first_scan, scans=2) == 0
+        second_scan = datetime.datetime.now()
+        database.save_deal("D", "7 990 ₽", "10 990 ₽", "d", source="Brandshop", score=1)
+        assert database.drop_stale_deals("Brandshop", second_scan, scans=2) == 0
+        third_scan = datetime.datetime.now()
+        assert database.drop_stale_deals("Brandshop", third_scan, scans=2) == 0
+        assert database.drop_stale_deals("Brandshop", third_scan, scans=2) == 1
+
+
+if __name__ == "__main__":
+    test_deal_score_ordering()
+    test_priority_queue()
+    print("\nSUCCESS: priority queue works correctly.")
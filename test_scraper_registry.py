@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from importlib.metadata import EntryPoint
+
+import scraper_registry
+from browser_watchdog import IncompleteScan
+from scraper_registry import (
+    ENTRY_POINT_GROUP,
+    Scraper,
+    ThreadedScraper,
+    load_scrapers,
+    register_scraper,
+    resolve_scraper,
+    run_scraper,
+    stream_scraper,
+)
+
+
+class FakeBlockingScraper:
+    """Блокирующий скрапер: запоминает, из каких потоков его вызывали."""
+
+    SOURCE = "FakeShop"
+    threads = set()
+    closed = 0
+
+    def __init__(self):
+        FakeBlockingScraper.threads.add(threading.get_ident())
+
+    def fetch_catalog(self, max_pages=1):
+        for i in range(3):
+            FakeBlockingScraper.threads.add(threading.get_ident())
+            yield {"link": f"https://fake.shop/{i}", "sizes": []}
+
+    def enrich(self, items):
+        for item in items:
+            FakeBlockingScraper.threads.add(threading.get_ident())
+            item["sizes"] = ["42"]
+            yield item
+
+    def close(self):
+        FakeBlockingScraper.threads.add(threading.get_ident())
+        FakeBlockingScraper.closed += 1
+
+
+class SkippedPageScraper:
+    """Блокирующий скрапер, у которого не загрузилась вторая страница."""
+
+    SOURCE = "SkippedShop"
+
+    def fetch_catalog(self, max_pages=1):
+        self.incomplete = None
+        yield {"link": "https://skipped.shop/1"}
+        self.incomplete = "page 2 timed out"
+
+    def enrich(self, items):
+        yield from items
+
+    def close(self):
+        pass
+
+
+class FakeAsyncScraper:
+    source = "AsyncShop"
+
+    async def fetch_catalog(self):
+        yield {"link": "https://async.shop/1"}
+        raise RuntimeError("shop is down")
+
+    async def enrich(self, items):
+        for item in items:
+            yield item
+
+    async def close(self):
+        pass
+
+
+def test_registry():
+    print("Testing scraper registry...")
+
+    register_scraper("async_shop", FakeAsyncScraper)
+    scrapers = load_scrapers(
+        ["test_scraper_registry:FakeBlockingScraper", "async_shop", "no_such_shop"]
+    )
+    assert [s.source for s in scrapers] == ["FakeShop", "AsyncShop"]
+    assert isinstance(scrapers[0], ThreadedScraper)
+    assert all(isinstance(s, Scraper) for s in scrapers)
+
+    items = asyncio.run(run_scraper(scrapers[0]))
+    assert [item["sizes"] for item in items] == [["42"]] * 3
+    assert FakeBlockingScraper.closed == 1
+    # Все вызовы одного скрапера — в одном и том же потоке (не в основном)
+    assert len(FakeBlockingScraper.threads) == 1
+    assert threading.get_ident() not in FakeBlockingScraper.threads
+
+    try:
+        asyncio.run(run_scraper(scrapers[1]))
+        assert False, "Errors are passed to the orchestrator"
+    except RuntimeError:
+        pass
+
+    # Неполный каталог: собранные скидки отдаются, затем скан падает
+    items = []
+
+    async def collect():
+        async for deal in stream_scraper(ThreadedScraper(SkippedPageScraper)):
+            items.append(deal)
+
+    try:
+        asyncio.run(collect())
+        assert False, "Incomplete scan is an error"
+    except IncompleteScan as e:
+        assert "page 2 timed out" in str(e)
+    assert [item["link"] for item in items] == ["https://skipped.shop/1"]
+
+
+def test_plugin_entry_points():
+    print("Testing plugin scrapers from entry points...")
+    plugin = EntryPoint(
+        "plugin", "test_scraper_registry:FakeAsyncScraper", ENTRY_POINT_GROUP
+    )
+    old_entry_points = scraper_registry.entry_points
+    # Python 3.9: entry_points() без аргументов возвращает dict групп
+    scraper_registry.entry_points = lambda: {ENTRY_POINT_GROUP: [plugin]}
+    try:
+        assert isinstance(resolve_scraper("plugin")(), FakeAsyncScraper)
+    finally:
+        scraper_registry.entry_points = old_entry_points
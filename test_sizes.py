@@ -0,0 +1,62 @@
+from sizes import normalize_sizes, parse_size, sizes_to_db
+from utils import format_sizes, has_valid_size
+
+
+def test_parse_size_systems():
+    print("Testing parse_size...")
+
+    cases = {
+        "42": 42.0,
+        "42.5": 42.5,
+        "42,5 EU": 42.5,
+        "EU 42": 42.0,
+        "43 EUR": 43.0,
+        "41 RUS": 42.0,
+        "35 RUS\n36 EUR": 36.0,  # Lamoda: приоритет у EUR
+        "US 9": 42.5,
+        "9.5 US": 43.0,
+        "UK 8": 42.0,
+        "42 2/3": 42.5,
+        "Размер 44": 44.0,
+        "XL": None,
+        "": None,
+        "2024": None,
+    }
+    for text, expected in cases.items():
+        result = parse_size(text)
+        print(f"{text!r:>18} -> {result}")
+        assert result == expected, f"{text!r}: {result} != {expected}"
+
+
+def test_normalize_and_format():
+    print("Testing normalize_sizes / format_sizes...")
+
+    assert normalize_sizes(["EU 42", "42", "41 RUS", "43"]) == (42.0, 43.0)
+    assert normalize_sizes("41,42.5") == (41.0, 42.5)
+    assert sizes_to_db(["EU 41", "41,5 EU", "US 9"]) == "41,41.5,42.5"
+
+    assert format_sizes(["41", "42", "43"]) == "41 - 43"
+    assert format_sizes(["40", "42", "44"]) == "40, 42, 44"
+    assert format_sizes(["40", "40.5", "41", "41.5", "42"]) == "40 - 42"
+    assert format_sizes(["39", "40", "41", "45", "46"]) == "39 - 41, 45, 46"
+    assert format_sizes(["EU 42", "41 RUS", "US 10"]) == "42, 44"
+    assert format_sizes(["One size"]) == "One size"
+    assert format_sizes([]) == ""
+
+
+def test_has_valid_size():
+    print("Testing has_valid_size...")
+
+    assert not has_valid_size(["39 EU", "40 EU"])
+    assert has_valid_size(["39 EU", "41.5 EU"])
+    assert has_valid_size(["40 RUS"]), "40 RUS = 41 EU"
+    assert not has_valid_size(["One size"])
+    assert not has_valid_size([])
+    assert has_valid_size(["39", "42"], min_size=42)
+
+
+if __name__ == "__main__":
+    test_parse_size_systems()
+    test_normalize_and_format()
+    test_has_valid_size()
+    print("\nSUCCESS: size parsing works correctly.")
@@ -0,0 +1,126 @@
+import asyncio
+import random
+
+import source_scheduler
+from source_scheduler import SourceScheduler, next_interval, update_rate
+from test_helpers import temp_db
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_next_interval():
+    print("Testing next_interval...")
+    bounds = (600, 3 * 3600)
+
+    # Тишина: интервал растет, но не больше чем вдвое и не выше максимума
+    assert next_interval(1800, 0, bounds) == 3600
+    assert next_interval(2 * 3600, 0, bounds) == 3 * 3600
+
+    # 20 изменений в час при норме 5 за скан — сканируем раз в 15 минут
+    assert next_interval(1800, 20, bounds, target=5) == 900
+    # Всплеск: интервал уменьшается не больше чем вдвое и не ниже минимума
+    assert next_interval(1800, 1000, bounds, target=5) == 900
+    assert next_interval(900, 1000, bounds, target=5) == 600
+
+    # Сглаживание скорости: первый скан берется как есть
+    assert update_rate(None, 10, 1800) == 20
+    assert update_rate(20, 0, 1800) == 14
+
+
+def test_scheduler():
+    print("Testing SourceScheduler...")
+
+    old_jitter = source_scheduler.SCAN_JITTER
+    source_scheduler.SCAN_JITTER = 0.1
+    try:
+        with temp_db():
+            clock = FakeClock()
+            changes = {"busy": 50, "quiet": 0}
+            release = {}
+            calls = []
+
+            async def scan(names):
+                calls.extend(names)
+                await release[names[0]].wait()
+                return {name: changes[name] for name in names}
+
+            async def run():
+                scheduler = SourceScheduler(
+                    ["busy", "quiet"], scan, clock=clock, rng=random.Random(1)
+                )
+                scheduler.load()
+                release["busy"] = asyncio.Event()
+                release["quiet"] = asyncio.Event()
+                release["quiet"].set()
+
+                # Первый запуск: сканируются все магазины
+                assert scheduler.tick() == ["busy", "quiet"]
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                assert "quiet" not in scheduler.running
+                assert "busy" in scheduler.running
+
+                # Срок busy подошел, а прошлый скан еще идет — пропускаем;
+                # quiet сканируется снова
+                clock.now += 3 * 3600
+                assert scheduler.tick() == ["quiet"]
+                assert calls.count("busy") == 1
+
+                release["busy"].set()
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                assert not scheduler.running
+                return scheduler
+
+            scheduler = asyncio.run(run())
+            busy = scheduler.schedule["busy"]
+            quiet = scheduler.schedule["quiet"]
+            assert busy["interval"] < quiet["interval"]
+            assert busy["last_changes"] == 50
+
+            # Разброс: срок не ровно через интервал, но в пределах ±10%
+            offset = quiet["next_run"] - clock.now
+            assert offset != quiet["interval"]
+            assert abs(offset - quiet["interval"]) <= quiet["interval"] * 0.1
+
+            # Расписание переживает перезапуск
+            restored = SourceScheduler(["busy", "quiet", "new"], scan, clock=clock)
+            restored.load()
+            assert restored.schedule["busy"]["interval"] == busy["interval"]
+            assert restored.schedule["quiet"]["next_run"] == quiet["next_run"]
+            assert restored.schedule["new"]["next_run"] == clock.now
+    finally:
+        source_scheduler.SCAN_JITTER = old_jitter
+
+
+def test_failed_scan_keeps_interval():
+    print("Testing failed scan...")
+
+    with temp_db():
+
+        async def scan(names):
+            raise RuntimeError("browser died")
+
+        async def run():
+            scheduler = SourceScheduler(["shop"], scan, clock=FakeClock())
+            scheduler.load()
+            interval = scheduler.schedule["shop"]["interval"]
+            scheduler.tick()
+            await asyncio.sleep(0)
+            assert not scheduler.running
+            assert scheduler.schedule["shop"]["interval"] == interval
+            assert scheduler.schedule["shop"]["change_rate"] is None
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_next_interval()
+    test_scheduler()
+    test_failed_scan_keeps_interval()
@@ -0,0 +1,92 @@
+import metrics
+from metrics import SIZE_COVERAGE
+from streetbeat_scraper import (
+    EXTRACT_LISTING_SCRIPT,
+    SCROLL_LOADER_SCRIPT,
+    StreetBeatScraper,
+)
+
+
+class FakeDriver:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def set_script_timeout(self, seconds):
+        self.timeout = seconds
+
+    def execute_async_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.result
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def make_scraper(driver):
+    # Без браузера: __init__ скрапера запускает Chrome
+    scraper = StreetBeatScraper.__new__(StreetBeatScraper)
+    scraper.driver = driver
+    return scraper
+
+
+def test_load_listing():
+    print("Testing StreetBeat scroll loader call...")
+    result = {
+        "items": 60,
+        "cards": 60,
+        "target": 90,
+        "scrolls": 3,
+        "reason": "idle",
+        "ms": 2600,
+    }
+    driver = FakeDriver(result)
+    assert make_scraper(driver)._load_listing(3) == result
+    script, args = driver.calls[0]
+    assert script is SCROLL_LOADER_SCRIPT
+    assert args[:2] == (3, "div.product-card")
+    # Таймаут скрипта больше его собственного дедлайна
+    assert driver.timeout * 1000 > args[-1]
+
+
+def test_extract_listing():
+    print("Testing StreetBeat listing extraction...")
+    listing = {"items": [{"url": "/d/1/", "sizes": ["42"]}], "cards": 1}
+    driver = FakeDriver(listing)
+    assert make_scraper(driver)._extract_listing() == listing
+    # Весь листинг — одна команда WebDriver
+    assert len(driver.calls) == 1
+    assert driver.calls[0][0] is EXTRACT_LISTING_SCRIPT
+
+    # Ошибка скрипта или пустой ответ — пустой листинг, а не исключение
+    empty = {"items": [], "cards": 0}
+    assert make_scraper(FakeDriver(RuntimeError("js")))._extract_listing() == empty
+    assert make_scraper(FakeDriver(None))._extract_listing() == empty
+
+
+def test_size_coverage():
+    print("Testing StreetBeat size coverage...")
+    old_enabled = metrics.ENABLED
+    metrics.ENABLED = True
+    try:
+        json_items = [
+            {"url": "/d/1/", "sizes": ["42"]},
+            {"url": "/d/2/", "sizes": ["41", "42"]},
+            {"url": "/d/3/", "sizes": []},
+            {"url": "/d/4/"},
+        ]
+        coverage = make_scraper(None)._report_coverage(json_items)
+        assert coverage == 0.5
+        assert SIZE_COVERAGE._values[("StreetBeat",)] == 0.5
+        assert make_scraper(None)._report_coverage([]) == 0
+    finally:
+        metrics.ENABLED = old_enabled
+
+
+if __name__ == "__main__":
+    test_load_listing()
+    test_extract_listing()
+    test_size_coverage()
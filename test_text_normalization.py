@@ -0,0 +1,49 @@
+from scoring import detect_brand
+from text_normalization import (
+    canonical_brand,
+    clean_title,
+    is_target_brand,
+    make_title,
+    title_keys,
+)
+
+
+def test_clean_title():
+    print("Testing clean_title...")
+
+    cases = {
+        "Кроссовки мужские Nike Air Jordan": "Nike Air Jordan",
+        "Кеды Vans Old Skool": "Vans Old Skool",
+        "Puma Puma Suede Classic": "Puma Suede Classic",
+        "Reebok  reebok Club C": "Reebok Club C",
+        "": "",
+    }
+    for title, expected in cases.items():
+        result = clean_title(title)
+        print(f"{title!r} -> {result!r}")
+        assert result == expected
+
+
+def test_brands():
+    print("Testing brand aliases...")
+
+    assert canonical_brand("Adidas  Originals") == "adidas"
+    assert canonical_brand("NIKE") == "nike"
+    assert is_target_brand("adidas Y-3")
+    assert is_target_brand("New Balance")
+    assert not is_target_brand("Timberland")
+
+    assert "jordan" in title_keys("Air Jordan 1 Low")
+    assert "new balance" in title_keys("New Balance 550")
+    # Раньше бренд искался подстрокой: 'vans' находился в 'canvas'
+    assert detect_brand("Converse Chuck 70 Canvas") == "converse"
+    assert detect_brand("Nike Air Jordan 1") == "jordan"
+
+
+def test_make_title():
+    print("Testing make_title...")
+
+    assert make_title("Puma", "Puma Suede Classic") == "Puma Suede Classic"
+    assert make_title("Nike", " Air  Max 90 ") == "Nike Air Max 90"
+    assert make_title("Vans", "Vansity") == "Vans Vansity"
+    assert make_title("", "Samba OG") == "Samba OG"
@@ -0,0 +1,81 @@
+import time
+
+import metrics
+from metrics import WAIT_SAVED_SECONDS, WAIT_SECONDS
+from waits import Pacer, wait_stable, wait_until
+
+
+def counter(values):
+    """sample(), который по очереди отдает values, а потом — последнее."""
+    values = list(values)
+
+    def sample():
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    return sample
+
+
+def test_wait_stable():
+    print("Testing wait_stable...")
+    # Число карточек растет, потом перестает: ждем settle после последнего роста
+    started = time.monotonic()
+    value = wait_stable(counter([10, 20, 30, 30]), timeout=5, settle=0.2, poll=0.01)
+    elapsed = time.monotonic() - started
+    assert value == 30
+    assert 0.2 <= elapsed < 1, elapsed
+
+    # Значение меняется все время — выходим по таймауту
+    ticks = iter(range(10**6))
+    started = time.monotonic()
+    wait_stable(lambda: next(ticks), timeout=0.3, settle=0.2, poll=0.01)
+    assert 0.3 <= time.monotonic() - started < 0.6
+
+    # Ошибки при опросе не прерывают ожидание
+    def broken():
+        raise RuntimeError("stale element")
+
+    assert wait_stable(broken, timeout=0.1, settle=0.05, poll=0.01) is None
+
+
+def test_wait_until():
+    print("Testing wait_until...")
+    started = time.monotonic()
+    assert wait_until(counter([0, 0, 3]), timeout=5, poll=0.01) == 3
+    assert time.monotonic() - started < 0.5
+
+    started = time.monotonic()
+    assert wait_until(lambda: 0, timeout=0.1, poll=0.01) is None
+    assert time.monotonic() - started >= 0.1
+
+
+def test_pacer_and_saved_time():
+    print("Testing Pacer and saved-time metrics...")
+    old_enabled = metrics.ENABLED
+    metrics.ENABLED = True
+    try:
+        pacer = Pacer(0.2, wait="test_pace", source="Test")
+        assert pacer.wait() == 0  # первый заход без паузы
+        time.sleep(0.15)  # «загрузка страницы»
+        delay = pacer.wait()
+        assert 0 < delay <= 0.06, delay
+        # Страница грузилась дольше интервала — ждать не нужно
+        time.sleep(0.25)
+        assert pacer.wait() == 0
+
+        saved = WAIT_SAVED_SECONDS._values[("test_pace", "Test")]
+        assert 0.3 < saved <= 0.4, saved
+        assert WAIT_SECONDS._values[("test_pace", "Test")][2] == 2
+
+        # Готовая сразу страница экономит почти весь бюджет
+        wait_until(lambda: True, timeout=2, wait="test_chips", source="Test")
+        assert WAIT_SAVED_SECONDS._values[("test_chips", "Test")] > 1.9
+        wait_until(lambda: True, timeout=2, wait="test_zero", source="Test", budget=0)
+        assert ("test_zero", "Test") not in WAIT_SAVED_SECONDS._values
+    finally:
+        metrics.ENABLED = old_enabled
+
+
+if __name__ == "__main__":
+    test_wait_stable()
+    test_wait_until()
+    test_pacer_and_saved_time()
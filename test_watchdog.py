@@ -0,0 +1,154 @@
+import asyncio
+import os
+import subprocess
+import time
+
+from browser_watchdog import BrowserDied, ScrapeTimeout, is_browser_dead
+from process_tree import (
+    descendants,
+    is_running,
+    kill_tree,
+    reap_zombies,
+    wait_exited,
+)
+from scraper_registry import ThreadedScraper
+
+
+class FakeBrowserScraper:
+    """
+    Скрапер с «браузером» — процессом sleep. На товаре "hang" вызов висит,
+    пока браузер не убьют; на товаре "dead" браузер «падает».
+    """
+
+    SOURCE = "Fake"
+    instances = []
+
+    def __init__(self):
+        self.browser = subprocess.Popen(["sleep", "60"])
+        self.closed = False
+        FakeBrowserScraper.instances.append(self)
+
+    def browser_pid(self):
+        return self.browser.pid
+
+    def fetch_catalog(self, max_pages):
+        for title in ["a", "hang", "b", "dead", "c"][:max_pages]:
+            if title == "hang" and max_pages == 2:
+                self.browser.wait()
+                raise RuntimeError("disconnected: not connected to DevTools")
+            yield {"title": title}
+
+    def enrich(self, items):
+        for item in items:
+            if item["title"] == "hang":
+                # Как driver.get в зависшем Chrome: возвращается, только
+                # когда браузер убит
+                self.browser.wait()
+                raise RuntimeError("disconnected: not connected to DevTools")
+            if item["title"] == "dead":
+                raise BrowserDied("invalid session id")
+            yield dict(item, sizes=["EU 42"], browser=id(self))
+
+    def close(self):
+        self.closed = True
+        self.browser.kill()
+        self.browser.wait()
+
+
+def collect(scraper, stage, *args):
+    async def run():
+        try:
+            return [item async for item in getattr(scraper, stage)(*args)]
+        finally:
+            await scraper.close()
+
+    return asyncio.run(run())
+
+
+def test_kill_tree_and_reap():
+    print("Testing process tree kill and zombie reaping...")
+    shell = subprocess.Popen(["sh", "-c", "sleep 60 & sleep 60 & wait"])
+    time.sleep(0.2)
+    children = descendants(shell.pid)
+    assert len(children) == 2
+    killed = kill_tree(shell.pid)
+    assert killed[0] == shell.pid and sorted(killed[1:]) == sorted(children)
+    assert wait_exited(killed) == []
+    assert shell.wait(timeout=5) == -9
+
+    # Зомби забирается, только если его передали явно: статус процесса с
+    # владельцем (Popen) остается владельцу
+    owned = subprocess.Popen(["sleep", "60"])
+    orphan = subprocess.Popen(["sleep", "60"])
+    kill_tree(owned.pid)
+    kill_tree(orphan.pid)
+    assert wait_exited([owned.pid, orphan.pid]) == []
+    assert not is_running(owned.pid)
+    assert reap_zombies([orphan.pid]) == 1
+    assert not os.path.exists(f"/proc/{orphan.pid}")
+    assert owned.wait(timeout=5) == -9
+
+
+def test_enrich_restarts_hung_browser():
+    print("Testing watchdog restart of a hung browser...")
+    FakeBrowserScraper.instances = []
+    scraper = ThreadedScraper(
+        FakeBrowserScraper, max_pages=5, call_timeout=0.5, timeout=30
+    )
+    items = [{"title": t} for t in ["a", "hang", "b", "dead", "c"]]
+
+    started = time.monotonic()
+    deals = collect(scraper, "enrich", items)
+    assert time.monotonic() - started < 5
+
+    assert [d["title"] for d in deals] == ["a", "hang", "b", "dead", "c"]
+    # Товары, на которых браузер завис или упал, — без обогащения
+    assert "sizes" not in deals[1] and "sizes" not in deals[3]
+    assert deals[0]["sizes"] == deals[2]["sizes"] == deals[4]["sizes"]
+    assert scraper.restarts == 2
+
+    first, second, third = FakeBrowserScraper.instances
+    assert deals[0]["browser"] == id(first)
+    assert deals[2]["browser"] == id(second)
+    assert deals[4]["browser"] == id(third)
+    # Зависший браузер убит сторожем, последний закрыт как обычно
+    assert first.browser.poll() == -9
+    assert third.closed
+
+
+def test_catalog_timeout_and_limits():
+    print("Testing watchdog timeouts...")
+    FakeBrowserScraper.instances = []
+    # Каталог не перезапускается: скан магазина падает с ScrapeTimeout
+    scraper = ThreadedScraper(FakeBrowserScraper, max_pages=2, call_timeout=0.3)
+    try:
+        collect(scraper, "fetch_catalog")
+        assert False, "Hung catalog raises ScrapeTimeout"
+    except ScrapeTimeout:
+        pass
+    assert FakeBrowserScraper.instances[0].browser.poll() == -9
+
+    # Перезапуски кончились — ошибка выходит наружу
+    scraper = ThreadedScraper(
+        FakeBrowserScraper, call_timeout=0.3, timeout=30, max_restarts=0
+    )
+    try:
+        collect(scraper, "enrich", [{"title": "hang"}, {"title": "a"}])
+        assert False, "No restarts left"
+    except ScrapeTimeout:
+        pass
+
+
+def test_is_browser_dead():
+    assert is_browser_dead(RuntimeError("Message: invalid session id"))
+    assert is_browser_dead(
+        RuntimeError("Target page, context or browser has been closed")
+    )
+    assert not is_browser_dead(RuntimeError("no such element"))
+
+
+if __name__ == "__main__":
+    test_kill_tree_and_reap()
+    test_enrich_restarts_hung_browser()
+    test_catalog_timeout_and_limits()
+    test_is_browser_dead()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+
+import scraper_workers
+from browser_watchdog import ScrapeTimeout
+from process_tree import is_running
+from scraper_registry import run_scraper
+from scraper_workers import ProcessScraper, shutdown_pools
+
+
+class FakeWorkerScraper:
+    """Блокирующий скрапер для процесса-воркера: товары помечаются PID."""
+
+    SOURCE = "FakeWorker"
+
+    def fetch_catalog(self, max_pages):
+        for n in range(max_pages):
+            yield {"title": f"item {n}", "n": n}
+
+    def enrich(self, items):
+        for item in items:
+            yield dict(item, sizes=["EU 42"], pid=os.getpid())
+
+    def close(self):
+        pass
+
+
+class SlowWorkerScraper(FakeWorkerScraper):
+    SOURCE = "FakeSlow"
+
+    def enrich(self, items):
+        for item in items:
+            time.sleep(0.05)
+            yield dict(item, pid=os.getpid())
+
+
+class HangingScraper(FakeWorkerScraper):
+    SOURCE = "FakeHang"
+
+    def enrich(self, items):
+        time.sleep(60)  # браузер завис
+        yield from ()
+
+
+class BrokenScraper(FakeWorkerScraper):
+    SOURCE = "FakeBroken"
+
+    def fetch_catalog(self, max_pages):
+        yield {"title": "item 0"}
+        raise ValueError("no such element")
+
+
+class SkippedPageScraper(FakeWorkerScraper):
+    SOURCE = "FakeSkipped"
+
+    def fetch_catalog(self, max_pages):
+        yield from super().fetch_catalog(max_pages)
+        self.incomplete = "page 2 timed out"
+
+
+def scan(scraper):
+    return asyncio.run(run_scraper(scraper))
+
+
+def test_scan_in_worker_and_recycle():
+    print("Testing scraper worker processes...")
+    try:
+        deals = scan(ProcessScraper(FakeWorkerScraper, max_pages=5, enrich_batch=2))
+        assert [d["n"] for d in deals] == [0, 1, 2, 3, 4]
+        assert all(d["sizes"] == ["EU 42"] for d in deals)
+        first = deals[0]["pid"]
+        assert first != os.getpid()
+
+        # Процесс живет между сканами...
+        deals = scan(ProcessScraper(FakeWorkerScraper, max_pages=1, max_runs=2))
+        assert deals[0]["pid"] != first  # новый max_runs — новый пул
+        second = deals[0]["pid"]
+        deals = scan(ProcessScraper(FakeWorkerScraper, max_pages=1, max_runs=2))
+        assert deals[0]["pid"] == second
+        # ...и пересоздается после max_runs сканов
+        deals = scan(ProcessScraper(FakeWorkerScraper, max_pages=1, max_runs=2))
+        assert deals[0]["pid"] != second
+
+        # Два скана магазина разом (/latest и расписание) идут по очереди
+        # и не забирают скидки друг у друга
+        async def both():
+            return await asyncio.gather(
+                run_scraper(ProcessScraper(SlowWorkerScraper, max_pages=4)),
+                run_scraper(ProcessScraper(SlowWorkerScraper, max_pages=3)),
+            )
+
+        first_scan, second_scan = asyncio.run(both())
+        assert [d["n"] for d in first_scan] == [0, 1, 2, 3]
+        assert [d["n"] for d in second_scan] == [0, 1, 2]
+    finally:
+        shutdown_pools()
+
+
+def test_worker_timeout_and_errors():
+    print("Testing scraper worker watchdog...")
+    old_poll = scraper_workers.POLL
+    scraper_workers.POLL = 0.1
+    try:
+        scraper = ProcessScraper(HangingScraper, max_pages=1, call_timeout=0.5)
+        started = time.monotonic()
+        try:
+            scan(scraper)
+            assert False, "Hung worker raises ScrapeTimeout"
+        except ScrapeTimeout:
+            pass
+        assert time.monotonic() - started < 10
+        # Зависший воркер убит: _reclaim дожидается его завершения
+        assert scraper.pid and not is_running(scraper.pid)
+
+        # Ошибка скрапера в воркере доходит до оркестратора
+        try:
+            scan(ProcessScraper(BrokenScraper, max_pages=1))
+            assert False, "Worker error is raised"
+        except RuntimeError as e:
+            assert "no such element" in str(e)
+
+        # Неполный каталог в воркере — тоже ошибка скана
+        try:
+            scan(ProcessScraper(SkippedPageScraper, max_pages=1))
+            assert False, "Incomplete scan is an error"
+        except RuntimeError as e:
+            assert "IncompleteScan: page 2 timed out" in str(e)
+    finally:
+        scraper_workers.POLL = old_poll
+        shutdown_pools()
+
+
+if __name__ == "__main__":
+    test_scan_in_worker_and_recycle()
+    test_worker_timeout_and_errors()
@@ -0,0 +1,134 @@
+"""
+Нормализация названий товаров и брендов.
+
+Общие для скраперов, дедупликации, подписок и публикации: стоп-слова и
+списки брендов собраны здесь в неизменяемые множества, слова выделяются
+одним предкомпилированным регулярным выражением, а результаты для уже
+встречавшихся строк берутся из LRU-кэша (названия в каталогах
+повторяются от скана к скану).
+"""
+
+import re
+from functools import lru_cache
+
+# Общие слова, которые убираются из названия (в нижнем регистре)
+STOPWORDS = frozenset(
+    {
+        "кроссовки",
+        "мужские",
+        "женские",
+        "кеды",
+        "высокие",
+        "низкие",
+        "ботинки",
+        "сандалии",
+        "сланцы",
+        "тапочки",
+    }
+)
+
+# Линейки и варианты написания -> основной бренд
+BRAND_ALIASES = {
+    "adidas originals": "adidas",
+    "adidas y-3": "adidas",
+    "adidas yeezy": "adidas",
+    "adidas performance": "adidas",
+    "air jordan": "jordan",
+    "nb": "new balance",
+    "newbalance": "new balance",
+    "dc": "dc shoes",
+}
+
+# Бренды, которые берем из каталога Lamoda (после приведения алиасов)
+TARGET_BRANDS = frozenset(
+    {
+        "reebok",
+        "nike",
+        "puma",
+        "diadora",
+        "new balance",
+        "converse",
+        "adidas",
+        "asics",
+        "dc shoes",
+        "element",
+        "jordan",
+        "karhu",
+        "lacoste",
+        "saucony",
+        "vans",
+    }
+)
+
+_WORD_RE = re.compile(r"[\w-]+")
+
+CACHE_SIZE = 8192
+
+
+def tokenize(text):
+    """Слова строки в нижнем регистре."""
+    return _WORD_RE.findall((text or "").lower())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_brand(brand):
+    """'Adidas  Originals' -> 'adidas', 'Nike' -> 'nike'."""
+    name = " ".join(tokenize(brand))
+    return BRAND_ALIASES.get(name, name)
+
+
+def is_target_brand(brand):
+    return canonical_brand(brand) in TARGET_BRANDS
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_title(title):
+    """
+    Очищает название товара от общих слов (кроссовки, кеды и т.д.),
+    повторов подряд ('Puma Puma Suede') и лишних пробелов.
+    """
+    if not title:
+        return ""
+
+    cleaned_words = []
+    previous = None
+    for word in title.split():
+        lower = word.lower()
+        if lower in STOPWORDS or lower == previous:
+            continue
+        cleaned_words.append(word)
+        previous = lower
+    return " ".join(cleaned_words)
+
+
+def make_title(brand, model=""):
+    """
+    Название для скраперов из бренда и модели: без лишних пробелов и без
+    повтора бренда, если модель уже начинается с него ('Puma', 'Puma Suede').
+    """
+    brand = " ".join((brand or "").split())
+    model = " ".join((model or "").split())
+    if brand and model.lower().startswith(brand.lower()):
+        rest = model[len(brand) :]
+        if not rest or rest.startswith(" "):
+            return model
+    return f"{brand} {model}".strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def title_tokens(title):
+    """Набор слов очищенного названия в нижнем регистре."""
+    return frozenset(tokenize(clean_title(title or "")))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def title_keys(title):
+    """
+    Слова и пары соседних слов названия — ключи для поиска брендов
+    ('new balance', 'air jordan'). Алиасы добавляются как основной бренд.
+    """
+    words = tokenize(title)
+    keys = set(words)
+    keys.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    keys.update(BRAND_ALIASES[key] for key in keys & BRAND_ALIASES.keys())
+    return frozenset(keys)
@@ -1,104 +1,43 @@
+from sizes import format_size, normalize_sizes
+from text_normalization import clean_title
+
+
 def format_sizes(sizes_list):
     """
     Форматирует список размеров, группируя последовательные размеры в диапазоны.
-    Пример: ['41', '42', '43'] -> '41-43'
+    Пример: ['41', '42', '43'] -> '41 - 43'
+    Размеры приводятся к EU (см. sizes.normalize_sizes): '41 RUS' -> 42.
     """
     if not sizes_list:
         return ""
 
-    # Преобразуем в числа для сортировки
-    try:
-        # Извлекаем числа из строк (например "41 EU" -> 41.0)
-        # Предполагаем, что размер это первое число в строке
-        parsed_sizes = []
-        for s in sizes_list:
-            # Очищаем от букв и пробелов, оставляем цифры и точку/запятую
-            clean_s = "".join(c for c in str(s) if c.isdigit() or c in [".", ","])
-            clean_s = clean_s.replace(",", ".")
-            if clean_s:
-                parsed_sizes.append(float(clean_s))
-
-        if not parsed_sizes:
-            return ", ".join(sizes_list)
-
-        # Сортируем и удаляем дубликаты
-        sorted_sizes = sorted(list(set(parsed_sizes)))
-
-        result_parts = []
-        if not sorted_sizes:
-            return ""
-
-        start = sorted_sizes[0]
-        prev = sorted_sizes[0]
-        count = 1
-
-        for i in range(1, len(sorted_sizes)):
-            current = sorted_sizes[i]
-            # Считаем последовательностью, если разница <= 1.0 (чтобы учесть 41, 42 и 41, 41.5)
-            # Но для красивых диапазонов 41-43 обычно имеют в виду целые шаги или "подряд идущие"
-            # Давайте будем считать последовательностью, если разница <= 1.0
-            diff = current - prev
-
-            if diff <= 1.05:  # Небольшой запас для float
-                prev = current
-                count += 1
-            else:
-                # Закрываем предыдущую группу
-                if count >= 3:
-                    # Убираем .0 если число целое
-                    start_str = f"{int(start)}" if start.is_integer() else f"{start}"
-                    prev_str = f"{int(prev)}" if prev.is_integer() else f"{prev}"
-                    result_parts.append(f"{start_str}-{prev_str}")
-                else:
-                    # Добавляем все числа из группы по отдельности
-                    # (тут надо аккуратно, так как мы хранили только start и prev)
-                    # Проще пересобрать логику: собираем буфер
-                    pass
-
-                # Сброс
-                start = current
-                prev = current
-                count = 1
-
-        # Эта логика выше сложная для восстановления промежуточных чисел,
-        # если мы их не хранили. Давайте перепишем проще.
-
-        groups = []
-        if not sorted_sizes:
-            return ""
-
-        current_group = [sorted_sizes[0]]
-
-        for i in range(1, len(sorted_sizes)):
-            curr = sorted_sizes[i]
-            prev = sorted_sizes[i - 1]
-
-            # Если шаг небольшой (до 1.0 включительно), добавляем в группу
-            if (curr - prev) <= 1.05:
-                current_group.append(curr)
-            else:
-                groups.append(current_group)
-                current_group = [curr]
-        groups.append(current_group)
-
-        final_strings = []
-        for group in groups:
-            if len(group) >= 3:
-                start_v = group[0]
-                end_v = group[-1]
-                s_str = f"{int(start_v)}" if start_v.is_integer() else f"{start_v}"
-                e_str = f"{int(end_v)}" if end_v.is_integer() else f"{end_v}"
-                final_strings.append(f"{s_str} - {e_str}")
-            else:
-                for v in group:
-                    v_str = f"{int(v)}" if v.is_integer() else f"{v}"
-                    final_strings.append(v_str)
-
-        return ", ".join(final_strings)
-
-    except Exception as e:
-        print(f"Ошибка форматирования размеров: {e}")
-        return ", ".join(sizes_list)
+    sorted_sizes = normalize_sizes(sizes_list)
+    if not sorted_sizes:
+        # Ничего не распознали — показываем как есть
+        if isinstance(sizes_list, str):
+            return sizes_list
+        return ", ".join(str(s) for s in sizes_list)
+
+    # Группы подряд идущих размеров (шаг до 1.0 включительно: 41, 41.5, 42)
+    groups = []
+    current_group = [sorted_sizes[0]]
+
+    for prev, curr in zip(sorted_sizes, sorted_sizes[1:]):
+        if (curr - prev) <= 1.05:  # Небольшой запас для float
+            current_group.append(curr)
+        else:
+            groups.append(current_group)
+            current_group = [curr]
+    groups.append(current_group)
+
+    final_strings = []
+    for group in groups:
+        if len(group) >= 3:
+            final_strings.append(f"{format_size(group[0])} - {format_size(group[-1])}")
+        else:
+            final_strings.extend(format_size(v) for v in group)
+
+    return ", ".join(final_strings)
 
 
 def has_valid_size(sizes_list, min_size=41.0):
@@ -106,73 +45,28 @@ def has_valid_size(sizes_list, min_size=41.0):
     Проверяет, есть ли в списке хотя бы один размер >= min_size.
     Args:
         sizes_list: список строк с размерами (например ['39 EU', '41.5 EU'])
-        min_size: минимальный размер для прохождения фильтра (по умолчанию 41.0)
+        min_size: минимальный размер EU для прохождения фильтра (по умолчанию 41.0)
     Returns:
         True, если есть подходящий размер, иначе False.
+        Нераспознанные размеры не проходят фильтр, чтобы мусор не летел.
     """
-    if not sizes_list:
-        return False
-
-    try:
-        found = False
-        for s in sizes_list:
-            # Очищаем от букв и пробелов, оставляем цифры и точку/запятую
-            clean_s = "".join(c for c in str(s) if c.isdigit() or c in [".", ","])
-            clean_s = clean_s.replace(",", ".")
-
-            if clean_s:
-                size_val = float(clean_s)
-                if size_val >= min_size:
-                    found = True
-                    break
-        return found
-    except Exception as e:
-        print(f"Ошибка при проверке размера {sizes_list}: {e}")
-        # Если не смогли распарсить, лучше пропустить или оставить?
-        # Допустим, оставим False (строгий фильтр), чтобы мусор не летел.
-        return False
-
-
-def clean_title(title):
+    sizes = normalize_sizes(sizes_list)
+    # Кортеж отсортирован: достаточно проверить наибольший размер
+    return bool(sizes) and sizes[-1] >= min_size
+
+
+def parse_price(price_text):
     """
-    Очищает название товара от общих слов (кроссовки, кеды и т.д.)
-    и лишних пробелов.
+    Превращает цену из БД в число.
+    Пример: '12 990 ₽' -> 12990, 'N/A' -> None
     """
-    if not title:
-        return ""
+    if price_text is None:
+        return None
+    if isinstance(price_text, (int, float)):
+        return int(price_text)
 
-    # Список слов для удаления (в нижнем регистре)
-    words_to_remove = [
-        "кроссовки",
-        "мужские",
-        "женские",
-        "кеды",
-        "высокие",
-        "низкие",
-        "ботинки",
-        "сандалии",
-        "сланцы",
-        "тапочки",
-    ]
-
-    # Разбиваем на слова
-    words = title.split()
-    cleaned_words = []
-
-    # first_word_taken removed
-
-    for word in words:
-        # Проверяем слово в нижнем регистре
-        if word.lower() not in words_to_remove:
-            # Проверка на дубликат с предыдущим добавленным словом
-            if cleaned_words and cleaned_words[-1].lower() == word.lower():
-                continue
-
-            cleaned_words.append(word)
-
-    # Собираем обратно
-    cleaned_title = " ".join(cleaned_words)
-    return cleaned_title
+    digits = "".join(c for c in str(price_text) if c.isdigit())
+    return int(digits) if digits else None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+"""
+Ожидания по условию вместо фиксированных time.sleep в скраперах.
+
+Каждое ожидание ограничено сверху бюджетом — длительностью sleep, который
+оно заменило, — и заканчивается, как только страница готова:
+  wait_stable — значение (число карточек, число ответов по шаблону URL)
+                перестало меняться на settle секунд;
+  wait_until  — условие выполнилось (например, появились чипы размеров);
+  Pacer       — вежливая пауза между заходами на страницы отсчитывается от
+                прошлого захода, поэтому время загрузки страницы в нее входит.
+
+Фактическое время ожидания пишется в sneaker_wait_seconds, разница с
+бюджетом — в sneaker_wait_saved_seconds_total (см. metrics.py).
+
+Для Selenium условия проверяются скриптом COUNT_JS (driver.execute_script),
+для Playwright — локаторами (page.locator(...).count()). Ожидания, которые
+идут целиком внутри страницы, учитываются через record_wait().
+"""
+
+import time
+
+from metrics import WAIT_SAVED_SECONDS, WAIT_SECONDS
+
+POLL = 0.1  # секунд между проверками условия
+SETTLE = 0.5  # сколько значение должно не меняться, чтобы считаться итоговым
+
+# Число элементов по CSS-селектору (Selenium: arguments[0])
+COUNT_JS = "return document.querySelectorAll(arguments[0]).length;"
+
+
+def record_wait(wait, source, waited, budget):
+    """Учитывает ожидание в метриках: waited секунд вместо budget."""
+    WAIT_SECONDS.observe(waited, wait=wait, source=source)
+    if budget > waited:
+        WAIT_SAVED_SECONDS.inc(budget - waited, wait=wait, source=source)
+
+
+def _budget(budget, timeout):
+    return timeout if budget is None else budget
+
+
+def _sample(sample, default=None):
+    try:
+        return sample()
+    except Exception:
+        return default
+
+
+def wait_stable(
+    sample, timeout, settle=SETTLE, poll=POLL, wait="", source="", budget=None
+):
+    """
+    Ждет, пока sample() перестанет меняться на settle секунд, но не дольше
+    timeout. Ошибки sample() считаются «значение не изменилось».
+    :param budget: сколько ждал замененный sleep (по умолчанию timeout)
+    :return: последнее значение sample()
+    """
+    started = time.monotonic()
+    value = _sample(sample)
+    changed = started
+    while True:
+        now = time.monotonic()
+        if now - changed >= settle or now - started >= timeout:
+            break
+        time.sleep(min(poll, timeout - (now - started)))
+        current = _sample(sample, value)
+        if current != value:
+            value, changed = current, time.monotonic()
+    record_wait(wait, source, time.monotonic() - started, _budget(budget, timeout))
+    return value
+
+
+def wait_until(check, timeout, poll=POLL, wait="", source="", budget=None):
+    """
+    Ждет, пока check() вернет истинное значение, но не дольше timeout.
+    :param budget: сколько ждал замененный sleep (по умолчанию timeout)
+    :return: результат check() или None по таймауту
+    """
+    started = time.monotonic()
+    while True:
+        result = _sample(check)
+        elapsed = time.monotonic() - started
+        if result or elapsed >= timeout:
+            break
+        time.sleep(min(poll, timeout - elapsed))
+    record_wait(wait, source, time.monotonic() - started, _budget(budget, timeout))
+    return result or None
+
+
+class Pacer:
+    """
+    Не чаще одного захода в interval секунд. Вместо sleep(interval) после
+    каждой страницы ждет только остаток интервала с прошлого вызова wait().
+    """
+
+    def __init__(self, interval, wait="pace", source=""):
+        self.interval = interval
+        self.wait_name = wait
+        self.source = source
+        self._last = None
+
+    def wait(self):
+        now = time.monotonic()
+        delay = 0.0
+        if self._last is not None:
+            delay = max(0.0, self._last + self.interval - now)
+            if delay:
+                time.sleep(delay)
+            record_wait(self.wait_name, self.source, delay, self.interval)
+        self._last = time.monotonic()
+        return delay